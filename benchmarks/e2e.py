@@ -0,0 +1,204 @@
+"""
+Сквозной нагрузочный бенчмарк без сети.
+
+    python -m benchmarks.e2e --requests 500 --concurrency 20
+    python -m benchmarks.e2e --fault gpt=2.0 --fault translate=0.1:0.3 --json result.json
+    python -m benchmarks.e2e --workers 4 --concurrency 40
+
+Бот запускается отдельным процессом; Telegram, Yandex GPT/Translate/IAM,
+horoscope.com и astro-seek подменяются локальными заглушками с задержкой
+и долей ошибок (--fault <сервис>=<задержка>[:<доля ошибок>]).
+Синтетические обновления идут в webhook_handler через /webhook/<token>.
+Отчёт: пропускная способность, p50/p95/p99 по сценариям, CPU и RSS процесса бота
+(с --workers — сумма по супервизору и воркерам).
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+
+import aiohttp
+import psutil
+
+from callbacks import (
+    encode, MAIN_MENU, HOROSCOPE, TAROT, TAROT3, TAROT5, MOON,
+    COMPATIBILITY_FIRST, COMPATIBILITY_SECOND, MAGIC_8BALL_ANSWER, HISTORY,
+)
+from benchmarks.stubs import Fault, TelegramStub, ServiceStubs
+from benchmarks.harness import BotProcess, serve, latency_summary, message_update, callback_update
+
+# Сценарий → функция, возвращающая последовательность обновлений одного пользователя
+SCENARIOS = {
+    "start": lambda uid: [message_update(uid, "/start")],
+    "menu": lambda uid: [callback_update(uid, MAIN_MENU)],
+    "horoscope": lambda uid: [callback_update(uid, encode(HOROSCOPE, random.randrange(12), random.randrange(2), 0))],
+    "horoscope_detailed": lambda uid: [callback_update(uid, encode(HOROSCOPE, random.randrange(12), 0, 1))],
+    "tarot": lambda uid: [callback_update(uid, TAROT)],
+    "tarot3": lambda uid: [callback_update(uid, TAROT3)],
+    "tarot5": lambda uid: [callback_update(uid, TAROT5)],
+    "moon": lambda uid: [callback_update(uid, MOON)],
+    "compatibility": lambda uid: [
+        callback_update(uid, encode(COMPATIBILITY_FIRST, first := random.randrange(12))),
+        callback_update(uid, encode(COMPATIBILITY_SECOND, first, random.randrange(12))),
+    ],
+    "magic8": lambda uid: [callback_update(uid, MAGIC_8BALL_ANSWER)],
+    "history": lambda uid: [callback_update(uid, HISTORY)],
+}
+
+
+class ResourceSampler:
+    """Периодически снимает CPU и RSS процесса бота вместе с дочерними (воркерами)"""
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.process = psutil.Process(pid)
+        self.processes = [self.process, *self.process.children(recursive=True)]
+        self.interval = interval
+        self.peak_rss = 0
+        self._task = None
+        self._cpu_start = None
+
+    def _cpu(self) -> float:
+        total = 0.0
+        for process in self.processes:
+            times = process.cpu_times()
+            total += times.user + times.system
+        return total
+
+    def _rss(self) -> int:
+        return sum(process.memory_info().rss for process in self.processes)
+
+    async def _run(self):
+        while True:
+            self.peak_rss = max(self.peak_rss, self._rss())
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._cpu_start = self._cpu()
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self, elapsed: float) -> dict:
+        self._task.cancel()
+        cpu_seconds = self._cpu() - self._cpu_start
+        return {
+            "cpu_seconds": round(cpu_seconds, 2),
+            "cpu_percent": round(cpu_seconds / elapsed * 100, 1) if elapsed else 0.0,
+            "rss_mb": round(self._rss() / 2 ** 20, 1),
+            "peak_rss_mb": round(self.peak_rss / 2 ** 20, 1),
+        }
+
+
+async def drive(webhook_url: str, scenarios: list, total: int, concurrency: int) -> tuple[dict, dict]:
+    """
+    Прогоняет total сценариев в concurrency параллельных потоков.
+    :return: (сценарий → задержки запросов в секундах, сценарий → число неуспешных запросов)
+    """
+    latencies = {name: [] for name in scenarios}
+    errors = {name: 0 for name in scenarios}
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait((random.choice(scenarios), 100000 + i))
+
+    async def worker(session):
+        while not queue.empty():
+            name, user_id = queue.get_nowait()
+            for update in SCENARIOS[name](user_id):
+                started = time.perf_counter()
+                try:
+                    async with session.post(webhook_url, json=update) as resp:
+                        ok = resp.status == 200
+                except aiohttp.ClientError:
+                    ok = False
+                latencies[name].append(time.perf_counter() - started)
+                errors[name] += not ok
+
+    timeout = aiohttp.ClientTimeout(total=120)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    return latencies, errors
+
+
+async def run(args) -> dict:
+    faults = {}
+    for spec in args.fault:
+        name, _, value = spec.partition("=")
+        faults[name] = Fault.parse(value)
+
+    telegram = TelegramStub(faults.pop("telegram", None))
+    services = ServiceStubs(faults)
+    telegram_runner, telegram_url = await serve(telegram.make_app())
+    services_runner, services_url = await serve(services.make_app())
+    env = {"TELEGRAM_API_URL": telegram_url, **ServiceStubs.env(services_url)}
+    if args.workers > 1:
+        env["WEB_CONCURRENCY"] = str(args.workers)
+
+    try:
+        async with BotProcess(env, quiet=not args.verbose) as bot:
+            if args.workers > 1:
+                # Порт открывает первый воркер; ждём, пока поднимутся все
+                await bot.wait_ready()
+                await asyncio.sleep(1)
+            async with aiohttp.ClientSession() as session:
+                # Прогрев: бот готов и первая порция обработчиков импортирована
+                async with session.post(bot.webhook_url, json=message_update(1, "/start")) as resp:
+                    resp.raise_for_status()
+            if args.warmup:
+                await asyncio.sleep(args.warmup)
+
+            sampler = ResourceSampler(bot.pid)
+            sampler.start()
+            started = time.perf_counter()
+            latencies, errors = await drive(bot.webhook_url, args.scenario, args.requests, args.concurrency)
+            elapsed = time.perf_counter() - started
+            resources = sampler.stop(elapsed)
+    finally:
+        await telegram_runner.cleanup()
+        await services_runner.cleanup()
+
+    updates = sum(len(values) for values in latencies.values())
+    return {
+        "requests": args.requests,
+        "updates": updates,
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(updates / elapsed, 1),
+        "resources": resources,
+        "scenarios": {
+            name: {**latency_summary(values), "errors": errors[name]}
+            for name, values in latencies.items() if values
+        },
+        "stub_requests": {"telegram": len(telegram.calls), **services.requests},
+    }
+
+
+def print_report(report: dict):
+    print(f"updates: {report['updates']} за {report['elapsed_s']} с — {report['throughput_rps']} rps")
+    r = report["resources"]
+    print(f"CPU: {r['cpu_seconds']} с ({r['cpu_percent']}%), RSS: {r['rss_mb']} MB (пик {r['peak_rss_mb']} MB)")
+    print(f"{'сценарий':<20}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'err':>6}")
+    for name, s in sorted(report["scenarios"].items()):
+        print(f"{name:<20}{s['count']:>6}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}{s['errors']:>6}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300, help="число сценариев")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1, help="WEB_CONCURRENCY бота")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="сценарий (можно несколько), по умолчанию все")
+    parser.add_argument("--fault", action="append", default=[],
+                        help="telegram|gpt|translate|iam|horoscope|astroseek=<задержка>[:<доля ошибок>]")
+    parser.add_argument("--warmup", type=float, default=0.0, help="пауза перед нагрузкой, сек")
+    parser.add_argument("--json", help="сохранить отчёт в файл")
+    parser.add_argument("--verbose", action="store_true", help="показывать логи бота")
+    args = parser.parse_args()
+    args.scenario = args.scenario or sorted(SCENARIOS)
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
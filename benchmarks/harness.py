@@ -0,0 +1,174 @@
+"""
+Общие части бенчмарков: запуск бота отдельным процессом против заглушек,
+синтетические обновления и статистика задержек.
+"""
+
+import os
+import sys
+import time
+import shutil
+import socket
+import asyncio
+import tempfile
+import itertools
+
+import aiohttp
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_TOKEN = "123456:benchmark"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def serve(app: web.Application):
+    """Поднимает aiohttp-приложение на свободном порту. :return: (runner, base_url)"""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def percentile(values: list, p: float) -> float:
+    """Процентиль по ближайшему рангу; values не обязаны быть отсортированы"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def latency_summary(values: list) -> dict:
+    """p50/p95/p99 и максимум в миллисекундах"""
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 1),
+        "p95_ms": round(percentile(values, 95) * 1000, 1),
+        "p99_ms": round(percentile(values, 99) * 1000, 1),
+        "max_ms": round(max(values, default=0) * 1000, 1),
+    }
+
+
+# === Синтетические обновления ===
+_update_ids = itertools.count(1)
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": "Bench", "language_code": "ru"}
+
+
+def message_update(user_id: int, text: str) -> dict:
+    update_id = next(_update_ids)
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": _user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        command = text.split()[0]
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return {"update_id": update_id, "message": message}
+
+
+def callback_update(user_id: int, data: str) -> dict:
+    update_id = next(_update_ids)
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": 1, "is_bot": True, "first_name": "AstroBot"},
+                "text": "🔮",
+            },
+        },
+    }
+
+
+# === Процесс бота ===
+class BotProcess:
+    """
+    Бот в отдельном процессе во временной папке с копией data/.
+    async with BotProcess(env) as bot: bot.url, bot.pid, bot.port_bound
+    """
+
+    def __init__(self, env: dict = None, quiet: bool = True):
+        self.env = env or {}
+        self.quiet = quiet
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.webhook_url = f"{self.url}/webhook/{BOT_TOKEN}"
+        self.proc = None
+        self.port_bound = None
+        self._workdir = None
+
+    @property
+    def pid(self) -> int:
+        return self.proc.pid
+
+    async def __aenter__(self):
+        self._workdir = tempfile.TemporaryDirectory()
+        shutil.copytree(os.path.join(ROOT, "data"), os.path.join(self._workdir.name, "data"))
+        env = dict(
+            os.environ,
+            BOT_TOKEN=BOT_TOKEN,
+            PORT=str(self.port),
+            RENDER_EXTERNAL_URL=self.url,
+            **self.env,
+        )
+        output = asyncio.subprocess.DEVNULL if self.quiet else None
+
+        started = time.perf_counter()
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(ROOT, "bot.py"),
+            cwd=self._workdir.name, env=env, stdout=output, stderr=output,
+        )
+        await self._wait_for_port()
+        self.port_bound = time.perf_counter() - started
+        return self
+
+    async def _wait_for_port(self, timeout: float = 30):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            if self.proc.returncode is not None:
+                raise RuntimeError(f"бот завершился с кодом {self.proc.returncode}")
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", self.port)
+                writer.close()
+                return
+            except OSError:
+                await asyncio.sleep(0.005)
+        raise TimeoutError("порт так и не открылся")
+
+    async def wait_ready(self, timeout: float = 30):
+        """Ждёт, пока health check перестанет отвечать "starting" """
+        deadline = time.perf_counter() + timeout
+        async with aiohttp.ClientSession() as session:
+            while time.perf_counter() < deadline:
+                async with session.get(f"{self.url}/") as resp:
+                    if (await resp.json()).get("status") != "starting":
+                        return
+                await asyncio.sleep(0.05)
+        raise TimeoutError("бот так и не стал готов")
+
+    async def __aexit__(self, *exc):
+        if self.proc.returncode is None:
+            self.proc.terminate()
+            try:
+                await asyncio.wait_for(self.proc.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                self.proc.kill()
+                await self.proc.wait()
+        self._workdir.cleanup()
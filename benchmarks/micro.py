@@ -0,0 +1,340 @@
+"""
+Микробенчмарки горячих функций с порогами регрессии.
+
+    python -m benchmarks.micro                     # сравнить с benchmarks/baselines.json
+    python -m benchmarks.micro --filter tracker    # только кейсы, в имени которых есть подстрока
+    python -m benchmarks.micro --update            # перезаписать базовые значения
+
+Каждый кейс меряется timeit (autorange, лучший из --repeat прогонов) и делится
+на время калибровочного цикла на чистом Python, чтобы базу, снятую на одной машине,
+можно было сравнивать на другой. Код выхода 1, если хоть один кейс стал медленнее
+базы больше чем в threshold раз (по умолчанию DEFAULT_THRESHOLD, у шумных кейсов — свой).
+Запускать из корня репозитория: модули читают data/ по относительным путям.
+"""
+
+import os
+import csv
+import sys
+import json
+import random
+import timeit
+import argparse
+import tempfile
+from datetime import date, timedelta
+
+from benchmarks.harness import ROOT
+
+BASELINES_FILE = os.path.join(ROOT, "benchmarks", "baselines.json")
+DEFAULT_THRESHOLD = 1.5  # во сколько раз можно замедлиться относительно базы
+IO_THRESHOLD = 2.0       # кейсы с диском шумнее
+CACHED_THRESHOLD = 3.0   # доли микросекунды: заметен любой шум
+
+USER_COUNTS = (10_000, 100_000, 1_000_000)
+CACHE_SIZES = (100, 1_000, 10_000)
+
+# Имя кейса → (фабрика, порог). Фабрика готовит данные и возвращает функцию без аргументов
+CASES = {}
+
+
+def case(name: str, threshold: float = DEFAULT_THRESHOLD):
+    def decorator(factory):
+        CASES[name] = (factory, threshold)
+        return factory
+    return decorator
+
+
+def calibrate() -> float:
+    """Время эталонного цикла на чистом Python — масштаб для сравнения машин"""
+    def loop():
+        total = 0
+        for i in range(10_000):
+            total += i * i % 7
+        return total
+    return min(timeit.repeat(loop, number=20, repeat=5)) / 20
+
+
+def measure(func, repeat: int) -> float:
+    """Лучшее время одного вызова, сек"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+# === Луна ===
+@case("lunar.get_lunar_info")
+def _lunar_info():
+    from services.astro_data import get_lunar_info
+    today = date.today()
+    return lambda: get_lunar_info(today)
+
+
+@case("lunar.get_lunar_text")
+def _lunar_text():
+    from services.lunar import get_lunar_text
+    return get_lunar_text
+
+
+# === Таро ===
+@case("tarot.draw_1")
+def _tarot_draw_1():
+    from services.tarot import draw
+    return lambda: draw(1)
+
+
+@case("tarot.draw_5")
+def _tarot_draw_5():
+    from services.tarot import draw
+    return lambda: draw(5)
+
+
+@case("tarot.card_of_the_day_miss")
+def _tarot_card_of_the_day():
+    from services.tarot import card_of_the_day, card_of_the_day_cache
+    today = date.today()
+
+    def run():
+        card_of_the_day_cache.clear()
+        return card_of_the_day(123456789, today)
+    return run
+
+
+@case("tarot.render_spread_5")
+def _tarot_render():
+    from services.tarot import draw, render_spread
+    cards = draw(5, random.Random(0))
+    return lambda: render_spread("tarot5", cards)
+
+
+# === Разбиение сообщений ===
+def _long_text(paragraphs: int) -> str:
+    from services.tarot import draw, render_spread
+    rng = random.Random(0)
+    return "\n\n".join(render_spread("tarot5", draw(5, rng)) for _ in range(paragraphs))
+
+
+@case("text_split.split_message_plain")
+def _split_plain():
+    from services.text_split import split_message, CAPTION_LIMIT
+    text = _long_text(4)
+    return lambda: split_message(text, first_limit=CAPTION_LIMIT)
+
+
+@case("text_split.split_message_html")
+def _split_html():
+    from services.text_split import split_message
+    text = "\n\n".join(f"<b>Абзац {i}</b>\n<i>{'текст ' * 80}</i>" for i in range(40))
+    return lambda: split_message(text, html=True)
+
+
+# === Совместимость ===
+@case("compatibility.get_compatibility_text")
+def _compatibility():
+    from callbacks import SIGNS
+    from handlers.compatibility import get_compatibility_text
+    pairs = [(a, b) for a in SIGNS for b in SIGNS]
+
+    def run():
+        for sign1, sign2 in pairs:
+            get_compatibility_text(sign1, sign2)
+    return run
+
+
+@case("compatibility.build_table", threshold=IO_THRESHOLD)
+def _compatibility_table():
+    from handlers.compatibility import build_compatibility_table
+    return build_compatibility_table
+
+
+# === Клавиатуры: из кэша и сборка с нуля (__wrapped__ обходит lru_cache) ===
+def _keyboards():
+    import keyboards
+    from callbacks import MAIN_MENU, TAROT
+    return {
+        "main_menu": (keyboards.get_main_menu_keyboard, ()),
+        "zodiac_inline": (keyboards.get_zodiac_inline_keyboard, ("tomorrow",)),
+        "zodiac_subscribe": (keyboards.get_zodiac_subscribe_keyboard, ()),
+        "back_to_menu": (keyboards.get_back_to_menu_inline, ()),
+        "back_or_repeat": (keyboards.get_back_or_repeat_inline, (MAIN_MENU, TAROT)),
+    }
+
+
+def _register_keyboard_cases():
+    for name in ("main_menu", "zodiac_inline", "zodiac_subscribe", "back_to_menu", "back_or_repeat"):
+        def cached(name=name):
+            func, args = _keyboards()[name]
+            return lambda: func(*args)
+
+        def build(name=name):
+            func, args = _keyboards()[name]
+            return lambda: func.__wrapped__(*args)
+
+        case(f"keyboards.{name}_cached", threshold=CACHED_THRESHOLD)(cached)
+        case(f"keyboards.{name}_build")(build)
+
+
+_register_keyboard_cases()
+
+
+@case("keyboards.get_inline_menu")
+def _inline_menu():
+    from keyboards import get_inline_menu
+    options = [(f"Кнопка {i}", f"cb:{i}") for i in range(12)]
+    return lambda: get_inline_menu(options, row_width=3)
+
+
+# === Учёт пользователей: CSV на USER_COUNTS строк во временной папке ===
+_workdir = tempfile.TemporaryDirectory(prefix="micro-")
+
+
+def _user_file(count: int) -> str:
+    path = os.path.join(_workdir.name, f"user_activity_{count}.csv")
+    if not os.path.exists(path):
+        first_day = date(2025, 1, 1)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["user_id", "username", "first_seen"])
+            for i in range(count):
+                day = first_day + timedelta(days=i * 365 // count)
+                writer.writerow([100_000_000 + i, f"user{i}", day.isoformat()])
+    return path
+
+
+def _register_tracker_cases():
+    for count in USER_COUNTS:
+        label = f"{count // 1000}k" if count < 1_000_000 else f"{count // 1_000_000}m"
+
+        def known_user(count=count):
+            from services import user_tracker
+            user_tracker.USER_FILE = _user_file(count)
+            # Уже известный пользователь в конце файла: полный проход без записи
+            return lambda: user_tracker.track_user(100_000_000 + count - 1)
+
+        def stats(count=count):
+            from services import user_tracker
+            user_tracker.USER_FILE = _user_file(count)
+            return user_tracker.get_user_stats_by_day
+
+        case(f"user_tracker.track_user_known_{label}", threshold=IO_THRESHOLD)(known_user)
+        case(f"user_tracker.get_user_stats_by_day_{label}", threshold=IO_THRESHOLD)(stats)
+
+
+_register_tracker_cases()
+
+
+# === Файловый кэш гороскопов ===
+def _cache_data(size: int) -> dict:
+    from callbacks import SIGNS
+    today = date.today().isoformat()
+    text = "Звёзды советуют не торопиться. " * 20
+    data = {}
+    for i in range(size):
+        sign = SIGNS[i % len(SIGNS)]
+        data.setdefault(sign, {})[f"brief_{sign}_{i}"] = {"date": today, "text": text}
+    return data
+
+
+def _register_cache_cases():
+    for size in CACHE_SIZES:
+        def load(size=size):
+            from services import cache_utils
+            cache_utils.CACHE_FILE = os.path.join(_workdir.name, f"cache_load_{size}.json")
+            cache_utils.save_cache(_cache_data(size))
+            return cache_utils.load_cache
+
+        def save(size=size):
+            from services import cache_utils
+            cache_utils.CACHE_FILE = os.path.join(_workdir.name, f"cache_save_{size}.json")
+            data = _cache_data(size)
+            return lambda: cache_utils.save_cache(data)
+
+        case(f"cache_utils.load_cache_{size}", threshold=IO_THRESHOLD)(load)
+        case(f"cache_utils.save_cache_{size}", threshold=IO_THRESHOLD)(save)
+
+
+_register_cache_cases()
+
+
+def load_baselines() -> dict:
+    if not os.path.exists(BASELINES_FILE):
+        return {"calibration": None, "cases": {}}
+    with open(BASELINES_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run(names: list, repeat: int) -> dict:
+    """Имя кейса → лучшее время одного вызова, сек"""
+    results = {}
+    for name in names:
+        factory, _ = CASES[name]
+        results[name] = measure(factory(), repeat)
+        print(f"  {name:<46}{results[name] * 1e6:>12.2f} мкс", flush=True)
+    return results
+
+
+def main(args) -> int:
+    names = [name for name in CASES if not args.filter or any(f in name for f in args.filter)]
+    if not names:
+        print("Нет кейсов под фильтр")
+        return 1
+
+    calibration = calibrate()
+    print(f"калибровка: {calibration * 1e6:.1f} мкс")
+    results = run(names, args.repeat)
+    baselines = load_baselines()
+
+    if args.update:
+        cases = baselines["cases"] if args.filter else {}
+        if args.filter and baselines["calibration"]:
+            # Частичное обновление: приводим новые значения к масштабу сохранённой калибровки
+            scale = baselines["calibration"] / calibration
+        else:
+            baselines["calibration"] = calibration
+            scale = 1.0
+        for name, seconds in results.items():
+            cases[name] = seconds * scale
+        baselines["cases"] = dict(sorted(cases.items()))
+        with open(BASELINES_FILE, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"💾 База обновлена: {len(results)} кейсов")
+        return 0
+
+    if not baselines["calibration"]:
+        print("Базы нет — запустите с --update")
+        return 1
+
+    scale = calibration / baselines["calibration"]
+    regressions = []
+    print(f"\n{'кейс':<46}{'база':>12}{'сейчас':>12}{'ratio':>8}{'порог':>8}")
+    for name, seconds in results.items():
+        base = baselines["cases"].get(name)
+        if base is None:
+            print(f"{name:<46}{'—':>12}{seconds * 1e6:>12.2f}")
+            continue
+        expected = base * scale
+        ratio = seconds / expected
+        threshold = args.threshold or CASES[name][1]
+        mark = "❌" if ratio > threshold else ""
+        print(f"{name:<46}{expected * 1e6:>12.2f}{seconds * 1e6:>12.2f}{ratio:>8.2f}{threshold:>8.1f} {mark}")
+        if ratio > threshold:
+            regressions.append(name)
+
+    if regressions:
+        print(f"\n❌ Регрессии: {', '.join(regressions)}")
+        return 1
+    print("\n✅ Регрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", action="append", help="подстрока имени кейса (можно несколько)")
+    parser.add_argument("--repeat", type=int, default=5, help="сколько прогонов, берётся лучший")
+    parser.add_argument("--threshold", type=float, help="общий порог вместо порогов кейсов")
+    parser.add_argument("--update", action="store_true", help="перезаписать benchmarks/baselines.json")
+    parser.add_argument("--list", action="store_true", help="показать кейсы и выйти")
+    args = parser.parse_args()
+    if args.list:
+        print("\n".join(f"{name}  (порог {threshold})" for name, (_, threshold) in CASES.items()))
+        sys.exit(0)
+    sys.exit(main(args))
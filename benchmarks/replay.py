@@ -0,0 +1,171 @@
+"""
+Воспроизведение записанного трафика (services/update_recorder.py) против бота с заглушками.
+
+    python -m benchmarks.replay recordings/updates-20261019-100000.jsonl.gz --speed 1
+    python -m benchmarks.replay rec.jsonl.gz --speed 10 --json after.json --compare before.json
+
+--speed: 1 — в реальном темпе, N — в N раз быстрее, max — без пауз (ограничено --concurrency).
+--compare: сравнить с отчётом прошлого прогона; код выхода 1, если p50 или p95
+какого-либо действия выросли больше чем на --threshold процентов.
+"""
+
+import sys
+import gzip
+import json
+import time
+import asyncio
+import argparse
+
+import aiohttp
+
+import callbacks
+from keyboards import REPLY_BUTTON_TEXTS
+from benchmarks.stubs import TelegramStub, ServiceStubs
+from benchmarks.harness import BotProcess, serve, latency_summary
+
+# Код действия → имя константы в callbacks: "h" → "horoscope"
+ACTION_NAMES = {
+    value: name.lower()
+    for name, value in vars(callbacks).items()
+    if name.isupper() and isinstance(value, str) and value in callbacks.ACTIONS
+}
+
+
+def load_recording(paths: list) -> list:
+    """[(ts, update), ...] по возрастанию времени; файлы воркеров сливаются в один поток"""
+    items = []
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            items.extend(json.loads(line) for line in f if line.strip())
+    return sorted(((item["ts"], item["update"]) for item in items), key=lambda item: item[0])
+
+
+def classify(update: dict) -> str:
+    """Тип обновления для отчёта: команда, действие callback или прочее"""
+    if "callback_query" in update:
+        action, _ = callbacks.decode(update["callback_query"].get("data", ""))
+        return f"cb:{ACTION_NAMES.get(action, 'unknown')}"
+    message = update.get("message") or update.get("edited_message")
+    if message:
+        text = message.get("text", "")
+        if text.startswith("/"):
+            return text.split()[0]
+        return f"menu:{text}" if text.strip().lower() in REPLY_BUTTON_TEXTS else "message"
+    return next((key for key in update if key != "update_id"), "unknown")
+
+
+async def replay(webhook_url: str, recording: list, speed, concurrency: int) -> tuple:
+    latencies = {}
+    errors = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    first_ts = recording[0][0]
+    started = time.perf_counter()
+
+    async def send(session, update):
+        kind = classify(update)
+        async with semaphore:
+            sent = time.perf_counter()
+            try:
+                async with session.post(webhook_url, json=update) as resp:
+                    ok = resp.status == 200
+            except aiohttp.ClientError:
+                ok = False
+            latencies.setdefault(kind, []).append(time.perf_counter() - sent)
+            errors[kind] = errors.get(kind, 0) + (not ok)
+
+    timeout = aiohttp.ClientTimeout(total=120)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        tasks = []
+        for ts, update in recording:
+            if speed != "max":
+                delay = (ts - first_ts) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(session, update)))
+        await asyncio.gather(*tasks)
+
+    return latencies, errors, time.perf_counter() - started
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    """Регрессии: [(тип, метрика, было, стало, %)]"""
+    regressions = []
+    for kind, current in report["kinds"].items():
+        previous = baseline.get("kinds", {}).get(kind)
+        if not previous:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            before, after = previous[metric], current[metric]
+            if before > 0:
+                change = (after - before) / before * 100
+                if change > threshold:
+                    regressions.append((kind, metric, before, after, round(change, 1)))
+    return regressions
+
+
+async def main(args) -> int:
+    recording = load_recording(args.recording)
+    if not recording:
+        print("Запись пуста")
+        return 1
+    speed = "max" if args.speed == "max" else float(args.speed)
+
+    telegram = TelegramStub()
+    telegram_runner, telegram_url = await serve(telegram.make_app())
+    services_runner, services_url = await serve(ServiceStubs().make_app())
+    env = {"TELEGRAM_API_URL": telegram_url, **ServiceStubs.env(services_url)}
+
+    try:
+        async with BotProcess(env, quiet=not args.verbose) as bot:
+            await bot.wait_ready()
+            latencies, errors, elapsed = await replay(bot.webhook_url, recording, speed, args.concurrency)
+    finally:
+        await telegram_runner.cleanup()
+        await services_runner.cleanup()
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    report = {
+        "recording": args.recording,
+        "speed": args.speed,
+        "updates": len(recording),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(recording) / elapsed, 1),
+        "overall": latency_summary(all_latencies),
+        "kinds": {
+            kind: {**latency_summary(values), "errors": errors[kind]}
+            for kind, values in sorted(latencies.items())
+        },
+    }
+
+    print(f"updates: {report['updates']} за {report['elapsed_s']} с — {report['throughput_rps']} rps")
+    print(f"{'тип':<24}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'err':>6}")
+    for kind, s in report["kinds"].items():
+        print(f"{kind:<24}{s['count']:>6}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['errors']:>6}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n❌ Регрессии больше {args.threshold}%:")
+            for kind, metric, before, after, change in regressions:
+                print(f"  {kind} {metric}: {before} → {after} мс (+{change}%)")
+            return 1
+        print(f"\n✅ Регрессий больше {args.threshold}% нет")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", nargs="+", help="файлы updates-*.jsonl.gz (по одному на воркер)")
+    parser.add_argument("--speed", default="1", help="1, N или max")
+    parser.add_argument("--concurrency", type=int, default=50, help="предел одновременных запросов")
+    parser.add_argument("--json", help="сохранить отчёт в файл")
+    parser.add_argument("--compare", help="отчёт прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=20.0, help="допустимый рост p50/p95, %%")
+    parser.add_argument("--verbose", action="store_true", help="показывать логи бота")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,70 @@
+"""
+Бенчмарк холодного старта: время до открытия порта и до первого обработанного обновления.
+
+    python -m benchmarks.startup --runs 5
+
+Бот запускается отдельным процессом во временной папке с копией data/,
+Telegram подменяется локальной заглушкой, сеть не нужна.
+"""
+
+import time
+import json
+import asyncio
+import argparse
+import statistics
+
+import aiohttp
+
+from benchmarks.stubs import TelegramStub, ServiceStubs
+from benchmarks.harness import BotProcess, serve, message_update
+
+
+async def run_once(env: dict) -> dict:
+    started = time.perf_counter()
+    async with BotProcess(env) as bot:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(bot.webhook_url, json=message_update(1000, "/start")) as resp:
+                resp.raise_for_status()
+            first_update = time.perf_counter() - started
+
+            async with session.get(f"{bot.url}/") as resp:
+                reported = (await resp.json()).get("startup", {})
+
+        return {
+            "port_bound": bot.port_bound,
+            "first_update": first_update,
+            "bot_ready_reported": reported.get("bot_ready"),
+        }
+
+
+async def main(runs: int):
+    telegram_runner, telegram_url = await serve(TelegramStub().make_app())
+    services_runner, services_url = await serve(ServiceStubs().make_app())
+    env = {"TELEGRAM_API_URL": telegram_url, **ServiceStubs.env(services_url)}
+
+    results = []
+    try:
+        for i in range(runs):
+            result = await run_once(env)
+            results.append(result)
+            print(f"run {i + 1}: port {result['port_bound']:.3f}s, first update {result['first_update']:.3f}s")
+    finally:
+        await telegram_runner.cleanup()
+        await services_runner.cleanup()
+
+    summary = {}
+    for key in ("port_bound", "first_update"):
+        values = [r[key] for r in results]
+        summary[key] = {
+            "median": round(statistics.median(values), 3),
+            "min": round(min(values), 3),
+            "max": round(max(values), 3),
+        }
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    asyncio.run(main(parser.parse_args().runs))
@@ -0,0 +1,224 @@
+"""
+Локальные заглушки внешних сервисов для бенчмарков без сети.
+У каждой заглушки настраиваются задержка и доля ошибок (Fault).
+"""
+
+import json
+import time
+import random
+import asyncio
+import itertools
+
+from aiohttp import web
+
+
+class Fault:
+    """Задержка ответа и доля искусственных ошибок"""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, status: int = 500):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.status = status
+
+    @classmethod
+    def parse(cls, spec: str) -> "Fault":
+        """"0.2" или "0.2:0.1" — задержка в секундах и доля ошибок"""
+        latency, _, error_rate = spec.partition(":")
+        return cls(float(latency or 0), float(error_rate or 0))
+
+    async def apply(self):
+        """None — отвечать как обычно, иначе готовый ответ с ошибкой"""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            return web.Response(status=self.status, text="injected error")
+        return None
+
+
+class TelegramStub:
+    """
+    Минимальный Bot API: отвечает на методы, которые вызывает бот,
+    и запоминает вызовы.
+    Бот подключается через TELEGRAM_API_URL=http://127.0.0.1:<port>.
+    """
+
+    def __init__(self, fault: Fault = None):
+        self.fault = fault or Fault()
+        self.webhook_url = ""
+        self.calls = []  # [(время, метод)]
+        self._message_ids = itertools.count(1)
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    async def _params(self, request) -> dict:
+        if request.content_type == "application/json":
+            return await request.json()
+        return dict(await request.post())
+
+    def _message(self, params: dict, photo: bool = False) -> dict:
+        message_id = next(self._message_ids)
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+        }
+        if photo:
+            message["photo"] = [{
+                "file_id": f"stub-photo-{message_id}",
+                "file_unique_id": f"stub-{message_id}",
+                "width": 800,
+                "height": 1300,
+            }]
+        else:
+            message["text"] = params.get("text", "")
+        return message
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        params = await self._params(request)
+        self.calls.append((time.perf_counter(), method))
+
+        # getMe и вебхук не тормозим, чтобы не искажать время старта
+        if method not in ("getMe", "getWebhookInfo", "setWebhook"):
+            failed = await self.fault.apply()
+            if failed is not None:
+                return web.json_response(
+                    {"ok": False, "error_code": 500, "description": "Internal Server Error: injected"},
+                    status=500
+                )
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "AstroBot", "username": "astrobot_stub"}
+        elif method == "getWebhookInfo":
+            result = {"url": self.webhook_url, "has_custom_certificate": False, "pending_update_count": 0}
+        elif method == "setWebhook":
+            self.webhook_url = params.get("url", "")
+            result = True
+        elif method == "deleteWebhook":
+            self.webhook_url = ""
+            result = True
+        elif method == "sendPhoto":
+            result = self._message(params, photo=True)
+        elif method == "sendMediaGroup":
+            media = json.loads(params.get("media", "[]"))
+            result = [self._message(params, photo=True) for _ in media]
+        elif method in ("sendMessage", "editMessageText"):
+            result = self._message(params)
+        else:
+            result = True
+
+        return web.json_response({"ok": True, "result": result})
+
+    def first_call(self, method: str):
+        return next((t for t, name in self.calls if name == method), None)
+
+
+# === Yandex Cloud, horoscope.com, astro-seek ===
+SAMPLE_TEXT = (
+    "Сегодня стоит довериться интуиции и не торопить события. "
+    "Разговор с близким человеком поможет расставить приоритеты, "
+    "а вечер лучше посвятить отдыху и небольшим радостям."
+)
+
+HOROSCOPE_HTML = """<html><body><div class="main-horoscope">
+<p><strong>Oct 19, 2026</strong> - Trust your intuition today and take things slowly.
+A talk with someone close will help you set priorities.</p></div></body></html>"""
+
+ASTROSEEK_HTML = """<html><body><div class="horoBoxBoxText">
+Спокойный день, подходящий для завершения начатых дел.</div></body></html>"""
+
+
+class ServiceStubs:
+    """
+    Одно aiohttp-приложение со всеми внешними API, кроме Telegram.
+    Бот направляется сюда переменными YANDEX_GPT_URL, YANDEX_TRANSLATE_URL,
+    YANDEX_IAM_URL, HOROSCOPE_SITE_URL и ASTROSEEK_URL (см. env()).
+    :param faults: {"gpt" | "translate" | "iam" | "horoscope" | "astroseek": Fault}
+    :param chunk_delay: пауза между фрагментами потокового ответа GPT
+    """
+
+    SERVICES = ("gpt", "translate", "iam", "horoscope", "astroseek")
+
+    def __init__(self, faults: dict = None, chunk_delay: float = 0.05):
+        self.faults = {name: Fault() for name in self.SERVICES}
+        self.faults.update(faults or {})
+        self.chunk_delay = chunk_delay
+        self.requests = {name: 0 for name in self.SERVICES}
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/foundationModels/v1/completion", self.gpt)
+        app.router.add_post("/translate/v2/translate", self.translate)
+        app.router.add_post("/iam/v1/tokens", self.iam)
+        app.router.add_get("/us/horoscopes/general/{page}", self.horoscope)
+        app.router.add_get("/daily-horoscope", self.astroseek)
+        return app
+
+    @staticmethod
+    def env(base_url: str) -> dict:
+        return {
+            "YANDEX_FOLDER_ID": "bench-folder",
+            "YANDEX_GPT_API_KEY": "bench-key",
+            "YANDEX_API_KEY": "bench-key",
+            "YANDEX_GPT_URL": f"{base_url}/foundationModels/v1/completion",
+            "YANDEX_TRANSLATE_URL": f"{base_url}/translate/v2/translate",
+            "YANDEX_IAM_URL": f"{base_url}/iam/v1/tokens",
+            "HOROSCOPE_SITE_URL": base_url,
+            "ASTROSEEK_URL": base_url,
+        }
+
+    async def _fault(self, name: str):
+        self.requests[name] += 1
+        return await self.faults[name].apply()
+
+    async def gpt(self, request):
+        failed = await self._fault("gpt")
+        if failed is not None:
+            return failed
+
+        body = await request.json()
+        if not body.get("completionOptions", {}).get("stream"):
+            return web.json_response({"result": {"alternatives": [
+                {"message": {"role": "assistant", "text": SAMPLE_TEXT}, "status": "ALTERNATIVE_STATUS_FINAL"}
+            ]}})
+
+        # Потоковый ответ: строки JSON с накопленным текстом
+        response = web.StreamResponse(headers={"Content-Type": "application/json"})
+        await response.prepare(request)
+        words = SAMPLE_TEXT.split(" ")
+        for i in range(4, len(words) + 4, 4):
+            text = " ".join(words[:i])
+            status = "ALTERNATIVE_STATUS_FINAL" if i >= len(words) else "ALTERNATIVE_STATUS_PARTIAL"
+            line = {"result": {"alternatives": [{"message": {"role": "assistant", "text": text}, "status": status}]}}
+            await response.write(json.dumps(line, ensure_ascii=False).encode() + b"\n")
+            await asyncio.sleep(self.chunk_delay)
+        await response.write_eof()
+        return response
+
+    async def translate(self, request):
+        failed = await self._fault("translate")
+        if failed is not None:
+            return failed
+        body = await request.json()
+        return web.json_response({"translations": [{"text": SAMPLE_TEXT} for _ in body.get("texts", [])]})
+
+    async def iam(self, request):
+        failed = await self._fault("iam")
+        if failed is not None:
+            return failed
+        return web.json_response({"iamToken": "bench-iam-token"})
+
+    async def horoscope(self, request):
+        failed = await self._fault("horoscope")
+        if failed is not None:
+            return failed
+        return web.Response(text=HOROSCOPE_HTML, content_type="text/html")
+
+    async def astroseek(self, request):
+        failed = await self._fault("astroseek")
+        if failed is not None:
+            return failed
+        return web.Response(text=ASTROSEEK_HTML, content_type="text/html")
@@ -2,12 +2,16 @@
 AstroBot — Telegram ассистент по гороскопам, Таро и Луне 🌙
 """
 
-import os
 import time
+PROCESS_START = time.perf_counter()  # отсчёт холодного старта
+
+import os
+import sys
+import signal
+import subprocess
 import logging
 import asyncio
 import aiohttp
-import psutil
 from datetime import datetime
 from aiohttp import web
 from dotenv import load_dotenv
@@ -18,36 +22,62 @@ from telegram.ext import (
 )
 from telegram.constants import ParseMode
 
-# === 🧩 Хендлеры ===
-from handlers.menu import start, button_handler, reply_command_handler
-from handlers.horoscope import horoscope_today, horoscope_tomorrow
-from handlers.subscribe import subscribe, unsubscribe, subscription_status
-from handlers.moon import moon
-from handlers.tarot import tarot, tarot3
-from handlers.tarot5 import tarot5
-from handlers.compatibility import compatibility
-from handlers.stats import new_users  # ✅ <--- NEW
-
-# === 💾 Базы и планировщик ===
+# === 🧩 Хендлеры (модули загружаются при первом вызове, после открытия порта) ===
+from lazy import lazy_handler
+
+start = lazy_handler("handlers.menu", "start")
+button_handler = lazy_handler("handlers.menu", "button_handler")
+reply_command_handler = lazy_handler("handlers.menu", "reply_command_handler")
+horoscope_today = lazy_handler("handlers.horoscope", "horoscope_today")
+horoscope_tomorrow = lazy_handler("handlers.horoscope", "horoscope_tomorrow")
+horoscope_week = lazy_handler("handlers.horoscope", "horoscope_week")
+horoscope_month = lazy_handler("handlers.horoscope", "horoscope_month")
+subscribe = lazy_handler("handlers.subscribe", "subscribe")
+unsubscribe = lazy_handler("handlers.subscribe", "unsubscribe")
+subscription_status = lazy_handler("handlers.subscribe", "subscription_status")
+delivery_time = lazy_handler("handlers.subscribe", "delivery_time")
+delivery_timezone = lazy_handler("handlers.subscribe", "delivery_timezone")
+digest_settings = lazy_handler("handlers.subscribe", "digest_settings")
+moon = lazy_handler("handlers.moon", "moon")
+tarot = lazy_handler("handlers.tarot", "tarot")
+tarot3 = lazy_handler("handlers.tarot", "tarot3")
+tarot5 = lazy_handler("handlers.tarot5", "tarot5")
+compatibility = lazy_handler("handlers.compatibility", "compatibility")
+new_users = lazy_handler("handlers.stats", "new_users")  # ✅ <--- NEW
+history = lazy_handler("handlers.history", "history")
+warmup_cards = lazy_handler("handlers.admin", "warmup_cards")
+memory = lazy_handler("handlers.admin", "memory")
+bundle = lazy_handler("handlers.admin", "bundle")
+natal_chart = lazy_handler("handlers.natal", "natal_chart")
+
+# === 💾 Базы ===
 from services.database import init_db
-from scheduler import setup_scheduler
-
-# === 👀 Аналитика пользователей ===
-from services.user_tracker import track_user  # <--- Новый трекер
-
-# === 📝 Логгирование ===
-logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+from services.card_assets import card_asset_handler
+from services.circuit_breaker import breakers_snapshot
+from services import update_recorder
+from services import shared_state
+from services import memory_profiler
+from services.log_setup import setup_logging
+
+# === 📝 Логгирование: очередь и фоновый писатель (LOG_FORMAT=json — JSON-строки) ===
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # === 🔐 Загрузка переменных окружения ===
 load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 PORT = int(os.getenv("PORT", 8080))
-RENDER_URL = "https://astrobot-2-0.onrender.com"  # замените на ваш URL
+RENDER_URL = os.getenv("RENDER_EXTERNAL_URL", "https://astrobot-2-0.onrender.com")  # замените на ваш URL
 KEEP_ALIVE_INTERVAL = 840  # 14 минут
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")  # локальная заглушка Bot API для бенчмарков
+WEBHOOK_READY_TIMEOUT = 30  # сколько webhook ждёт готовности бота при холодном старте
 
 START_TIME = datetime.now()
 application = None  # Глобальное приложение
+bot_ready = asyncio.Event()
+
+# Секунды от запуска процесса до ключевых точек старта
+STARTUP = {"port_bound": None, "bot_ready": None, "first_update": None}
 
 if not BOT_TOKEN:
     logger.critical("❌ BOT_TOKEN не найден в .env")
@@ -56,6 +86,7 @@ if not BOT_TOKEN:
 # === Системные функции ===
 
 def get_memory_usage():
+    import psutil
     process = psutil.Process()
     mem = process.memory_info()
     return {
@@ -91,19 +122,52 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.exception("Ошибка отправки сообщения об ошибке.")
 
 # === Обработчик Webhook ===
+async def _shared_call(func, *args):
+    """С несколькими воркерами общее состояние в SQLite — обращаемся к нему из отдельного потока"""
+    if shared_state.MULTI_WORKER:
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
+
 async def webhook_handler(request):
+    update_id = None
     try:
         data = await request.json()
+        update_recorder.record(data)  # Только при заданном WEBHOOK_RECORD_DIR
+
+        # Повтор доставки от Telegram или обновление, уже взятое другим воркером
+        if not await _shared_call(shared_state.claim_update, data.get("update_id")):
+            logger.info("🔁 Обновление %s уже обработано, пропускаем", data.get("update_id"), extra={"sample": "update_dup"})
+            return web.Response()
+        update_id = data.get("update_id")
+
+        # Порт открыт раньше, чем бот готов: обновление ждёт окончания setup_bot
+        if not bot_ready.is_set():
+            try:
+                await asyncio.wait_for(bot_ready.wait(), timeout=WEBHOOK_READY_TIMEOUT)
+            except asyncio.TimeoutError:
+                await _shared_call(shared_state.release_update, update_id)
+                return web.Response(status=503)
+
         update = Update.de_json(data, application.bot)
         await application.process_update(update)
-        logger.info("✅ Обновление обработано")
+
+        if STARTUP["first_update"] is None:
+            STARTUP["first_update"] = round(time.perf_counter() - PROCESS_START, 3)
+            logger.info(f"⏱ Первое обновление обработано через {STARTUP['first_update']} с после запуска")
+
+        logger.info("✅ Обновление обработано", extra={"sample": "update_ok"})
         return web.Response()
     except Exception as e:
         logger.error(f"❌ Ошибка в webhook_handler: {e}", exc_info=True)
+        if update_id is not None:
+            await _shared_call(shared_state.release_update, update_id)
         return web.Response(status=500)
 
 # === Health Check ===
 async def health_check(request):
+    if not bot_ready.is_set():
+        return web.json_response({"status": "starting", "startup": STARTUP})
+
     try:
         start_time = datetime.now()
         bot_info = await application.bot.get_me()
@@ -124,6 +188,14 @@ async def health_check(request):
                 "response_time": f"{response_time:.3f}s"
             },
             "uptime": get_uptime(),
+            "startup": STARTUP,
+            "breakers": breakers_snapshot(),
+            "worker": {
+                "id": shared_state.WORKER_ID,
+                "pid": os.getpid(),
+                "workers": shared_state.WORKERS,
+                "leader": shared_state.is_leader()
+            },
             "version": "2.0"
         })
     except Exception as e:
@@ -133,17 +205,30 @@ async def health_check(request):
             "message": str(e)
         }, status=500)
 
+# === Webhook ===
+async def ensure_webhook(webhook_url: str):
+    """Ставит webhook, только если в Telegram сейчас указан другой адрес"""
+    webhook_info = await application.bot.get_webhook_info()
+    if webhook_info.url == webhook_url:
+        logger.info("🌐 Webhook уже установлен")
+        return
+
+    await application.bot.set_webhook(webhook_url)
+    logger.info(f"🌐 Webhook установлен: {webhook_url}")
+
 # === Настройка приложения Telegram Bot ===
 async def setup_bot():
     global application
 
     try:
-        init_db()
         defaults = Defaults(parse_mode=ParseMode.HTML)
-        application = Application.builder().token(BOT_TOKEN).defaults(defaults).build()
+        builder = Application.builder().token(BOT_TOKEN).defaults(defaults)
+        if TELEGRAM_API_URL:
+            builder = builder.base_url(f"{TELEGRAM_API_URL}/bot").base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+        application = builder.build()
 
-        await application.initialize()
-        await application.start()
+        # База (в отдельном потоке) и initialize() с getMe независимы — выполняем параллельно
+        await asyncio.gather(asyncio.to_thread(init_db), application.initialize())
 
         # === Команды ===
         application.add_handler(CommandHandler("start", start))
@@ -153,26 +238,44 @@ async def setup_bot():
         application.add_handler(CommandHandler("subscribe", subscribe))
         application.add_handler(CommandHandler("unsubscribe", unsubscribe))
         application.add_handler(CommandHandler("status", subscription_status))
+        application.add_handler(CommandHandler("time", delivery_time))
+        application.add_handler(CommandHandler("timezone", delivery_timezone))
+        application.add_handler(CommandHandler("digest", digest_settings))
 
         application.add_handler(CommandHandler("horoscope", horoscope_today))
         application.add_handler(CommandHandler("tomorrow", horoscope_tomorrow))
+        application.add_handler(CommandHandler("week", horoscope_week))
+        application.add_handler(CommandHandler("month", horoscope_month))
         application.add_handler(CommandHandler("moon", moon))
 
         application.add_handler(CommandHandler("tarot", tarot))
         application.add_handler(CommandHandler("tarot3", tarot3))
         application.add_handler(CommandHandler("tarot5", tarot5))
         application.add_handler(CommandHandler("compatibility", compatibility))
+        application.add_handler(CommandHandler("history", history))
+        application.add_handler(CommandHandler("natal", natal_chart))
 
         application.add_handler(CommandHandler("newusers", new_users))  # ✅ Аналитика
+        application.add_handler(CommandHandler("warmup_cards", warmup_cards))
+        application.add_handler(CommandHandler("memory", memory))
+        application.add_handler(CommandHandler("bundle", bundle))
 
         application.add_handler(CallbackQueryHandler(button_handler))
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, reply_command_handler))
 
         application.add_error_handler(error_handler)
-        setup_scheduler(application)
 
-        # === Инфо о боте
-        bot_info = await application.bot.get_me()
+        # === Запуск, webhook и планировщик тоже независимы
+        from scheduler import setup_scheduler
+        webhook_url = f"{RENDER_URL}/webhook/{BOT_TOKEN}"
+        await asyncio.gather(
+            application.start(),
+            ensure_webhook(webhook_url),
+            asyncio.to_thread(setup_scheduler, application, asyncio.get_running_loop()),
+        )
+
+        # === Инфо о боте (закэшировано initialize())
+        bot_info = application.bot.bot
         logger.info(f"""
         === Бот подключен ===
         🤖 Имя: {bot_info.first_name}
@@ -180,31 +283,107 @@ async def setup_bot():
         📛 Юзернейм: @{bot_info.username}
         """)
 
-        # === Устанавливаем webhook
-        webhook_path = f"/webhook/{BOT_TOKEN}"
-        webhook_url = f"{RENDER_URL}{webhook_path}"
-        await application.bot.delete_webhook()
-        await application.bot.set_webhook(webhook_url)
-
-        logger.info(f"🌐 Webhook установлен: {webhook_url}")
-
     except Exception as e:
         logger.error(f"Ошибка при старте бота: {e}", exc_info=True)
         raise
 
+async def start_bot():
+    """Фоновая настройка бота после открытия порта"""
+    try:
+        await setup_bot()
+    except Exception:
+        logger.critical("❌ Бот не запустился. Завершение процесса.")
+        os.kill(os.getpid(), signal.SIGTERM)  # run_app корректно остановит сервер
+        return
+
+    bot_ready.set()
+    STARTUP["bot_ready"] = round(time.perf_counter() - PROCESS_START, 3)
+    logger.info(f"⏱ Бот готов через {STARTUP['bot_ready']} с после запуска")
+
+async def on_startup(app):
+    update_recorder.start()
+    if memory_profiler.SAMPLE_INTERVAL:
+        memory_profiler.start()  # До импорта обработчиков: их данные тоже попадут в снимки
+    app["setup_task"] = asyncio.create_task(start_bot())
+    app["keep_alive_task"] = None
+    if shared_state.WORKER_ID == "0":  # Достаточно одного воркера
+        app["keep_alive_task"] = asyncio.create_task(keep_alive())  # Пинг every 14 min
+
+async def on_shutdown(app):
+    """Останавливает фоновые задачи и приложение бота до закрытия цикла"""
+    for key in ("setup_task", "keep_alive_task"):
+        if app[key]:
+            app[key].cancel()
+    # application ещё None, если setup_bot упал или отменён до builder.build()
+    if application is not None and application.running:
+        await application.stop()
+    if bot_ready.is_set():
+        await application.shutdown()
+    update_recorder.stop()
+    await asyncio.to_thread(shared_state.release_lease)
+
+def on_port_bound(message: str):
+    """Вызывается web.run_app сразу после открытия порта"""
+    STARTUP["port_bound"] = round(time.perf_counter() - PROCESS_START, 3)
+    logger.info(message.strip())
+    logger.info(f"⏱ Порт {PORT} открыт через {STARTUP['port_bound']} с после запуска")
+
 # === Точка входа ===
 async def main():
-    await setup_bot()
-
     app = web.Application()
     app.router.add_get("/", health_check)
     app.router.add_post(f"/webhook/{BOT_TOKEN}", webhook_handler)
+    app.router.add_get("/cards/{name}", card_asset_handler)
 
-    asyncio.create_task(keep_alive())  # Пинг every 14 min
+    # Порт открывается сразу, бот настраивается в фоне
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
     return app
 
+def run_workers():
+    """
+    Супервизор режима WEB_CONCURRENCY > 1: запускает воркеры этим же скриптом
+    с WORKER_ID, перезапускает упавшие и передаёт им SIGTERM/SIGINT.
+    Воркеры слушают один порт через SO_REUSEPORT, ядро распределяет соединения.
+    """
+    shared_state.init()
+    stopping = False
+    workers = {}
+
+    def spawn(worker_id: int):
+        env = dict(os.environ, WORKER_ID=str(worker_id))
+        workers[worker_id] = subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env)
+        logger.info(f"👷 Воркер {worker_id} запущен, pid {workers[worker_id].pid}")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for proc in workers.values():
+            if proc.poll() is None:
+                proc.send_signal(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for worker_id in range(shared_state.WORKERS):
+        spawn(worker_id)
+
+    while workers:
+        time.sleep(1)
+        for worker_id, proc in list(workers.items()):
+            if proc.poll() is None:
+                continue
+            if stopping:
+                del workers[worker_id]
+                continue
+            logger.warning(f"⚠️ Воркер {worker_id} завершился с кодом {proc.returncode}, перезапуск")
+            spawn(worker_id)
+
 if __name__ == "__main__":
     try:
-        web.run_app(main(), port=PORT)
+        if shared_state.MULTI_WORKER and "WORKER_ID" not in os.environ:
+            run_workers()
+        else:
+            web.run_app(main(), port=PORT, print=on_port_bound, reuse_port=shared_state.MULTI_WORKER)
     except Exception as e:
         logger.critical(f"❌ Ошибка запуска: {e}", exc_info=True)
@@ -0,0 +1,110 @@
+"""
+Реестр callback_data: короткие ASCII-коды действий вместо длинных строк.
+Формат: "<код>[:<арг>...]", знаки и дни передаются индексами.
+Пример: "h:7:0:1" — подробный гороскоп Скорпиона на сегодня.
+"""
+
+from services.reference import ZODIAC
+
+# Порядок знаков (services.reference.ZODIAC) задаёт их индекс в callback_data
+SIGNS = tuple(sign.ru for sign in ZODIAC)
+SIGN_INDEX = {sign.ru: sign.index for sign in ZODIAC}
+
+DAYS = ("today", "tomorrow", "week", "month")  # новые периоды — только в конец
+
+# === Коды действий ===
+MAIN_MENU = "m"
+HOROSCOPE_MENU = "hm"
+ZODIAC = "z"                  # z:<день> — выбор знака
+HOROSCOPE = "h"               # h:<знак>:<день>:<подробно>
+TAROT_MENU = "tm"
+TAROT = "t1"
+TAROT3 = "t3"
+TAROT5 = "t5"
+MOON = "mo"
+COMPATIBILITY = "c"
+COMPATIBILITY_FIRST = "cf"    # cf:<знак>
+COMPATIBILITY_SECOND = "cs"   # cs:<первый знак>:<второй знак> — выбор первого знака едет в кнопке
+SUBSCRIBE = "s"
+SUBSCRIBE_SIGN = "ss"         # ss:<знак>
+MAGIC_8BALL = "8"
+MAGIC_8BALL_ANSWER = "8a"
+HISTORY = "hi"                # hi:<id последней показанной записи>
+DIGEST = "dg"
+DIGEST_TOGGLE = "dt"          # dt:<индекс продукта в services.digest.PRODUCTS>
+
+ACTIONS = frozenset({
+    MAIN_MENU, HOROSCOPE_MENU, ZODIAC, HOROSCOPE,
+    TAROT_MENU, TAROT, TAROT3, TAROT5, MOON,
+    COMPATIBILITY, COMPATIBILITY_FIRST, COMPATIBILITY_SECOND,
+    SUBSCRIBE, SUBSCRIBE_SIGN, MAGIC_8BALL, MAGIC_8BALL_ANSWER, HISTORY,
+    DIGEST, DIGEST_TOGGLE,
+})
+
+
+def encode(action: str, *args) -> str:
+    """encode(HOROSCOPE, 7, 0, 1) → "h:7:0:1" """
+    if not args:
+        return action
+    return ":".join((action, *map(str, args)))
+
+
+def decode(data: str) -> tuple:
+    """
+    Разбирает callback_data в (код, [аргументы]).
+    Для неизвестных данных возвращает (None, []).
+    """
+    action, *args = data.split(":")
+    if action in ACTIONS:
+        return action, args
+    return _decode_legacy(data)
+
+
+# === Старые callback_data ===
+# Кнопки в уже отправленных сообщениях продолжают присылать прежний формат
+_LEGACY_EXACT = {
+    "main_menu": MAIN_MENU,
+    "back_to_menu": MAIN_MENU,
+    "horoscope_menu": HOROSCOPE_MENU,
+    "tarot_menu": TAROT_MENU,
+    "tarot": TAROT,
+    "tarot3": TAROT3,
+    "tarot5": TAROT5,
+    "moon": MOON,
+    "compatibility": COMPATIBILITY,
+    "subscribe": SUBSCRIBE,
+    "magic_8ball": MAGIC_8BALL,
+    "magic_8ball_answer": MAGIC_8BALL_ANSWER,
+    "magic_8ball_repeat": MAGIC_8BALL_ANSWER,
+}
+
+
+def _decode_legacy(data: str) -> tuple:
+    if data in _LEGACY_EXACT:
+        return _LEGACY_EXACT[data], []
+    if data in ("horoscope_today", "horoscope_tomorrow"):
+        return ZODIAC, [str(DAYS.index(data.removeprefix("horoscope_")))]
+    if data.startswith("subscribe_"):
+        data = "subscribe:" + data.removeprefix("subscribe_")
+
+    prefix, *parts = data.split(":")
+    try:
+        if prefix == "horoscope_menu":
+            return ZODIAC, [str(DAYS.index(parts[0]))]
+        if prefix == "history":
+            return HISTORY, parts[:1]
+
+        sign = str(SIGN_INDEX[parts[0]])
+        if prefix == "horoscope" and len(parts) == 3:
+            return HOROSCOPE, [sign, str(DAYS.index(parts[1])), str(int(parts[2] == "true"))]
+        if prefix in ("horoscope", "horoscope_tomorrow"):
+            return HOROSCOPE, [sign, str(int(prefix == "horoscope_tomorrow")), "0"]
+        if prefix == "compatibility_first":
+            return COMPATIBILITY_FIRST, [sign]
+        if prefix == "compatibility_second":
+            return COMPATIBILITY_SECOND, [sign]
+        if prefix == "subscribe":
+            return SUBSCRIBE_SIGN, [sign]
+    except (IndexError, KeyError, ValueError):
+        pass
+    return None, []
@@ -0,0 +1,169 @@
+# handlers/admin.py
+
+import html
+import asyncio
+import logging
+
+from telegram import Update, InputMediaPhoto
+from telegram.ext import ContextTypes
+
+from handlers.stats import ADMIN_IDS
+from services.card_media import card_media, is_uploaded, remember_file_ids
+from services.tarot import get_deck
+from services import memory_profiler, reference, data_bundle
+from services.text_split import split_message
+
+logger = logging.getLogger(__name__)
+
+MEDIA_GROUP_SIZE = 10  # максимум фото в одной media group
+
+
+# 🖼 /warmup_cards — заранее загрузить все карты в Telegram и сохранить file_id
+async def warmup_cards(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+
+    if user.id not in ADMIN_IDS:
+        await update.message.reply_text("🚫 Доступ запрещён.")
+        return
+
+    pending = [card.id for card in get_deck() if not is_uploaded(card.id)]
+    if not pending:
+        await update.message.reply_text("✅ Все карты уже загружены.")
+        return
+
+    await update.message.reply_text(f"⏳ Загружаю карт: {len(pending)}...")
+
+    uploaded = 0
+    for i in range(0, len(pending), MEDIA_GROUP_SIZE):
+        batch = pending[i:i + MEDIA_GROUP_SIZE]
+        try:
+            if len(batch) == 1:
+                sent = [await update.message.reply_photo(photo=card_media(batch[0]))]
+            else:
+                sent = await update.message.reply_media_group(
+                    media=[InputMediaPhoto(media=card_media(card_id)) for card_id in batch]
+                )
+            remember_file_ids(batch, sent)
+            uploaded += len(batch)
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки карт {batch}: {e}")
+
+        # Пауза между группами, чтобы не упереться в лимиты Telegram
+        await asyncio.sleep(1)
+
+    await update.message.reply_text(f"✅ Загружено карт: {uploaded} из {len(pending)}")
+
+
+def _kb(size: int, signed: bool = False) -> str:
+    return f"{size / 1024:+,.0f} KB" if signed else f"{size / 1024:,.0f} KB"
+
+
+def _memory_report(application) -> str:
+    lines = ["<b>📦 Кэши и структуры</b>", "<pre>"]
+    for label, entries, size in memory_profiler.structure_sizes(application):
+        count = "—" if entries is None else entries
+        lines.append(f"{html.escape(f'{label:<28}')}{count:>8}{_kb(size):>12}")
+    lines.append("</pre>")
+
+    if memory_profiler.is_tracing():
+        traced, peak = memory_profiler.traced_memory()
+        lines.append(f"🔬 tracemalloc: {traced / 2 ** 20:.1f} MB, пик {peak / 2 ** 20:.1f} MB")
+    else:
+        lines.append("🔬 tracemalloc выключен: /memory start")
+    return "\n".join(lines)
+
+
+def _modules_report(title: str, sizes, signed: bool = False) -> str:
+    # Имена вроде <frozen abc> и <string> ломают HTML-разметку: экранируем после выравнивания
+    rows = [f"{html.escape(f'{module[:32]:<34}')}{_kb(size, signed):>12}" for module, size in sizes]
+    return f"<b>{title}</b>\n<pre>" + ("\n".join(rows) or "пусто") + "</pre>"
+
+
+# 🔬 /memory [start|snapshot|diff|stop] — профилирование памяти процесса
+async def memory(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+
+    if user.id not in ADMIN_IDS:
+        await update.message.reply_text("🚫 Доступ запрещён.")
+        return
+
+    action = context.args[0].lower() if context.args else "status"
+    try:
+        if action == "start":
+            started = memory_profiler.start()
+            text = "🔬 tracemalloc включён. Дальше: /memory snapshot, затем /memory diff" if started \
+                else "ℹ️ tracemalloc уже включён."
+        elif action == "stop":
+            memory_profiler.stop()
+            text = "🔬 tracemalloc выключен, снимки удалены."
+        elif action in ("snapshot", "diff"):
+            if not memory_profiler.is_tracing():
+                text = "⚠️ Сначала /memory start"
+            elif action == "snapshot":
+                # Снимок большого процесса занимает секунды — не блокируем обработку обновлений
+                top = await asyncio.to_thread(memory_profiler.take_snapshot)
+                text = _modules_report("📸 Снимок сохранён. Больше всего выделено в:", top.items())
+            else:
+                growth = await asyncio.to_thread(memory_profiler.diff)
+                text = _modules_report("📈 Рост с последнего снимка по модулям:", growth, signed=True)
+        else:
+            text = await asyncio.to_thread(_memory_report, context.application)
+    except RuntimeError as e:
+        text = f"⚠️ {e}. Сначала /memory snapshot"
+
+    for part in split_message(text, html=True):
+        await update.message.reply_text(part, parse_mode="HTML")
+
+
+def _bundle_status() -> str:
+    active = data_bundle.active_version() or f"нет ({data_bundle.JSON_VERSION})"
+    sizes, checksums = reference.loaded_sizes(), reference.loaded_checksums()
+    lines = [
+        f"📦 Активная версия: <code>{active}</code>",
+        f"Загружена в этом процессе: <code>{reference.loaded_version or '—'}</code>",
+        "<pre>",
+    ]
+    for name in data_bundle.COMPILERS:
+        if name in sizes:
+            lines.append(f"{name:<16}{sizes[name]:>6}  {checksums[name][:12]}")
+        else:
+            lines.append(f"{name:<16}{'не загружен':>20}")
+    lines.append("</pre>")
+
+    versions = data_bundle.list_bundles()[:5]
+    if versions:
+        lines.append("Последние бандлы:\n" + "\n".join(f"<code>{version}</code>" for version in versions))
+    return "\n".join(lines)
+
+
+# 📦 /bundle [build|load <версия>] — версии справочных данных без перезапуска
+async def bundle(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+
+    if user.id not in ADMIN_IDS:
+        await update.message.reply_text("🚫 Доступ запрещён.")
+        return
+
+    action = context.args[0].lower() if context.args else "status"
+    try:
+        if action == "build":
+            version, _ = await asyncio.to_thread(data_bundle.build)
+            text = f"📦 Собран бандл <code>{version}</code>\nАктивировать: /bundle load {version}"
+        elif action == "load" and len(context.args) > 1:
+            version = context.args[1]
+            changed = await asyncio.to_thread(data_bundle.install, version)
+            logger.info(f"📦 Бандл {version} активирован админом {user.id}")
+            text = (
+                f"✅ Активна версия <code>{version}</code>\n"
+                + (f"Обновлены: {', '.join(changed)}" if changed else "Данные не изменились")
+            )
+        else:
+            text = await asyncio.to_thread(_bundle_status)
+    except data_bundle.BundleError as e:
+        text = f"❌ Бандл отклонён: {e}"
+    except Exception as e:
+        logger.error(f"❌ Ошибка /bundle: {e}")
+        text = f"❌ Ошибка: {e}"
+
+    for part in split_message(text, html=True):
+        await update.message.reply_text(part, parse_mode="HTML")
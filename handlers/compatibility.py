@@ -1,127 +1,150 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-import json
-import os
-import copy
+import logging
+from functools import lru_cache
 
 from keyboards import get_back_to_menu_inline
+from callbacks import encode, COMPATIBILITY_FIRST, COMPATIBILITY_SECOND, MAIN_MENU
+from services.reference import ZODIAC, ZODIAC_ROWS, find_sign, get_compatibility, on_change
+
+logger = logging.getLogger(__name__)
+
+NOT_FOUND_TEXT = "⚠️ Данные о совместимости не найдены."
+
+
+def build_compatibility_table() -> tuple:
+    """
+    Собирает готовые сообщения для всех 144 пар знаков из services.reference.
+    Индекс пары: i * 12 + j.
+    """
+    table = []
+    for sign1 in ZODIAC:
+        for sign2 in ZODIAC:
+            compatibility = get_compatibility(sign1, sign2)
+            if compatibility is None:
+                table.append(NOT_FOUND_TEXT)
+                continue
+            table.append(
+                f"<b>Совместимость {sign1.title} + {sign2.title}</b>\n\n"
+                f"✨ <b>Общая:</b> {compatibility.general}\n"
+                f"❤️ <b>Любовь:</b> {compatibility.love}\n"
+                f"👫 <b>Дружба:</b> {compatibility.friendship}\n"
+                f"💼 <b>Работа:</b> {compatibility.work}\n\n"
+                f"<i>{compatibility.description}</i>"
+            )
+    return tuple(table)
+
+
+# Таблица готовых сообщений строится один раз при загрузке модуля и заново — при новой версии данных
+COMPATIBILITY_TABLE = build_compatibility_table()
 
 
-# Загрузка данных совместимости из JSON
-with open("data/compatibility.json", encoding="utf-8") as f:
-    COMPATIBILITY_DATA = json.load(f)
+def _rebuild_table(old, new):
+    global COMPATIBILITY_TABLE
+    COMPATIBILITY_TABLE = build_compatibility_table()
 
-# Автоматическое добавление обратных сочетаний
-for sign1 in list(COMPATIBILITY_DATA.keys()):
-    for sign2 in COMPATIBILITY_DATA[sign1]:
-        if sign2 not in COMPATIBILITY_DATA:
-            COMPATIBILITY_DATA[sign2] = {}
-        if sign1 not in COMPATIBILITY_DATA[sign2]:
-            COMPATIBILITY_DATA[sign2][sign1] = copy.deepcopy(COMPATIBILITY_DATA[sign1][sign2])
 
+on_change("compatibility", _rebuild_table)
 
-# Клавиатура выбора знака зодиака
-def get_sign_selection_keyboard(step: str = "first"):
-    signs = [
-        ["Овен", "Телец", "Близнецы"],
-        ["Рак", "Лев", "Дева"],
-        ["Весы", "Скорпион", "Стрелец"],
-        ["Козерог", "Водолей", "Рыбы"]
-    ]
+
+# Клавиатура выбора знака зодиака (строится один раз на каждый шаг и первый знак).
+# Состояние не хранится на сервере: кнопки второго шага несут индекс первого знака
+@lru_cache(maxsize=None)
+def get_sign_selection_keyboard(step: str = "first", first_index: int = None):
+    def callback_data(sign) -> str:
+        if step == "first":
+            return encode(COMPATIBILITY_FIRST, sign.index)
+        return encode(COMPATIBILITY_SECOND, first_index, sign.index)
 
     keyboard = []
-    for row in signs:
+    for row in ZODIAC_ROWS:
         keyboard_row = [
-            InlineKeyboardButton(
-                sign, callback_data=f"compatibility_{step}:{sign.lower()}"
-            ) for sign in row
+            InlineKeyboardButton(sign.title, callback_data=callback_data(sign)) for sign in row
         ]
         keyboard.append(keyboard_row)
 
-    keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")])
+    keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data=MAIN_MENU)])
     return InlineKeyboardMarkup(keyboard)
 
 
 # Получение текста совместимости
+def get_compatibility_text_by_index(i: int, j: int) -> str:
+    return COMPATIBILITY_TABLE[i * len(ZODIAC) + j]
+
+
 def get_compatibility_text(sign1: str, sign2: str) -> str:
-    try:
-        compatibility = COMPATIBILITY_DATA[sign1.lower()][sign2.lower()]
-        return (
-            f"<b>Совместимость {sign1.title()} + {sign2.title()}</b>\n\n"
-            f"✨ <b>Общая:</b> {compatibility['general']}\n"
-            f"❤️ <b>Любовь:</b> {compatibility['love']}\n"
-            f"👫 <b>Дружба:</b> {compatibility['friendship']}\n"
-            f"💼 <b>Работа:</b> {compatibility['work']}\n\n"
-            f"<i>{compatibility['description']}</i>"
+    first, second = find_sign(sign1), find_sign(sign2)
+    if first is None or second is None:
+        return NOT_FOUND_TEXT
+    return get_compatibility_text_by_index(first.index, second.index)
+
+
+async def _reply_error(update: Update, e: Exception):
+    error_message = f"[ERROR] Произошла ошибка: {str(e)}"
+    logger.error(error_message)
+    if update.callback_query:
+        await update.callback_query.message.edit_text(
+            error_message,
+            reply_markup=get_back_to_menu_inline()
+        )
+    else:
+        await update.message.reply_text(
+            error_message,
+            reply_markup=get_back_to_menu_inline()
         )
-    except Exception as e:
-        print(f"[ERROR] Ошибка при получении совместимости: {e}")
-        return "⚠️ Данные о совместимости не найдены."
 
 
-# Обработчик совместимости
+# Обработчик совместимости: выбор первого знака
 async def compatibility(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        if not hasattr(context, 'user_data'):
-            context.user_data = {}
-
         if update.callback_query:
-            query = update.callback_query
-            data = query.data
-
-            if data == "compatibility":
-                await query.message.edit_text(
-                    "❤️ Выберите первый знак зодиака:",
-                    reply_markup=get_sign_selection_keyboard("first")
-                )
-
-            elif data.startswith("compatibility_first:"):
-                sign = data.split(":")[1]
-                context.user_data['first_sign'] = sign
-
-                await query.message.edit_text(
-                    f"Первый знак: <b>{sign.title()}</b>\n\nВыберите второй знак:",
-                    reply_markup=get_sign_selection_keyboard("second"),
-                    parse_mode="HTML"
-                )
-
-            elif data.startswith("compatibility_second:"):
-                second_sign = data.split(":")[1]
-                first_sign = context.user_data.get('first_sign')
-
-                if not first_sign:
-                    await query.message.edit_text(
-                        "⚠️ Ошибка: сначала выберите первый знак.",
-                        reply_markup=get_back_to_menu_inline()
-                    )
-                    return
-
-                result = get_compatibility_text(first_sign, second_sign)
-
-                await query.message.edit_text(
-                    result,
-                    reply_markup=get_back_to_menu_inline(),
-                    parse_mode="HTML"
-                )
-
-                context.user_data.pop("first_sign", None)
-
+            await update.callback_query.message.edit_text(
+                "❤️ Выберите первый знак зодиака:",
+                reply_markup=get_sign_selection_keyboard("first")
+            )
         else:
             await update.message.reply_text(
                 "❤️ Выберите первый знак зодиака:",
                 reply_markup=get_sign_selection_keyboard("first")
             )
+    except Exception as e:
+        await _reply_error(update, e)
+
 
+# cf:<знак> — первый знак выбран
+async def compatibility_first(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        sign_index = int(context.args[0])
+
+        await update.callback_query.message.edit_text(
+            f"Первый знак: <b>{ZODIAC[sign_index].title}</b>\n\nВыберите второй знак:",
+            reply_markup=get_sign_selection_keyboard("second", sign_index),
+            parse_mode="HTML"
+        )
     except Exception as e:
-        error_message = f"[ERROR] Произошла ошибка: {str(e)}"
-        print(error_message)
-        if update.callback_query:
-            await update.callback_query.message.edit_text(
-                error_message,
-                reply_markup=get_back_to_menu_inline()
+        await _reply_error(update, e)
+
+
+# cs:<первый знак>:<второй знак> — оба знака выбраны, показываем результат
+async def compatibility_second(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        query = update.callback_query
+
+        # Кнопки старого формата (cs:<знак>) без первого знака: начинаем выбор заново
+        if len(context.args) < 2:
+            await query.message.edit_text(
+                "⚠️ Кнопка устарела. Выберите первый знак зодиака:",
+                reply_markup=get_sign_selection_keyboard("first")
             )
-        else:
-            await update.message.reply_text(
-                error_message,
-                reply_markup=get_back_to_menu_inline()
-            )
\ No newline at end of file
+            return
+
+        first_index, second_index = map(int, context.args[:2])
+
+        await query.message.edit_text(
+            get_compatibility_text_by_index(first_index, second_index),
+            reply_markup=get_back_to_menu_inline(),
+            parse_mode="HTML"
+        )
+
+    except Exception as e:
+        await _reply_error(update, e)
@@ -0,0 +1,61 @@
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+
+from services.database import get_predictions_page
+from services.tarot import SPREADS, card_title
+from callbacks import encode, HISTORY, MAIN_MENU
+
+PAGE_SIZE = 5
+
+
+def format_prediction(prediction_type: str, cards, text: str, date: str) -> str:
+    """Краткая строка истории: дата, расклад и выпавшие карты"""
+    if cards is None:
+        # Старая запись, сохранённая целиком текстом
+        preview = (text or "").strip()
+        if len(preview) > 200:
+            preview = preview[:200] + "…"
+        return f"🗓 <b>{date}</b>\n{preview}"
+
+    title = SPREADS.get(prediction_type, (prediction_type,))[0]
+    names = ", ".join(card_title(card_id, is_reversed) for card_id, is_reversed in cards)
+    return f"🗓 <b>{date}</b> — {title}\n{names}"
+
+
+def get_history_keyboard(before_id: int = None) -> InlineKeyboardMarkup:
+    buttons = []
+    if before_id is not None:
+        buttons.append([InlineKeyboardButton("⬇️ Раньше", callback_data=encode(HISTORY, before_id))])
+    buttons.append([InlineKeyboardButton("🏠 Главное меню", callback_data=MAIN_MENU)])
+    return InlineKeyboardMarkup(buttons)
+
+
+# 📚 /history — история раскладов, по PAGE_SIZE записей на страницу
+async def history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    before_id = None
+
+    # hi:<id> — следующая страница
+    if update.callback_query and context.args and context.args[0].isdigit():
+        before_id = int(context.args[0])
+
+    # Берём на одну запись больше, чтобы понять, есть ли следующая страница
+    rows = get_predictions_page(chat_id, before_id=before_id, limit=PAGE_SIZE + 1)
+    has_more = len(rows) > PAGE_SIZE
+    rows = rows[:PAGE_SIZE]
+
+    if not rows:
+        text = "📭 История раскладов пока пуста."
+        next_id = None
+    else:
+        text = "📚 <b>История раскладов</b>\n\n" + "\n\n".join(
+            format_prediction(prediction_type, cards, row_text, date)
+            for _, prediction_type, cards, row_text, date in rows
+        )
+        next_id = rows[-1][0] if has_more else None
+
+    reply_markup = get_history_keyboard(next_id)
+    if update.callback_query:
+        await update.callback_query.message.edit_text(text, reply_markup=reply_markup, parse_mode="HTML")
+    else:
+        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode="HTML")
@@ -1,66 +1,123 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from telegram.error import BadRequest
+from telegram.error import BadRequest, RetryAfter
+import asyncio
 import logging
 import time
-from datetime import datetime
+from datetime import timedelta
+from functools import lru_cache
 
-from services.generate_horoscope import generate_horoscope  # ✅ Обновлённый единственный генератор
+from services.generate_horoscope import stream_horoscope, target_date, LONG_PERIODS  # ✅ Потоковый генератор
 from keyboards import get_zodiac_inline_keyboard, get_back_to_menu_inline
+from services.text_split import split_message, text_length, TEXT_LIMIT
+from callbacks import encode, SIGNS, DAYS, HOROSCOPE, ZODIAC, MAIN_MENU
+from services.reference import find_sign
 
 logger = logging.getLogger(__name__)
 
-# Карта знаков зодиака
-ZODIAC_SIGNS = {
-    "овен":      {"eng": "aries",       "emoji": "♈️", "element": "🔥 Огонь",    "planet": "♂️ Марс"},
-    "телец":     {"eng": "taurus",      "emoji": "♉️", "element": "🌍 Земля",    "planet": "♀️ Венера"},
-    "близнецы":  {"eng": "gemini",      "emoji": "♊️", "element": "💨 Воздух",   "planet": "☿ Меркурий"},
-    "рак":       {"eng": "cancer",      "emoji": "♋️", "element": "💧 Вода",     "planet": "🌙 Луна"},
-    "лев":       {"eng": "leo",         "emoji": "♌️", "element": "🔥 Огонь",    "planet": "☀️ Солнце"},
-    "дева":      {"eng": "virgo",       "emoji": "♍️", "element": "🌍 Земля",    "planet": "☿ Меркурий"},
-    "весы":      {"eng": "libra",       "emoji": "♎️", "element": "💨 Воздух",   "planet": "♀️ Венера"},
-    "скорпион":  {"eng": "scorpio",     "emoji": "♏️", "element": "💧 Вода",     "planet": "♇ Плутон"},
-    "стрелец":   {"eng": "sagittarius", "emoji": "♐️", "element": "🔥 Огонь",    "planet": "♃ Юпитер"},
-    "козерог":   {"eng": "capricorn",   "emoji": "♑️", "element": "🌍 Земля",    "planet": "♄ Сатурн"},
-    "водолей":   {"eng": "aquarius",    "emoji": "♒️", "element": "💨 Воздух",   "planet": "⛢ Уран"},
-    "рыбы":      {"eng": "pisces",      "emoji": "♓️", "element": "💧 Вода",     "planet": "♆ Нептун"}
+# Не чаще одного редактирования в STREAM_EDIT_INTERVAL секунд: лимиты Telegram на правки
+STREAM_EDIT_INTERVAL = 1.5
+
+DAY_TITLES = {"today": "сегодня", "tomorrow": "завтра", "week": "неделю", "month": "месяц"}
+SIGN_MENU_TEXTS = {
+    "today": "🔮 Выберите знак зодиака:",
+    "tomorrow": "🌜 Выберите знак зодиака:",
+    "week": "📅 Гороскоп на неделю. Выберите знак зодиака:",
+    "month": "🗓 Гороскоп на месяц. Выберите знак зодиака:",
 }
 
 
+@lru_cache(maxsize=None)
 def get_horoscope_actions_keyboard(sign: str, day: str, detailed: bool = False):
     buttons = []
+    day_index = DAYS.index(day)
 
-    if not detailed:
+    if not detailed and day not in LONG_PERIODS:
         buttons.append([
-            InlineKeyboardButton("📝 Подробнее", callback_data=f"horoscope:{sign}:{day}:true")
+            InlineKeyboardButton("📝 Подробнее", callback_data=encode(HOROSCOPE, find_sign(sign).index, day_index, 1))
         ])
 
     buttons.extend([
-        [InlineKeyboardButton("🔮 Другой знак", callback_data=f"horoscope_menu:{day}")],
-        [InlineKeyboardButton("« Назад в меню", callback_data="main_menu")]
+        [InlineKeyboardButton("🔮 Другой знак", callback_data=encode(ZODIAC, day_index))],
+        [InlineKeyboardButton("« Назад в меню", callback_data=MAIN_MENU)]
     ])
     
     return InlineKeyboardMarkup(buttons)
 
 
+async def _iterate_in_thread(generator):
+    """Синхронный генератор (requests) читается в отдельном потоке, не блокируя цикл событий"""
+    while True:
+        chunk = await asyncio.to_thread(next, generator, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+async def stream_to_message(message, header: str, chunks) -> str:
+    """
+    Показывает нарастающий текст в message, редактируя его не чаще STREAM_EDIT_INTERVAL.
+    Финальное редактирование с клавиатурой делает вызывающий код.
+    :return: последний (полный) текст
+    """
+    text = ""
+    next_edit = 0.0
+
+    # Показываем предыдущий фрагмент, когда пришёл следующий: если ответ
+    # пришёл одним куском (например, из кэша), лишней правки не будет
+    async for chunk in _iterate_in_thread(chunks):
+        previous, text = text, chunk
+        now = time.monotonic()
+        if not previous or now < next_edit:
+            continue
+
+        preview = f"{header}{previous} ▍"
+        if text_length(preview, html=True) > TEXT_LIMIT:
+            continue  # Длинный текст покажем целиком в финальном сообщении
+
+        next_edit = now + STREAM_EDIT_INTERVAL
+        try:
+            await message.edit_text(preview, parse_mode="HTML")
+        except RetryAfter as e:
+            next_edit = now + e.retry_after
+        except BadRequest as e:
+            # Недописанная разметка или тот же текст — ждём следующий фрагмент
+            logger.debug(f"Промежуточное обновление пропущено: {e}")
+
+    return text
+
+
+def _period_label(day: str) -> str:
+    """13.10.2025 для дня, 13.10–19.10.2025 для недели, 10.2025 для месяца"""
+    start = target_date(day)
+    if day == "week":
+        end = start + timedelta(days=6)
+        return f"{start:%d.%m}–{end:%d.%m.%Y}"
+    if day == "month":
+        return f"{start:%m.%Y}"
+    return f"{start:%d.%m.%Y}"
+
+
 async def send_horoscope(update_or_query, sign: str, day: str, detailed: bool = False):
-    sign_lower = sign.lower()
+    sign_info = find_sign(sign)
 
-    if sign_lower not in ZODIAC_SIGNS:
+    if sign_info is None:
         text = "🚫 Неверный знак зодиака. Попробуйте ещё раз."
-        reply_markup = get_zodiac_inline_keyboard("horoscope")
+        reply_markup = get_zodiac_inline_keyboard("today")
         if hasattr(update_or_query, 'message'):
             await update_or_query.message.reply_text(text, reply_markup=reply_markup)
         else:
             await update_or_query.edit_message_text(text, reply_markup=reply_markup)
         return
 
-    sign_info = ZODIAC_SIGNS[sign_lower]
+    # Пользователь видит один и тот же вариант из пула в течение дня
+    user = getattr(update_or_query, "from_user", None) or update_or_query.effective_user
+    user_id = user.id if user else None
 
     loading_text = (
-        f"{sign_info['emoji']} Генерация гороскопа для {sign.title()}\n"
-        f"Стихия: {sign_info['element']}\n"
-        f"Управитель: {sign_info['planet']}\n\n"
+        f"{sign_info.emoji} Генерация гороскопа для {sign_info.title}\n"
+        f"Стихия: {sign_info.element}\n"
+        f"Управитель: {sign_info.planet}\n\n"
         "⏳ Пожалуйста, подождите..."
     )
 
@@ -69,12 +126,25 @@ async def send_horoscope(update_or_query, sign: str, day: str, detailed: bool =
     else:
         message = await update_or_query.edit_message_text(loading_text)
 
-    # Генерация гороскопа
+    if day in LONG_PERIODS:
+        title = f"Гороскоп на {DAY_TITLES[day]} ({_period_label(day)})"
+    else:
+        title = f"{'Подробный' if detailed else 'Краткий'} гороскоп на {DAY_TITLES[day]} ({_period_label(day)})"
+
+    header = (
+        f"{sign_info.emoji} <b>{sign_info.title}</b>\n"
+        f"Стихия: {sign_info.element}\n"
+        f"Планета: {sign_info.planet}\n"
+        f"<b>{title}</b>\n"
+        f"{'─' * 30}\n\n"
+    )
+
+    # Генерация гороскопа: текст появляется в сообщении по мере ответа GPT
     try:
         start_time = time.time()
-        horoscope_text = generate_horoscope(sign_info["eng"], day=day, detailed=detailed)
+        horoscope_text = await stream_to_message(message, header, stream_horoscope(sign_info.en, day=day, detailed=detailed, user_id=user_id))
         duration = time.time() - start_time
-        logger.info(f"Гороскоп для {sign} сгенерирован за {duration:.2f} сек")
+        logger.info("Гороскоп для %s сгенерирован за %.2f сек", sign, duration, extra={"sample": "horoscope_sent"})
     except Exception as e:
         logger.error(f"Ошибка генерации гороскопа: {e}")
         await message.edit_text(
@@ -83,98 +153,75 @@ async def send_horoscope(update_or_query, sign: str, day: str, detailed: bool =
         )
         return
 
-    day_text = "сегодня" if day == "today" else "завтра"
-    current_date = datetime.now().strftime("%d.%m.%Y")
+    # Делим заранее: первая часть заменяет сообщение загрузки, клавиатура — у последней
+    parts = split_message(header + horoscope_text, html=True)
+    reply_markup = get_horoscope_actions_keyboard(sign, day, detailed)
 
-    header = (
-        f"{sign_info['emoji']} <b>{sign.title()}</b>\n"
-        f"Стихия: {sign_info['element']}\n"
-        f"Планета: {sign_info['planet']}\n"
-        f"<b>{'Подробный' if detailed else 'Краткий'} гороскоп на {day_text} ({current_date})</b>\n"
-        f"{'─' * 30}\n\n"
+    await message.edit_text(
+        text=parts[0],
+        reply_markup=reply_markup if len(parts) == 1 else None,
+        parse_mode="HTML"
     )
-
-    response = header + horoscope_text
-
-    try:
-        await message.edit_text(
-            text=response,
-            reply_markup=get_horoscope_actions_keyboard(sign, day, detailed),
+    for i, part in enumerate(parts[1:], start=2):
+        await message.reply_text(
+            part,
+            reply_markup=reply_markup if i == len(parts) else None,
             parse_mode="HTML"
         )
-    except BadRequest as e:
-        if "Message is too long" in str(e):
-            parts = [response[i:i+4096] for i in range(0, len(response), 4096)]
-            for i, part in enumerate(parts):
-                if i == 0:
-                    await message.edit_text(part)
-                else:
-                    await message.reply_text(part)
-            await message.reply_text("Выберите действие:", reply_markup=get_horoscope_actions_keyboard(sign, day, detailed))
-        else:
-            raise
 
 
 # Команды
-async def horoscope_today(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def _choose_sign(update: Update, day: str):
     try:
-        reply_markup = get_zodiac_inline_keyboard("horoscope")
-        text = "🔮 Выберите знак зодиака:"
+        reply_markup = get_zodiac_inline_keyboard(day)
+        text = SIGN_MENU_TEXTS[day]
         if update.callback_query:
             await update.callback_query.answer()
             await update.callback_query.message.edit_text(text, reply_markup=reply_markup)
         else:
             await update.message.reply_text(text, reply_markup=reply_markup)
     except Exception as e:
-        logger.error(f"horoscope_today error: {e}")
+        logger.error(f"horoscope_{day} error: {e}")
         await update.effective_message.reply_text("⚠️ Ошибка. Попробуйте позже.", reply_markup=get_back_to_menu_inline())
 
 
+async def horoscope_today(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _choose_sign(update, "today")
+
+
 async def horoscope_tomorrow(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    try:
-        reply_markup = get_zodiac_inline_keyboard("horoscope_tomorrow")
-        text = "🌜 Выберите знак зодиака:"
-        if update.callback_query:
-            await update.callback_query.answer()
-            await update.callback_query.message.edit_text(text, reply_markup=reply_markup)
-        else:
-            await update.message.reply_text(text, reply_markup=reply_markup)
-    except Exception as e:
-        logger.error(f"horoscope_tomorrow error: {e}")
-        await update.effective_message.reply_text("⚠️ Ошибка. Попробуйте позже.", reply_markup=get_back_to_menu_inline())
+    await _choose_sign(update, "tomorrow")
+
+
+async def horoscope_week(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _choose_sign(update, "week")
 
 
-# Обработка нажатий кнопок зодиака
+async def horoscope_month(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _choose_sign(update, "month")
+
+
+# 🔁 Выбор знака для дня из callback_data: z:<день>
+async def horoscope_sign_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    day = DAYS[int(context.args[0])] if context.args else "today"
+    await query.message.edit_text(SIGN_MENU_TEXTS[day], reply_markup=get_zodiac_inline_keyboard(day))
+
+
+# Обработка нажатий кнопок зодиака: h:<знак>:<день>:<подробно>
 async def handle_zodiac_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         query = update.callback_query
-        await query.answer()
-        data = query.data
-
-        if ":" not in data:
-            await query.message.edit_text("⚠️ Неверные данные.", reply_markup=get_back_to_menu_inline())
-            return
-
-        parts = data.split(":")
 
-        # 🔁 Вернуться к выбору знака
-        if parts[0] == "horoscope_menu":
-            day = parts[1] if len(parts) > 1 else "today"
-            markup = get_zodiac_inline_keyboard("horoscope_tomorrow" if day == "tomorrow" else "horoscope")
-            text = "🔮 Выберите знак зодиака:" if day == "today" else "🌜 Выберите знак зодиака:"
-            await query.message.edit_text(text, reply_markup=markup)
+        try:
+            sign_index, day_index, detailed = map(int, context.args)
+            sign, day = SIGNS[sign_index], DAYS[day_index]
+        except (TypeError, ValueError, IndexError):
+            await query.message.edit_text("⚠️ Неверный формат данных гороскопа.", reply_markup=get_back_to_menu_inline())
             return
 
-        # 🤖 Обработка выбора знака и генерации гороскопа
-        if len(parts) == 4:
-            _, sign, day, detailed = parts
-            await send_horoscope(query, sign, day, detailed.lower() == "true")
-        elif len(parts) == 2:
-            prefix, sign = parts
-            day = "tomorrow" if prefix == "horoscope_tomorrow" else "today"
-            await send_horoscope(query, sign, day, detailed=False)
-        else:
-            await query.message.edit_text("⚠️ Неверный формат данных гороскопа.", reply_markup=get_back_to_menu_inline())
+        # 🤖 Генерация гороскопа
+        await send_horoscope(query, sign, day, bool(detailed))
 
     except Exception as e:
         logger.error(f"handle_zodiac_callback error: {e}")
@@ -13,6 +13,7 @@ from telegram.constants import ChatAction
 from telegram.ext import ContextTypes
 
 from keyboards import get_main_menu_keyboard
+from callbacks import MAGIC_8BALL_ANSWER, MAIN_MENU
 
 logger = logging.getLogger(__name__)
 
@@ -46,7 +47,7 @@ async def start_magic_8ball(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "Когда будете готовы — нажмите кнопку ниже 🎱"
         )
         markup = InlineKeyboardMarkup([[
-            InlineKeyboardButton("Узнать ответ у шара 🎱", callback_data="magic_8ball_answer")
+            InlineKeyboardButton("Узнать ответ у шара 🎱", callback_data=MAGIC_8BALL_ANSWER)
         ]])
         if update.callback_query:
             await update.callback_query.answer()
@@ -81,8 +82,8 @@ async def show_magic_8ball_answer(update: Update, context: ContextTypes.DEFAULT_
             f"<b>🎱 Магический шар говорит:</b>\n\n{answer}",
             parse_mode="HTML",
             reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("🌀 Ещё раз", callback_data="magic_8ball_repeat")],
-                [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
+                [InlineKeyboardButton("🌀 Ещё раз", callback_data=MAGIC_8BALL_ANSWER)],
+                [InlineKeyboardButton("🏠 Главное меню", callback_data=MAIN_MENU)]
             ])
         )
     except Exception as e:
@@ -1,52 +1,71 @@
 import logging
+from functools import lru_cache
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 from telegram.error import BadRequest
 
 # 📦 Импорт систем
-from keyboards import get_main_menu_keyboard, get_zodiac_inline_keyboard, get_back_to_menu_inline
-from services.lunar import get_lunar_text
+import callbacks
+from callbacks import encode, decode
+from keyboards import get_main_menu_keyboard, get_back_to_menu_inline
 from services.user_tracker import track_user  # ✅ Добавлено
-
-# 📥 Импорт обработчиков
-from handlers.horoscope import horoscope_today, horoscope_tomorrow, handle_zodiac_callback
-from handlers.tarot import tarot, tarot3
-from handlers.tarot5 import tarot5
-from handlers.compatibility import compatibility
-from handlers.subscribe import subscribe
-from handlers.magic8 import start_magic_8ball, show_magic_8ball_answer  # 🧿 Magic 8 Ball
+from lazy import lazy_handler
+
+# 📥 Обработчики (модули загружаются при первом вызове)
+horoscope_today = lazy_handler("handlers.horoscope", "horoscope_today")
+horoscope_tomorrow = lazy_handler("handlers.horoscope", "horoscope_tomorrow")
+horoscope_sign_menu = lazy_handler("handlers.horoscope", "horoscope_sign_menu")
+handle_zodiac_callback = lazy_handler("handlers.horoscope", "handle_zodiac_callback")
+tarot = lazy_handler("handlers.tarot", "tarot")
+tarot3 = lazy_handler("handlers.tarot", "tarot3")
+tarot5 = lazy_handler("handlers.tarot5", "tarot5")
+compatibility = lazy_handler("handlers.compatibility", "compatibility")
+compatibility_first = lazy_handler("handlers.compatibility", "compatibility_first")
+compatibility_second = lazy_handler("handlers.compatibility", "compatibility_second")
+subscribe = lazy_handler("handlers.subscribe", "subscribe")
+handle_subscription_callback = lazy_handler("handlers.subscribe", "handle_subscription_callback")
+digest_settings = lazy_handler("handlers.subscribe", "digest_settings")
+toggle_digest_product = lazy_handler("handlers.subscribe", "toggle_digest_product")
+history = lazy_handler("handlers.history", "history")
+start_magic_8ball = lazy_handler("handlers.magic8", "start_magic_8ball")  # 🧿 Magic 8 Ball
+show_magic_8ball_answer = lazy_handler("handlers.magic8", "show_magic_8ball_answer")
 
 logger = logging.getLogger(__name__)
 
 
 # 🏠 Главное меню (Inline)
+@lru_cache(maxsize=None)
 def get_main_menu_inline_keyboard():
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton("🌞 Гороскоп", callback_data="horoscope_menu")],
-        [InlineKeyboardButton("🃏 Таро", callback_data="tarot_menu")],
-        [InlineKeyboardButton("🌙 Лунный календарь", callback_data="moon")],
-        [InlineKeyboardButton("❤️ Совместимость", callback_data="compatibility")],
-        [InlineKeyboardButton("🧿 Магический шар", callback_data="magic_8ball")],
-        [InlineKeyboardButton("🔔 Подписка", callback_data="subscribe")]
+        [InlineKeyboardButton("🌞 Гороскоп", callback_data=callbacks.HOROSCOPE_MENU)],
+        [InlineKeyboardButton("🃏 Таро", callback_data=callbacks.TAROT_MENU)],
+        [InlineKeyboardButton("🌙 Лунный календарь", callback_data=callbacks.MOON)],
+        [InlineKeyboardButton("❤️ Совместимость", callback_data=callbacks.COMPATIBILITY)],
+        [InlineKeyboardButton("🧿 Магический шар", callback_data=callbacks.MAGIC_8BALL)],
+        [InlineKeyboardButton("🔔 Подписка", callback_data=callbacks.SUBSCRIBE)]
     ])
 
 
 # 🔮 Меню гороскопа
+@lru_cache(maxsize=None)
 def get_horoscope_menu_inline():
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton("✨ Сегодня", callback_data="horoscope_today")],
-        [InlineKeyboardButton("🌘 Завтра", callback_data="horoscope_tomorrow")],
-        [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
+        [InlineKeyboardButton("✨ Сегодня", callback_data=encode(callbacks.ZODIAC, 0))],
+        [InlineKeyboardButton("🌘 Завтра", callback_data=encode(callbacks.ZODIAC, 1))],
+        [InlineKeyboardButton("📅 На неделю", callback_data=encode(callbacks.ZODIAC, 2))],
+        [InlineKeyboardButton("🗓 На месяц", callback_data=encode(callbacks.ZODIAC, 3))],
+        [InlineKeyboardButton("🏠 Главное меню", callback_data=callbacks.MAIN_MENU)]
     ])
 
 
 # 🃏 Меню Таро
+@lru_cache(maxsize=None)
 def get_tarot_menu_inline():
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton("🃏 Карта дня", callback_data="tarot")],
-        [InlineKeyboardButton("🔮 Расклад из 3", callback_data="tarot3")],
-        [InlineKeyboardButton("🔮 Расклад из 5", callback_data="tarot5")],
-        [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
+        [InlineKeyboardButton("🃏 Карта дня", callback_data=callbacks.TAROT)],
+        [InlineKeyboardButton("🔮 Расклад из 3", callback_data=callbacks.TAROT3)],
+        [InlineKeyboardButton("🔮 Расклад из 5", callback_data=callbacks.TAROT5)],
+        [InlineKeyboardButton("🏠 Главное меню", callback_data=callbacks.MAIN_MENU)]
     ])
 
 
@@ -79,74 +98,60 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.effective_message.reply_text(f"⚠️ Произошла ошибка: {e}")
 
 
-# 🔘 Обработка inline-кнопок
-async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    data = query.data
-
-    try:
-        await query.answer()
+async def horoscope_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.message.edit_text("🔮 Выберите тип гороскопа:", reply_markup=get_horoscope_menu_inline())
 
-        match data:
-            case "horoscope_menu":
-                await query.message.edit_text("🔮 Выберите тип гороскопа:", reply_markup=get_horoscope_menu_inline())
 
-            case "tarot_menu":
-                await query.message.edit_text("🃏 Таро-расклады:", reply_markup=get_tarot_menu_inline())
+async def tarot_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.message.edit_text("🃏 Таро-расклады:", reply_markup=get_tarot_menu_inline())
 
-            case "moon":
-                text = get_lunar_text()
-                await query.message.edit_text(f"🌙 Лунный календарь:\n\n{text}", reply_markup=get_back_to_menu_inline())
 
-            case "subscribe":
-                await subscribe(update, context)
-
-            case "magic_8ball":
-                await start_magic_8ball(update, context)
-
-            case "magic_8ball_answer" | "magic_8ball_repeat":
-                await show_magic_8ball_answer(update, context)
-
-            case _ if data.startswith("compatibility"):
-                await compatibility(update, context)
+async def moon_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    from services.lunar import get_lunar_text  # ephem загружается только здесь
+    text = get_lunar_text()
+    await update.callback_query.message.edit_text(f"🌙 Лунный календарь:\n\n{text}", reply_markup=get_back_to_menu_inline())
 
-            case _ if data.startswith("subscribe_"):
-                from handlers.subscribe import handle_subscription_callback
-                await handle_subscription_callback(update, context)
 
-            case "main_menu" | "back_to_menu":
-                await start(update, context)
+# 🧭 Код действия из callback_data → обработчик
+CALLBACK_ROUTES = {
+    callbacks.MAIN_MENU: start,
+    callbacks.HOROSCOPE_MENU: horoscope_menu,
+    callbacks.ZODIAC: horoscope_sign_menu,
+    callbacks.HOROSCOPE: handle_zodiac_callback,
+    callbacks.TAROT_MENU: tarot_menu,
+    callbacks.TAROT: tarot,
+    callbacks.TAROT3: tarot3,
+    callbacks.TAROT5: tarot5,
+    callbacks.MOON: moon_menu,
+    callbacks.COMPATIBILITY: compatibility,
+    callbacks.COMPATIBILITY_FIRST: compatibility_first,
+    callbacks.COMPATIBILITY_SECOND: compatibility_second,
+    callbacks.SUBSCRIBE: subscribe,
+    callbacks.SUBSCRIBE_SIGN: handle_subscription_callback,
+    callbacks.MAGIC_8BALL: start_magic_8ball,
+    callbacks.MAGIC_8BALL_ANSWER: show_magic_8ball_answer,
+    callbacks.HISTORY: history,
+    callbacks.DIGEST: digest_settings,
+    callbacks.DIGEST_TOGGLE: toggle_digest_product,
+}
 
-            case "horoscope_today":
-                await query.message.edit_text(
-                    "🔮 Выберите знак зодиака:",
-                    reply_markup=get_zodiac_inline_keyboard("horoscope")
-                )
 
-            case "horoscope_tomorrow":
-                await query.message.edit_text(
-                    "🌜 Выберите знак зодиака:",
-                    reply_markup=get_zodiac_inline_keyboard("horoscope_tomorrow")
-                )
+# 🔘 Обработка inline-кнопок
+async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
 
-            case _ if data.startswith("horoscope_menu:"):
-                day = data.split(":")[1] if ":" in data else "today"
-                prefix = "horoscope_tomorrow" if day == "tomorrow" else "horoscope"
-                title = "🌜 Выберите знак зодиака:" if day == "tomorrow" else "🔮 Выберите знак зодиака:"
-                await query.message.edit_text(title, reply_markup=get_zodiac_inline_keyboard(prefix))
+    try:
+        await query.answer()
 
-            case "tarot":
-                await tarot(update, context)
-            case "tarot3":
-                await tarot3(update, context)
-            case "tarot5":
-                await tarot5(update, context)
+        # Аргументы из callback_data передаются обработчику через context.args
+        action, context.args = decode(query.data)
+        handler = CALLBACK_ROUTES.get(action)
 
-            case _ if data.startswith("horoscope:") or data.startswith("horoscope_tomorrow:"):
-                await handle_zodiac_callback(update, context)
+        if handler is None:
+            await query.message.edit_text("⚠️ Неизвестная команда. Вернитесь в меню:", reply_markup=get_back_to_menu_inline())
+            return
 
-            case _:
-                await query.message.edit_text("⚠️ Неизвестная команда. Вернитесь в меню:", reply_markup=get_back_to_menu_inline())
+        await handler(update, context)
 
     except Exception as e:
         logger.exception("Ошибка в button_handler")
@@ -0,0 +1,85 @@
+import html
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from services import natal
+from services.database import get_subscription, save_natal_chart, delete_natal_chart
+from services.delivery import DEFAULT_TIMEZONE, local_day
+
+NATAL_HELP = (
+    "🪐 <b>Личный гороскоп по натальной карте</b>\n\n"
+    "Укажи дату рождения, а по желанию — время и место:\n"
+    "/natal 15.04.1990\n"
+    "/natal 15.04.1990 14:30 Москва\n"
+    "/natal 15.04.1990 14:30 Europe/Berlin\n\n"
+    "Без времени рождения положение Луны неточно, и её транзиты не учитываются.\n"
+    "Личные транзиты можно получать в рассылке: /digest\n"
+    "Удалить данные: /natal удалить"
+)
+DELETE_WORDS = ("удалить", "delete")
+
+
+def _home_timezone(chat_id: int) -> str:
+    """Часовой пояс подписки — от него зависит «сегодня» пользователя"""
+    subscription = get_subscription(chat_id)
+    return subscription[1] if subscription else DEFAULT_TIMEZONE
+
+
+def _chart_summary(chart: natal.NatalChart) -> str:
+    born = chart.birth_date.strftime("%d.%m.%Y")
+    if chart.time_known:
+        born += f" {chart.birth_time.strftime('%H:%M')}"
+    if chart.place:
+        born += f", {html.escape(chart.place)}"
+
+    lines = [f"🪐 <b>Натальная карта</b> ({born})\n"]
+    for index, (planet, degree) in enumerate(zip(natal.PLANETS, chart.degrees)):
+        note = " (время рождения неизвестно — приблизительно)" if index == natal.MOON and not chart.time_known else ""
+        lines.append(f"{planet.symbol} {planet.title}: {natal.position_label(degree)}{note}")
+    return "\n".join(lines)
+
+
+def _today_text(chat_id: int) -> str:
+    day = local_day(_home_timezone(chat_id))
+    signature = natal.day_signature(chat_id, day)
+    return f"<b>🔭 Транзиты на {day.strftime('%d.%m.%Y')}</b>\n\n{natal.group_text(signature, day)}"
+
+
+# 🪐 /natal [дата [время] [место] | удалить] — натальная карта и личные транзиты на сегодня
+async def natal_chart(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+
+    if not context.args:
+        chart = natal.load_chart(chat_id)
+        if chart is None:
+            await update.message.reply_text(NATAL_HELP, parse_mode="HTML")
+            return
+        await update.message.reply_text(f"{_chart_summary(chart)}\n\n{_today_text(chat_id)}", parse_mode="HTML")
+        return
+
+    if context.args[0].lower() in DELETE_WORDS:
+        natal.forget_chat(chat_id)
+        if delete_natal_chart(chat_id):
+            await update.message.reply_text("🗑 Данные рождения удалены.")
+        else:
+            await update.message.reply_text("ℹ️ Данных рождения не было.")
+        return
+
+    try:
+        birth_date, birth_time, tz, place = natal.parse_birth(" ".join(context.args), _home_timezone(chat_id))
+    except ValueError as e:
+        await update.message.reply_text(f"⚠️ {html.escape(str(e))}\n\n{NATAL_HELP}", parse_mode="HTML")
+        return
+
+    degrees = natal.compute_chart(birth_date, birth_time, tz)
+    save_natal_chart(
+        chat_id, birth_date.isoformat(), birth_time.strftime("%H:%M") if birth_time else None,
+        tz, place, natal.pack_degrees(degrees)
+    )
+    natal.forget_chat(chat_id)
+
+    chart = natal.NatalChart(birth_date, birth_time, tz, place, degrees)
+    await update.message.reply_text(
+        f"✅ Карта сохранена.\n\n{_chart_summary(chart)}\n\n{_today_text(chat_id)}", parse_mode="HTML"
+    )
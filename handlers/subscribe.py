@@ -3,14 +3,22 @@ from telegram.ext import ContextTypes
 from services.database import (
     add_subscription,
     remove_subscription,
-    is_subscribed
+    get_subscription,
+    set_delivery_time,
+    get_products,
+    set_products
 )
-from keyboards import get_zodiac_subscribe_keyboard
+from services.delivery import DEFAULT_TIMEZONE, DEFAULT_HOUR, schedule, parse_timezone, timezone_label
+from services.digest import PRODUCTS, toggle_product
+from keyboards import get_zodiac_subscribe_keyboard, get_digest_keyboard
+from callbacks import SIGNS
 
-SIGNS = [
-    "овен", "телец", "близнецы", "рак", "лев", "дева",
-    "весы", "скорпион", "стрелец", "козерог", "водолей", "рыбы"
-]
+DELIVERY_HELP = (
+    "🕘 Изменить время: /time 8\n"
+    "🌍 Изменить часовой пояс: /timezone Europe/Berlin или /timezone +5\n"
+    "📰 Состав рассылки: /digest"
+)
+DIGEST_TEXT = "📰 Что присылать в ежедневной рассылке? Всё придёт одним сообщением."
 
 # ✅ /subscribe — вызывает кнопки со знаками
 async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -20,25 +28,26 @@ async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=get_zodiac_subscribe_keyboard()
         )
 
-# ✅ обработка нажатия кнопки: "subscribe_<sign>"
+# ✅ обработка нажатия кнопки: "ss:<индекс знака>"
 async def handle_subscription_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer()
-
-    data = query.data
-    sign = data.replace("subscribe_", "").lower()
 
-    if sign not in SIGNS:
+    try:
+        sign = SIGNS[int(context.args[0])]
+    except (TypeError, ValueError, IndexError):
         await query.message.reply_text("⚠️ Неизвестный знак зодиака.")
         return
 
     chat_id = query.message.chat_id
-    add_subscription(chat_id, sign)
+    current = get_subscription(chat_id)
+    tz, hour = (current[1], current[2]) if current else (DEFAULT_TIMEZONE, DEFAULT_HOUR)
+    add_subscription(chat_id, sign, *schedule(chat_id, tz, hour))
 
     await query.message.edit_text(
-        f"✅ Подписка на знак *{sign.capitalize()}* оформлена!\n\n"
-        "📬 Теперь ты будешь получать ежедневный гороскоп.",
-        parse_mode="Markdown"
+        f"✅ Подписка на знак <b>{sign.capitalize()}</b> оформлена!\n\n"
+        f"📬 Теперь ты будешь получать ежедневный гороскоп в {hour}:00 ({timezone_label(tz)}).\n\n"
+        f"{DELIVERY_HELP}",
+        parse_mode="HTML"
     )
 
 
@@ -59,7 +68,95 @@ async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ℹ️ /status — статус подписки
 async def subscription_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
-    if is_subscribed(chat_id):
-        await update.message.reply_text("📮 У тебя есть активная подписка.")
+    subscription = get_subscription(chat_id)
+    if subscription:
+        sign, tz, hour = subscription
+        await update.message.reply_text(
+            f"📮 У тебя есть активная подписка: {sign.capitalize()}, в {hour}:00 ({timezone_label(tz)}).\n\n"
+            f"{DELIVERY_HELP}"
+        )
+    else:
+        await update.message.reply_text("📭 У тебя пока нет подписки.")
+
+
+async def _update_delivery(update: Update, tz: str = None, hour: int = None):
+    chat_id = update.effective_chat.id
+    subscription = get_subscription(chat_id)
+    if not subscription:
+        await update.message.reply_text("📭 У тебя пока нет подписки. Оформить: /subscribe")
+        return
+
+    _, current_tz, current_hour = subscription
+    tz = tz or current_tz
+    hour = current_hour if hour is None else hour
+    set_delivery_time(chat_id, tz, hour, *schedule(chat_id, tz, hour))
+    await update.message.reply_text(f"✅ Гороскоп будет приходить в {hour}:00 ({timezone_label(tz)}).")
+
+
+# 🕘 /time <час> — час доставки по местному времени
+async def delivery_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        hour = int(context.args[0].split(":")[0])
+        if not 0 <= hour <= 23:
+            raise ValueError(hour)
+    except (IndexError, ValueError):
+        await update.message.reply_text("⚠️ Укажи час от 0 до 23, например: /time 8")
+        return
+    await _update_delivery(update, hour=hour)
+
+
+# 🌍 /timezone <пояс> — часовой пояс подписчика
+async def delivery_timezone(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    tz = parse_timezone(" ".join(context.args)) if context.args else None
+    if tz is None:
+        await update.message.reply_text(
+            "⚠️ Не удалось распознать часовой пояс.\n"
+            "Примеры: /timezone Europe/Berlin, /timezone мск, /timezone +5"
+        )
+        return
+    await _update_delivery(update, tz=tz)
+
+
+# 📰 /digest — выбор продуктов рассылки
+async def digest_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    mask = get_products(chat_id)
+    if mask is None:
+        text = "📭 У тебя пока нет подписки. Оформить: /subscribe"
+        if update.callback_query:
+            await update.callback_query.message.edit_text(text)
+        else:
+            await update.message.reply_text(text)
+        return
+
+    if update.callback_query:
+        await update.callback_query.message.edit_text(DIGEST_TEXT, reply_markup=get_digest_keyboard(mask))
     else:
-        await update.message.reply_text("📭 У тебя пока нет подписки.")
\ No newline at end of file
+        await update.message.reply_text(DIGEST_TEXT, reply_markup=get_digest_keyboard(mask))
+
+
+# ✅ обработка нажатия кнопки: "dt:<индекс продукта>"
+async def toggle_digest_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    chat_id = query.message.chat_id
+
+    try:
+        index = int(context.args[0])
+        if not 0 <= index < len(PRODUCTS):
+            raise ValueError(index)
+    except (IndexError, ValueError):
+        await query.message.reply_text("⚠️ Неизвестный продукт.")
+        return
+
+    mask = get_products(chat_id)
+    if mask is None:
+        await query.message.edit_text("📭 У тебя пока нет подписки. Оформить: /subscribe")
+        return
+
+    new_mask = toggle_product(mask, index)
+    if not new_mask:
+        await query.message.reply_text("⚠️ Оставь хотя бы один пункт или отпишись: /unsubscribe")
+        return
+
+    set_products(chat_id, new_mask)
+    await query.message.edit_text(DIGEST_TEXT, reply_markup=get_digest_keyboard(new_mask))
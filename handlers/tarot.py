@@ -1,66 +1,23 @@
-import json
-import random
 from telegram import Update, InputMediaPhoto
 from telegram.ext import ContextTypes
 from services.database import save_prediction
+from services.card_media import card_media, remember_file_ids
+from services.tarot import get_deck, draw, card_of_the_day, render_spread
 from keyboards import get_back_to_menu_inline
-
-# Загрузка данных карт
-with open("data/tarot_cards.json", encoding="utf-8") as f:
-    CARDS = json.load(f)
-
-# Позиции для 3-картного расклада
-POSITIONS_3 = ["Прошлое", "Настоящее", "Будущее"]
-
-def draw_card(used_names: set = None) -> dict:
-    if used_names is None:
-        used_names = set()
-        
-    while True:
-        card = random.choice(CARDS)
-        if card["name"] not in used_names:
-            used_names.add(card["name"])
-            is_reversed = random.choice([True, False])
-            name = card["name"] + (" (перевёрнутая)" if is_reversed else "")
-            meaning = card["reversed_meaning"] if is_reversed else card["meaning"]
-            return {
-                "name": name,
-                "meaning": meaning,
-                "image": card["image"]
-            }
-
-def split_text(text: str, limit: int = 1000) -> list:
-    """Разделяет текст на части с учетом ограничения длины"""
-    if len(text) <= limit:
-        return [text]
-    
-    parts = []
-    current_part = ""
-    
-    for paragraph in text.split('\n\n'):
-        if len(current_part) + len(paragraph) + 2 <= limit:
-            current_part += (paragraph + '\n\n')
-        else:
-            if current_part:
-                parts.append(current_part.strip())
-            current_part = paragraph + '\n\n'
-    
-    if current_part:
-        parts.append(current_part.strip())
-    
-    return parts
+from services.text_split import split_message, CAPTION_LIMIT
 
 async def tarot(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        card = draw_card()
+        drawn = [card_of_the_day(update.effective_user.id)]
+        card = get_deck()[drawn[0][0]]
 
-        message = f"🃏 Карта дня\n\n{card['name']}\n{card['meaning']}"
+        message = render_spread("tarot", drawn)
 
         # Разбиваем текст на части
-        text_parts = split_text(message)
+        text_parts = split_message(message, first_limit=CAPTION_LIMIT)
 
         # Сохраняем в БД
-        save_prediction(update.effective_chat.id, message, "tarot")
+        save_prediction(update.effective_chat.id, drawn, "tarot")
 
         # Определяем метод отправки
         if update.callback_query:
@@ -71,10 +28,11 @@ async def tarot(update: Update, context: ContextTypes.DEFAULT_TYPE):
             send_text = update.message.reply_text
 
         # Отправляем карту с первой частью текста
-        await send_photo(
-            photo=card["image"],
+        sent = await send_photo(
+            photo=card_media(card.id),
             caption=text_parts[0]
         )
+        remember_file_ids([card.id], [sent])
 
         # Отправляем остальные части текста
         for part in text_parts[1:]:
@@ -95,23 +53,18 @@ async def tarot(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def tarot3(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        used = set()
-        cards = []
-        all_images = []
-        message = "🃏 Расклад из трёх карт\n\n"
-
         # Вытягиваем карты
-        for i in range(3):
-            card = draw_card(used)
-            cards.append(card)
-            all_images.append(card["image"])
-            message += f"{POSITIONS_3[i]}\n→ {card['name']}\n{card['meaning']}\n\n"
+        cards = draw(3)
+        card_ids = [card_id for card_id, _ in cards]
+        all_images = [card_media(card_id) for card_id in card_ids]
+
+        message = render_spread("tarot3", cards)
 
         # Сохраняем в БД
-        save_prediction(update.effective_chat.id, message, "tarot3")
+        save_prediction(update.effective_chat.id, cards, "tarot3")
 
         # Разбиваем текст
-        text_parts = split_text(message)
+        text_parts = split_message(message, first_limit=CAPTION_LIMIT)
 
         # Определяем метод отправки
         if update.callback_query:
@@ -134,7 +87,8 @@ async def tarot3(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
         # Отправляем изображения
-        await send_media(media=media_group)
+        sent = await send_media(media=media_group)
+        remember_file_ids(card_ids, sent)
 
         # Остаток текста
         for part in text_parts[1:]:
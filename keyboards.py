@@ -1,74 +1,102 @@
+from functools import lru_cache
+
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
 
-# 🔮 Знаки зодиака (для гороскопов и подписки)
-ZODIAC_SIGNS = [
-    ["Овен", "Телец", "Близнецы"],
-    ["Рак", "Лев", "Дева"],
-    ["Весы", "Скорпион", "Стрелец"],
-    ["Козерог", "Водолей", "Рыбы"]
-]
+from callbacks import encode, DAYS, HOROSCOPE, SUBSCRIBE_SIGN, MAIN_MENU, DIGEST_TOGGLE
+from services.reference import ZODIAC_ROWS
+
+# Клавиатуры неизменяемы, поэтому каждая строится один раз и переиспользуется
 
+MAIN_MENU_ROWS = (
+    ("🌞 Гороскоп на сегодня", "🌜 Гороскоп на завтра"),
+    ("🃏 Таро-карта дня", "🔮 Таро 3 карты"),
+    ("✨ Таро 5 карт", "❤️ Совместимость"),
+    ("🧿 Магический шар", "🔔 Подписка"),
+)
+# Тексты кнопок, которые разбирает handlers.menu.reply_command_handler (в нижнем регистре)
+REPLY_BUTTON_TEXTS = frozenset(
+    [text.lower() for row in MAIN_MENU_ROWS for text in row] + ["🏠 главное меню"]
+)
 
+
+@lru_cache(maxsize=None)
 def get_main_menu_keyboard():
     """
     Обычная клавиатура, отображается под полем ввода сообщений.
     Используется после команд /start, /menu.
     """
-    keyboard = [
-        ["🌞 Гороскоп на сегодня", "🌜 Гороскоп на завтра"],
-        ["🃏 Таро-карта дня", "🔮 Таро 3 карты"],
-        ["✨ Таро 5 карт", "❤️ Совместимость"],
-        ["🧿 Магический шар", "🔔 Подписка"]
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    return ReplyKeyboardMarkup([list(row) for row in MAIN_MENU_ROWS], resize_keyboard=True)
 
 
-def get_zodiac_inline_keyboard(prefix: str = "horoscope") -> InlineKeyboardMarkup:
+@lru_cache(maxsize=None)
+def get_zodiac_inline_keyboard(day: str = "today") -> InlineKeyboardMarkup:
     """
-    Inline-клавиатура для выбора знака зодиака по префиксу.
+    Inline-клавиатура для выбора знака зодиака.
     Используется для получения гороскопа на сегодня/завтра.
-    Пример callback_data: horoscope:овен
+    Пример callback_data: h:0:0:0 (Овен, сегодня, краткий)
     """
+    day_index = DAYS.index(day)
     keyboard = [
         [
-            InlineKeyboardButton(sign, callback_data=f"{prefix}:{sign.lower()}")
+            InlineKeyboardButton(sign.title, callback_data=encode(HOROSCOPE, sign.index, day_index, 0))
             for sign in row
-        ] for row in ZODIAC_SIGNS
+        ] for row in ZODIAC_ROWS
     ]
 
     keyboard.append([
-        InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")
+        InlineKeyboardButton("🏠 Главное меню", callback_data=MAIN_MENU)
     ])
     
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
 def get_zodiac_subscribe_keyboard() -> InlineKeyboardMarkup:
     """
     Inline-клавиатура для выбора знака с целью подписки.
-    Пример callback_data: subscribe_овен
+    Пример callback_data: ss:0 (Овен)
     """
     keyboard = [
         [
-            InlineKeyboardButton(sign, callback_data=f"subscribe_{sign.lower()}")
+            InlineKeyboardButton(sign.title, callback_data=encode(SUBSCRIBE_SIGN, sign.index))
             for sign in row
-        ] for row in ZODIAC_SIGNS
+        ] for row in ZODIAC_ROWS
     ]
 
     keyboard.append([
-        InlineKeyboardButton("⬅️ Назад", callback_data="main_menu")
+        InlineKeyboardButton("⬅️ Назад", callback_data=MAIN_MENU)
     ])
 
     return InlineKeyboardMarkup(keyboard)
 
 
+@lru_cache(maxsize=None)
+def get_digest_keyboard(mask: int) -> InlineKeyboardMarkup:
+    """
+    Переключатели продуктов дайджеста; по клавиатуре на каждую маску.
+    Пример callback_data: dt:1 (включить/выключить карту дня)
+    """
+    from services.digest import PRODUCTS, PRODUCT_TITLES
+
+    keyboard = [
+        [InlineKeyboardButton(
+            f"{'✅' if mask >> i & 1 else '▫️'} {PRODUCT_TITLES[product]}",
+            callback_data=encode(DIGEST_TOGGLE, i)
+        )]
+        for i, product in enumerate(PRODUCTS)
+    ]
+    keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data=MAIN_MENU)])
+    return InlineKeyboardMarkup(keyboard)
+
+
+@lru_cache(maxsize=None)
 def get_back_to_menu_inline() -> InlineKeyboardMarkup:
     """
     Одна кнопка: вернуться в меню.
     Используется как переход после любых действий.
     """
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton("⬅️ Вернуться в меню", callback_data="back_to_menu")]
+        [InlineKeyboardButton("⬅️ Вернуться в меню", callback_data=MAIN_MENU)]
     ])
 
 
@@ -87,7 +115,8 @@ def get_inline_menu(options: list[tuple[str, str]], row_width: int = 2) -> Inlin
     ])
 
 
-def get_back_or_repeat_inline(prefix: str = "main_menu", repeat_command: str = "") -> InlineKeyboardMarkup:
+@lru_cache(maxsize=None)
+def get_back_or_repeat_inline(prefix: str = MAIN_MENU, repeat_command: str = "") -> InlineKeyboardMarkup:
     """
     Клавиатура с кнопками: Повторить + Вернуться в меню.
     Можно передать обе кнопки, или только одну.
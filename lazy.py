@@ -0,0 +1,20 @@
+import importlib
+
+
+def lazy_handler(module_name: str, name: str):
+    """
+    Обработчик, модуль которого импортируется при первом вызове.
+    Тяжёлые зависимости (bs4, ephem, данные колоды) не грузятся до открытия порта.
+    Пример: lazy_handler("handlers.tarot", "tarot")
+    """
+    func = None
+
+    async def handler(update, context):
+        nonlocal func
+        if func is None:
+            func = getattr(importlib.import_module(module_name), name)
+        return await func(update, context)
+
+    handler.__name__ = name
+    handler.__qualname__ = f"lazy:{module_name}.{name}"
+    return handler
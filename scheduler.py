@@ -1,94 +1,254 @@
 import asyncio
 import logging
-from datetime import datetime
-from apscheduler.schedulers.background import BackgroundScheduler
+from functools import wraps
+from datetime import datetime, date, timedelta
 
-from services.database import get_all_subscriptions
-from services.cache_utils import load_cache, clear_old_cache
+import pytz
+from apscheduler.schedulers.background import BackgroundScheduler
+from telegram.error import BadRequest, Forbidden
+
+from services.database import (
+    purge_old_predictions, purge_old_horoscope_variants, purge_old_natal_transits,
+    get_due_subscriptions, mark_sent, get_delivery_settings, save_buckets
+)
+from services.cache_utils import clear_old_cache
+from services import shared_state
+from services import memory_profiler
+from services.delivery import current_bucket, bucket_for, schedule
+from services.digest import render_digest
 
 logger = logging.getLogger(__name__)
 
-def setup_scheduler(application):
-    """Настройка фонового планировщика задач"""
+SEND_INTERVAL = 1 / 25  # не больше 25 сообщений в секунду: лимит Telegram — около 30
+DUE_BATCH = 1000        # подписчиков за один запуск; остаток уйдёт в следующую минуту
+BUNDLE_SYNC_INTERVAL = 60  # как часто воркеры сверяют активную версию справочных данных, сек
+
+
+def leader_only(job):
+    """Задача выполняется только воркером, держащим аренду лидера (один процесс — всегда)"""
+    @wraps(job)
+    def wrapper():
+        if not shared_state.acquire_lease():
+            logger.info(f"⏭ {job.__name__}: задачу выполняет другой воркер")
+            return
+        return job()
+    return wrapper
+
+def setup_scheduler(application, loop: asyncio.AbstractEventLoop):
+    """
+    Настройка фонового планировщика задач
+    :param loop: цикл событий бота. HTTP-клиент application.bot привязан к нему,
+        поэтому отправка из потоков планировщика выполняется в этом цикле, а не в asyncio.run
+    """
     try:
         scheduler = BackgroundScheduler(timezone="Europe/Moscow")
 
-        @scheduler.scheduled_job("cron", hour=10, minute=0)
+        # Рассылка идёт корзинами: каждую минуту — подписчики, чьё время доставки наступило
+        @scheduler.scheduled_job("cron", minute="*")
+        @leader_only
         def send_daily_horoscopes():
-            """Ежедневная рассылка гороскопов подписчикам в 10:00"""
-            logger.info("🔔 Запуск утренней рассылки гороскопов...")
+            """Ежедневная рассылка гороскопов подписчикам в их час и часовой пояс"""
             try:
-                cache = load_cache()
-                users = get_all_subscriptions()
-                asyncio.run(send_messages(application, users, cache))
+                today, minute = current_bucket()
+                users = get_due_subscriptions(minute, today, limit=DUE_BATCH)
+                if not users:
+                    return
+                logger.info(f"🔔 Рассылка гороскопов: корзина {minute // 60:02d}:{minute % 60:02d} UTC, {len(users)} подписчиков")
+                done = asyncio.run_coroutine_threadsafe(send_messages(application, users), loop).result()
+                mark_sent(done, today)
             except Exception as e:
                 logger.error(f"❌ Ошибка в рассылке гороскопов: {e}")
 
+        # Раз в сутки и при запуске: переход на летнее время и подписки без корзины после миграции
+        @scheduler.scheduled_job("cron", hour=0, minute=0, timezone="UTC",
+                                 next_run_time=datetime.now(scheduler.timezone))
+        @leader_only
+        def rebucket_subscriptions_job():
+            """Пересчёт корзин доставки на новые сутки UTC"""
+            try:
+                changed = rebucket_subscriptions()
+                logger.info(f"✅ Корзины рассылки пересчитаны: изменено {changed}")
+            except Exception as e:
+                logger.error(f"❌ Ошибка при пересчёте корзин рассылки: {e}")
+
         @scheduler.scheduled_job("cron", hour=0, minute=1)
+        @leader_only
         def clear_cache_job():
             """Очистка старого кэша каждый день в 00:01"""
             try:
                 clear_old_cache()
+                from services.generate_horoscope import period_keys
+                # Вчерашние пулы ещё нужны: у подписчиков западнее сервера местная дата — наше «вчера»
+                for period in period_keys(date.today() - timedelta(days=1)):
+                    purge_old_horoscope_variants(period)
                 logger.info("✅ Старый кэш очищен")
             except Exception as e:
                 logger.error(f"❌ Ошибка при очистке кэша: {e}")
 
+        # Каждый час и сразу после запуска: полные пулы пропускаются, неполные
+        # (например, собранные из перевода, пока GPT был недоступен) достраиваются
+        @scheduler.scheduled_job("cron", minute=5, next_run_time=datetime.now(scheduler.timezone))
+        @leader_only
+        def pregenerate_horoscopes_job():
+            """Подготовка пулов вариантов гороскопов на сегодня и завтра, ежечасно в :05"""
+            from services.generate_horoscope import pregenerate_variants
+
+            try:
+                built = pregenerate_variants()
+                logger.info(f"✅ Пулы гороскопов подготовлены: {built}")
+            except Exception as e:
+                logger.error(f"❌ Ошибка при подготовке пулов гороскопов: {e}")
+
+        # Раз в сутки и при запуске: в первые сутки недели и месяца собирается их пул,
+        # в остальные дни полные пулы пропускаются — GPT вызывается раз на знак за период
+        @scheduler.scheduled_job("cron", hour=0, minute=20, next_run_time=datetime.now(scheduler.timezone))
+        @leader_only
+        def pregenerate_periods_job():
+            """Подготовка гороскопов на неделю и месяц, ежедневно в 00:20"""
+            from services.generate_horoscope import pregenerate_variants, LONG_PERIODS
+
+            try:
+                built = pregenerate_variants(days=LONG_PERIODS)
+                logger.info(f"✅ Гороскопы на неделю и месяц подготовлены: {built}")
+            except Exception as e:
+                logger.error(f"❌ Ошибка при подготовке гороскопов на неделю и месяц: {e}")
+
+        # Раз в сутки и при запуске: положения планет считаются один раз, транзиты всех карт —
+        # одним проходом; на завтра — для подписчиков, у которых новые сутки наступают раньше
+        @scheduler.scheduled_job("cron", hour=0, minute=30, next_run_time=datetime.now(scheduler.timezone))
+        @leader_only
+        def natal_transits_job():
+            """Личные транзиты на сегодня и завтра по всем натальным картам, ежедневно в 00:30"""
+            from services.natal import compute_day, KEEP_DAYS
+
+            try:
+                today = date.today()
+                groups = [compute_day(today + timedelta(days=offset)) for offset in (0, 1)]
+                purge_old_natal_transits((today - timedelta(days=KEEP_DAYS)).isoformat())
+                logger.info(f"✅ Личные транзиты рассчитаны: групп {groups[0]} на сегодня, {groups[1]} на завтра")
+            except Exception as e:
+                logger.error(f"❌ Ошибка при расчёте личных транзитов: {e}")
+
+        @scheduler.scheduled_job("cron", day_of_week="mon", hour=3, minute=0)
+        @leader_only
+        def cleanup_predictions_job():
+            """Удаление старой истории предсказаний и VACUUM базы по понедельникам в 03:00"""
+            try:
+                deleted = purge_old_predictions()
+                logger.info(f"✅ История предсказаний очищена: удалено {deleted} записей")
+            except Exception as e:
+                logger.error(f"❌ Ошибка при очистке истории предсказаний: {e}")
+
+        # Не только лидер: у каждого воркера своя память
+        if memory_profiler.SAMPLE_INTERVAL:
+            @scheduler.scheduled_job("interval", seconds=memory_profiler.SAMPLE_INTERVAL)
+            def memory_sampler_job():
+                """Лог модулей с наибольшим ростом памяти (MEMORY_PROFILE_INTERVAL)"""
+                try:
+                    memory_profiler.sample_growth()
+                except Exception as e:
+                    logger.error(f"❌ Ошибка сэмплера памяти: {e}")
+
+        if shared_state.MULTI_WORKER:
+            @scheduler.scheduled_job("interval", seconds=shared_state.LEASE_TTL / 3,
+                                     next_run_time=datetime.now(scheduler.timezone))
+            def leader_heartbeat_job():
+                """Продление аренды лидера, чтобы плановые задачи не переезжали между воркерами"""
+                shared_state.acquire_lease()
+
+            @scheduler.scheduled_job("interval", seconds=BUNDLE_SYNC_INTERVAL)
+            def bundle_sync_job():
+                """Подхватить версию справочных данных, активированную /bundle в другом воркере"""
+                from services.data_bundle import sync
+                try:
+                    sync()
+                except Exception as e:
+                    logger.error(f"❌ Ошибка синхронизации бандла: {e}")
+
         scheduler.start()
         logger.info("✅ Планировщик запущен")
         logger.info("📅 Задачи:")
-        logger.info("   • Рассылка гороскопов — ежедневно в 10:00")
+        logger.info("   • Рассылка гороскопов — ежеминутно, по корзинам часа и пояса подписчиков")
+        logger.info("   • Пересчёт корзин рассылки — ежедневно в 00:00 UTC и при запуске")
         logger.info("   • Очистка кэша — ежедневно в 00:01")
+        logger.info("   • Подготовка пулов гороскопов — ежечасно в :05 и при запуске")
+        logger.info("   • Гороскопы на неделю и месяц — раз за период (проверка в 00:20 и при запуске)")
+        logger.info("   • Очистка истории предсказаний — по понедельникам в 03:00")
 
     except Exception as e:
         logger.error(f"❌ Ошибка при запуске планировщика: {e}")
 
 
 
-async def send_messages(application, users, cache):
+def rebucket_subscriptions() -> int:
+    """
+    Пересчитывает корзины на сегодня (UTC). Подпискам без корзины (после миграции)
+    сегодняшняя доставка не устраивается задним числом, если её время уже прошло.
+    :return: число изменённых подписок
+    """
+    today = datetime.now(pytz.utc).date()
+    changes = []
+    for chat_id, tz, hour, bucket in get_delivery_settings():
+        if bucket is None:
+            changes.append((chat_id, *schedule(chat_id, tz, hour)))
+            continue
+        new_bucket = bucket_for(chat_id, tz, hour, today)
+        if new_bucket != bucket:
+            changes.append((chat_id, new_bucket, None))
+    if changes:
+        save_buckets(changes)
+    return len(changes)
+
+
+async def send_messages(application, users):
     """
-    Отправляет гороскопы подписчикам (из кэша)
+    Отправляет подписчикам одной или нескольких корзин их дайджесты (services.digest)
     :param application: Telegram Application
-    :param users: список [(chat_id, sign), ...]
-    :param cache: загруженный кэш
+    :param users: список [(chat_id, sign, tz, products), ...]
+    :return: chat_id, с которыми на сегодня всё: доставлено, нечего слать или ошибка окончательная
+        (бот заблокирован, чат не найден). После сетевых ошибок подписчик остаётся в очереди
+        и получит дайджест в следующую минуту
     """
-    current_date = str(datetime.today().date())
     sent_count = 0
     error_count = 0
+    done = []
 
-    for chat_id, sign in users:
+    for chat_id, sign, tz, products in users:
+        sent_parts = 0
         try:
-            sign_lower = sign.lower()
-            key = f"brief_{sign_lower}_today"
-
-            sign_cache = cache.get(sign_lower, {})
-            user_data = sign_cache.get(key)
-
-            if user_data and user_data.get("date") == current_date:
-                message = (
-                    f"🌟 <b>Ваш гороскоп на сегодня</b> ({current_date})\n"
-                    f"Знак: {sign.capitalize()}\n"
-                    f"{'─' * 30}\n\n"
-                    f"{user_data['text']}"
-                )
+            # Сборка может ходить в сеть (пул ещё не готов) — не в цикле событий бота
+            parts = await asyncio.to_thread(render_digest, chat_id, sign, tz, products)
+            if not parts:
+                done.append(chat_id)  # например, только недельный гороскоп не в понедельник
+                continue
 
+            for part in parts:
                 await application.bot.send_message(
                     chat_id=chat_id,
-                    text=message,
+                    text=part,
                     parse_mode="HTML"
                 )
-                sent_count += 1
-                logger.info(f"✅ Отправлен: chat_id={chat_id}, sign={sign}")
-            else:
-                logger.warning(f"⚠️ Нет данных в кэше для: {sign} / {chat_id}")
-                error_count += 1
+                sent_parts += 1
+            done.append(chat_id)
+            sent_count += 1
+            logger.info("✅ Отправлен: chat_id=%s, sign=%s", chat_id, sign, extra={"sample": "digest_sent"})
 
+        except (Forbidden, BadRequest) as e:
+            logger.error("❌ Ошибка отправки: chat_id=%s, sign=%s — %s", chat_id, sign, e)
+            error_count += 1
+            done.append(chat_id)  # повтор не поможет
         except Exception as e:
-            logger.error(f"❌ Ошибка отправки: chat_id={chat_id}, sign={sign} — {e}")
+            logger.error("❌ Ошибка отправки: chat_id=%s, sign=%s — %s", chat_id, sign, e)
             error_count += 1
+            if sent_parts:
+                done.append(chat_id)  # начало дайджеста уже у подписчика — не дублируем
+
+        await asyncio.sleep(SEND_INTERVAL)
 
     logger.info(
-        f"📊 Статистика рассылки на {current_date}:\n"
+        f"📊 Статистика рассылки корзины:\n"
         f"👥 Пользователей: {len(users)}\n"
         f"📩 Успешно: {sent_count}\n"
         f"⚠️ Ошибок: {error_count}"
     )
+    return done
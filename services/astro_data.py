@@ -2,6 +2,8 @@ import ephem
 from datetime import date
 import pytz
 
+from services.reference import sign_by_constellation
+
 def get_lunar_info(target_date=None):
     if target_date is None:
         target_date = date.today()
@@ -21,14 +23,9 @@ def get_lunar_info(target_date=None):
         phase_text = "Убывающая Луна"
 
     sign_eng = ephem.constellation(moon)[1]
-    signs = {
-        'Aries': '♈️ Овен', 'Taurus': '♉️ Телец', 'Gemini': '♊️ Близнецы', 'Cancer': '♋️ Рак',
-        'Leo': '♌️ Лев', 'Virgo': '♍️ Дева', 'Libra': '♎️ Весы', 'Scorpius': '♏️ Скорпион',
-        'Sagittarius': '♐️ Стрелец', 'Capricornus': '♑️ Козерог', 'Aquarius': '♒️ Водолей', 'Pisces': '♓️ Рыбы'
-    }
 
     return {
         "moon_phase": phase_pct,
-        "moon_sign": signs.get(sign_eng, sign_eng),
+        "moon_sign": sign_by_constellation(sign_eng),
         "phase_text": phase_text
     }
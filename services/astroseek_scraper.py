@@ -1,17 +1,34 @@
+import os
 import requests
 from bs4 import BeautifulSoup
 
-def get_day_energy_description():
+from services.circuit_breaker import get_breaker
+
+ASTROSEEK_URL = os.getenv("ASTROSEEK_URL", "https://horoscopes.astro-seek.com")
+
+astroseek_breaker = get_breaker("astroseek")
+
+# Последнее удачно полученное описание: запасной ответ, пока breaker открыт
+_last_description = ""
+
+def get_day_energy_description(timeout: float = 10):
+    global _last_description
+    if not astroseek_breaker.allow():
+        return _last_description
+
     try:
-        url = "https://horoscopes.astro-seek.com/daily-horoscope"
-        response = requests.get(url, timeout=10)
+        url = f"{ASTROSEEK_URL}/daily-horoscope"
+        response = requests.get(url, timeout=timeout)
         response.raise_for_status()
+        astroseek_breaker.record_success()
 
         soup = BeautifulSoup(response.text, "html.parser")
         desc_block = soup.find("div", class_="horoBoxBoxText")
         if not desc_block:
             return ""
-        return desc_block.get_text(strip=True)
+        _last_description = desc_block.get_text(strip=True)
+        return _last_description
 
     except:
-        return ""
+        astroseek_breaker.record_failure()
+        return _last_description
@@ -0,0 +1,125 @@
+import io
+import os
+import json
+import hashlib
+import logging
+
+from aiohttp import web
+
+from services.tarot import get_deck
+
+logger = logging.getLogger(__name__)
+
+# 📁 Локальные уменьшенные изображения карт
+ASSETS_DIR = "static/cards"
+MANIFEST_FILE = os.path.join(ASSETS_DIR, "manifest.json")
+
+# Публичный адрес бота — Telegram скачивает изображения отсюда
+PUBLIC_URL = os.getenv("RENDER_EXTERNAL_URL", "https://astrobot-2-0.onrender.com")
+
+MAX_SIDE = 800      # px по длинной стороне
+JPEG_QUALITY = 80
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# card_id → короткий хэш содержимого, загружается при первом обращении
+_manifest = None
+
+
+def asset_path(card_id: int) -> str:
+    return os.path.join(ASSETS_DIR, f"{card_id:02d}.jpg")
+
+
+def load_manifest() -> dict:
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(MANIFEST_FILE, encoding="utf-8") as f:
+                _manifest = {int(card_id): digest for card_id, digest in json.load(f).items()}
+        except FileNotFoundError:
+            _manifest = {}
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения манифеста карт: {e}")
+            _manifest = {}
+    return _manifest
+
+
+def forget_assets(card_ids):
+    """Не отдавать локальные копии этих карт до следующей сборки build_assets()"""
+    manifest = load_manifest()
+    for card_id in card_ids:
+        manifest.pop(card_id, None)
+
+
+def asset_url(card_id: int):
+    """
+    URL локальной копии карты или None, если она не собрана.
+    Хэш в ?v= меняется вместе с файлом, поэтому кэшировать можно бессрочно.
+    """
+    digest = load_manifest().get(card_id)
+    if digest is None:
+        return None
+    return f"{PUBLIC_URL}/cards/{card_id:02d}.jpg?v={digest}"
+
+
+def build_assets(force: bool = False) -> dict:
+    """
+    Однократно скачивает, уменьшает и пережимает изображения всех карт.
+    Уже собранные файлы пропускаются, если не указан force.
+    """
+    # Нужны только на этапе сборки
+    import requests
+    from PIL import Image
+
+    global _manifest
+    os.makedirs(ASSETS_DIR, exist_ok=True)
+    manifest = {}
+
+    with requests.Session() as session:
+        session.headers["User-Agent"] = "AstroBot/2.0 (card assets build)"
+
+        for card in get_deck():
+            path = asset_path(card.id)
+            try:
+                if force or not os.path.exists(path):
+                    response = session.get(card.image, timeout=30)
+                    response.raise_for_status()
+
+                    image = Image.open(io.BytesIO(response.content)).convert("RGB")
+                    image.thumbnail((MAX_SIDE, MAX_SIDE))
+                    image.save(path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+                    logger.info(f"🖼 {card.name}: {len(response.content) // 1024}KB → {os.path.getsize(path) // 1024}KB")
+
+                with open(path, "rb") as f:
+                    manifest[card.id] = hashlib.sha1(f.read()).hexdigest()[:12]
+            except Exception as e:
+                logger.error(f"❌ Не удалось подготовить карту {card.name}: {e}")
+
+    with open(MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump({str(card_id): digest for card_id, digest in manifest.items()}, f, indent=2)
+
+    _manifest = manifest
+    logger.info(f"✅ Подготовлено карт: {len(manifest)} из {len(get_deck())}")
+    return manifest
+
+
+# === aiohttp: раздача карт ===
+async def card_asset_handler(request):
+    """
+    Отдаёт /cards/NN.jpg. ETag и ответ 304 на If-None-Match
+    формирует сам FileResponse, здесь добавляется долгий Cache-Control.
+    """
+    name = request.match_info["name"]
+    card_id, ext = os.path.splitext(name)
+    if ext != ".jpg" or not card_id.isdigit():
+        raise web.HTTPNotFound()
+
+    path = asset_path(int(card_id))
+    if not os.path.isfile(path):
+        raise web.HTTPNotFound()
+
+    return web.FileResponse(path, headers={"Cache-Control": CACHE_CONTROL})
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+    build_assets()
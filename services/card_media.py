@@ -0,0 +1,68 @@
+import logging
+
+from services.card_assets import asset_url, forget_assets
+from services.database import get_card_file_ids, save_card_file_ids, delete_card_file_ids
+from services.reference import on_change
+from services.tarot import get_deck
+
+logger = logging.getLogger(__name__)
+
+# card_id → Telegram file_id, загружается из БД при первом обращении
+_file_ids = None
+
+
+def _get_file_ids() -> dict:
+    global _file_ids
+    if _file_ids is None:
+        _file_ids = get_card_file_ids()
+    return _file_ids
+
+
+def card_media(card_id: int) -> str:
+    """file_id уже загруженной в Telegram карты, иначе URL локальной копии или исходного изображения"""
+    return _get_file_ids().get(card_id) or asset_url(card_id) or get_deck()[card_id].image
+
+
+def is_uploaded(card_id: int) -> bool:
+    return card_id in _get_file_ids()
+
+
+def _forget_changed_images(old, new):
+    """Новая версия колоды: file_id и локальные копии карт со сменившимся изображением больше не годятся"""
+    card_ids = [card.id for card in new if card.id < len(old) and old[card.id].image != card.image]
+    if not card_ids:
+        return
+    file_ids = _get_file_ids()
+    for card_id in card_ids:
+        file_ids.pop(card_id, None)
+    forget_assets(card_ids)
+    try:
+        delete_card_file_ids(card_ids)
+    except Exception as e:
+        logger.error(f"❌ Ошибка удаления file_id карт: {e}")
+    logger.info(f"🖼 Изображения карт сменились: {card_ids}")
+
+
+on_change("tarot", _forget_changed_images)
+
+
+def remember_file_ids(card_ids, messages):
+    """
+    Запоминает file_id после первой успешной отправки карты.
+    :param card_ids: ID карт в порядке отправки
+    :param messages: отправленные сообщения (Message или кортеж из send_media_group)
+    """
+    file_ids = _get_file_ids()
+    new = {}
+    for card_id, message in zip(card_ids, messages):
+        if card_id not in file_ids and message.photo:
+            new[card_id] = message.photo[-1].file_id
+
+    if not new:
+        return
+
+    file_ids.update(new)
+    try:
+        save_card_file_ids(new)
+    except Exception as e:
+        logger.error(f"❌ Ошибка сохранения file_id карт: {e}")
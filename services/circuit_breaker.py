@@ -0,0 +1,121 @@
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для внешней зависимости.
+    closed — запросы идут; если за window секунд из не менее min_calls вызовов
+    доля ошибок достигла failure_rate, breaker открывается.
+    open — запросы сразу получают отказ и вызывающий код отдаёт запасной ответ.
+    Через open_seconds пропускается один пробный запрос (half_open):
+    успех закрывает breaker, ошибка открывает его снова.
+    Вызовы идут из потоков (to_thread, планировщик), поэтому состояние под блокировкой.
+    """
+
+    def __init__(self, name: str, failure_rate: float = 0.5, window: float = 60.0,
+                 min_calls: int = 4, open_seconds: float = 60.0):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.window = window
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+
+        self.state = CLOSED
+        self._events = deque()  # (время, успех)
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+        # Счётчики для метрик
+        self.opened_total = 0
+        self.rejected_total = 0
+
+    def _trim(self, now: float):
+        while self._events and self._events[0][0] < now - self.window:
+            self._events.popleft()
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self._opened_at = now
+        self._events.clear()
+        self.opened_total += 1
+        logger.warning(f"⛔ Breaker {self.name} открыт на {self.open_seconds:.0f} с")
+
+    def allow(self) -> bool:
+        """Можно ли сейчас обращаться к зависимости"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._probe_started = 0.0
+
+            if self.state == HALF_OPEN:
+                # Один пробный запрос; если он не отчитался, через open_seconds — следующий
+                if now - self._probe_started >= self.open_seconds:
+                    self._probe_started = now
+                    return True
+            elif self.state == CLOSED:
+                return True
+
+            self.rejected_total += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self._events.clear()
+                logger.info(f"✅ Breaker {self.name} закрыт")
+            self._events.append((now, True))
+            self._trim(now)
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                self._open(now)
+                return
+            if self.state == OPEN:
+                return
+
+            self._events.append((now, False))
+            self._trim(now)
+            failures = sum(1 for _, ok in self._events if not ok)
+            if len(self._events) >= self.min_calls and failures / len(self._events) >= self.failure_rate:
+                self._open(now)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._trim(time.monotonic())
+            return {
+                "state": self.state,
+                "calls": len(self._events),
+                "failures": sum(1 for _, ok in self._events if not ok),
+                "opened_total": self.opened_total,
+                "rejected_total": self.rejected_total,
+            }
+
+
+# Реестр: один breaker на зависимость на процесс
+BREAKERS = {}
+
+
+def get_breaker(name: str, **kwargs) -> CircuitBreaker:
+    if name not in BREAKERS:
+        BREAKERS[name] = CircuitBreaker(name, **kwargs)
+    return BREAKERS[name]
+
+
+def breakers_snapshot() -> dict:
+    """Состояние всех breaker'ов для health check и метрик"""
+    return {name: breaker.snapshot() for name, breaker in BREAKERS.items()}
@@ -0,0 +1,316 @@
+"""
+Версионированные бандлы справочных данных: колода Таро и совместимость.
+
+Бандл — один файл data/bundles/<версия>.bundle: заголовок с контрольными суммами разделов
+и сами разделы в marshal — уже в том виде, из которого services.reference строит записи,
+без разбора JSON. Активная версия записана в data/bundles/ACTIVE; без неё данные
+по-старому собираются из data/*.json.
+
+    python -m services.data_bundle build            # собрать бандл из data/*.json
+    python -m services.data_bundle load <версия>    # проверить и сделать активным
+
+В работающем боте то же делает /bundle (handlers/admin.py): новая версия подменяется
+атомарно, запросы в процессе дорабатывают со старыми данными, а производные кэши
+сбрасываются только для изменившихся разделов.
+"""
+
+import os
+import re
+import sys
+import json
+import struct
+import hashlib
+import marshal
+import logging
+from datetime import datetime
+from typing import NamedTuple
+
+from services.reference import ZODIAC
+
+logger = logging.getLogger(__name__)
+
+BUNDLES_DIR = os.path.join("data", "bundles")
+ACTIVE_FILE = os.path.join(BUNDLES_DIR, "ACTIVE")
+SOURCES = {
+    "tarot": os.path.join("data", "tarot_cards.json"),
+    "compatibility": os.path.join("data", "compatibility.json"),
+}
+
+MAGIC = b"ASTROBUNDLE1\n"
+# Версия 2 — без ссылок между объектами: одинаковые данные дают одинаковые байты и контрольную сумму
+MARSHAL_VERSION = 2
+VERSION_RE = re.compile(r"^[\w.-]+$")
+JSON_VERSION = "json"  # данные собраны из data/*.json, а не из бандла
+
+COMPATIBILITY_FIELDS = ("general", "love", "friendship", "work", "description")
+
+
+class BundleError(Exception):
+    """Бандл не найден, повреждён или не прошёл проверку"""
+
+
+class Bundle(NamedTuple):
+    version: str
+    checksums: dict  # раздел → sha256 его байтов
+    datasets: dict   # раздел → данные в виде для services.reference
+
+
+# === 🛠 Сборка разделов из JSON ===
+def compile_tarot(raw: list) -> tuple:
+    """Карта → (название, изображение, прямое значение, перевёрнутое). Индекс — ID карты."""
+    return tuple((card["name"], card["image"], card["meaning"], card["reversed_meaning"]) for card in raw)
+
+
+def compile_compatibility(raw: dict) -> tuple:
+    """
+    Все 144 пары в порядке ZODIAC, индекс i * 12 + j: (общая, любовь, дружба, работа, описание) или None.
+    В JSON хранится одна сторона пары, обратная берётся из неё же.
+    """
+    table = []
+    for first in ZODIAC:
+        for second in ZODIAC:
+            pair = raw.get(first.ru, {}).get(second.ru) or raw.get(second.ru, {}).get(first.ru)
+            table.append(tuple(pair[field] for field in COMPATIBILITY_FIELDS) if pair else None)
+    return tuple(table)
+
+
+COMPILERS = {"tarot": compile_tarot, "compatibility": compile_compatibility}
+
+
+def _dump(compiled) -> bytes:
+    return marshal.dumps(compiled, MARSHAL_VERSION)
+
+
+def checksum(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def compile_source(name: str) -> tuple:
+    with open(SOURCES[name], encoding="utf-8") as f:
+        return COMPILERS[name](json.load(f))
+
+
+# === ✅ Проверка ===
+def _is_text(value) -> bool:
+    return isinstance(value, str) and bool(value.strip())
+
+
+def validate(datasets: dict, current: dict = None):
+    """
+    :param current: раздел → число записей в загруженной версии. Колоду нельзя укорачивать:
+        ID карт хранятся в истории раскладов
+    :raises BundleError: со списком проблем
+    """
+    errors = []
+    missing = set(COMPILERS) - set(datasets)
+    if missing:
+        errors.append(f"нет разделов: {', '.join(sorted(missing))}")
+
+    deck = datasets.get("tarot", ())
+    if "tarot" in datasets:
+        if not deck:
+            errors.append("tarot: колода пуста")
+        for card_id, card in enumerate(deck):
+            if len(card) != 4 or not all(_is_text(value) for value in card):
+                errors.append(f"tarot: карта {card_id} — пустые или лишние поля")
+            elif not card[1].startswith(("http://", "https://")):
+                errors.append(f"tarot: карта {card_id} — изображение не URL")
+        if current and len(deck) < current.get("tarot", 0):
+            errors.append(f"tarot: карт {len(deck)}, загружено {current['tarot']} — колоду можно только дополнять")
+
+    table = datasets.get("compatibility", ())
+    if "compatibility" in datasets:
+        if len(table) != len(ZODIAC) ** 2:
+            errors.append(f"compatibility: {len(table)} пар вместо {len(ZODIAC) ** 2}")
+        for index, pair in enumerate(table):
+            if pair is not None and (len(pair) != len(COMPATIBILITY_FIELDS) or not all(_is_text(v) for v in pair)):
+                first, second = ZODIAC[index // len(ZODIAC)], ZODIAC[index % len(ZODIAC)]
+                errors.append(f"compatibility: {first.ru} + {second.ru} — пустые или лишние поля")
+
+    if errors:
+        raise BundleError("; ".join(errors[:10]) + (f" (и ещё {len(errors) - 10})" if len(errors) > 10 else ""))
+
+
+# === 📦 Файл бандла ===
+def bundle_path(version: str) -> str:
+    if not VERSION_RE.match(version):
+        raise BundleError(f"недопустимое имя версии: {version!r}")
+    return os.path.join(BUNDLES_DIR, f"{version}.bundle")
+
+
+def write_bundle(version: str, datasets: dict) -> str:
+    """Записывает бандл через временный файл: недописанный бандл не появится под своим именем"""
+    path = bundle_path(version)
+    sections, payload, offset = {}, [], 0
+    for name, compiled in datasets.items():
+        data = _dump(compiled)
+        sections[name] = {"offset": offset, "length": len(data), "sha256": checksum(data)}
+        payload.append(data)
+        offset += len(data)
+
+    header = json.dumps({
+        "version": version,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "sections": sections,
+    }, ensure_ascii=False).encode("utf-8")
+
+    os.makedirs(BUNDLES_DIR, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack(">I", len(header)))
+        f.write(header)
+        for data in payload:
+            f.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_bundle(version: str, only: tuple = None) -> Bundle:
+    """
+    Читает бандл и сверяет контрольные суммы разделов.
+    :param only: какие разделы разбирать (по умолчанию все)
+    :raises BundleError: если файла нет или он повреждён
+    """
+    path = bundle_path(version)
+    try:
+        with open(path, "rb") as f:
+            blob = f.read()
+    except FileNotFoundError:
+        raise BundleError(f"бандл {version} не найден") from None
+
+    if not blob.startswith(MAGIC):
+        raise BundleError(f"{version}: не бандл")
+    start = len(MAGIC) + 4
+    try:
+        (header_length,) = struct.unpack(">I", blob[len(MAGIC):start])
+        header = json.loads(blob[start:start + header_length])
+    except (struct.error, ValueError) as e:
+        raise BundleError(f"{version}: заголовок повреждён ({e})") from None
+
+    base = start + header_length
+    checksums, datasets = {}, {}
+    for name, section in header["sections"].items():
+        checksums[name] = section["sha256"]
+        if only is not None and name not in only:
+            continue
+        data = blob[base + section["offset"]:base + section["offset"] + section["length"]]
+        if checksum(data) != section["sha256"]:
+            raise BundleError(f"{version}: контрольная сумма раздела {name} не сходится")
+        datasets[name] = marshal.loads(data)
+    return Bundle(version, checksums, datasets)
+
+
+def list_bundles() -> list[str]:
+    """Версии бандлов на диске, от новых к старым"""
+    try:
+        names = os.listdir(BUNDLES_DIR)
+    except FileNotFoundError:
+        return []
+    names = [name for name in names if name.endswith(".bundle")]
+    names.sort(key=lambda name: os.path.getmtime(os.path.join(BUNDLES_DIR, name)), reverse=True)
+    return [name.removesuffix(".bundle") for name in names]
+
+
+def active_version():
+    """:return: активная версия или None, если данные берутся из data/*.json"""
+    try:
+        with open(ACTIVE_FILE, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _set_active(version: str):
+    tmp_path = f"{ACTIVE_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, ACTIVE_FILE)
+
+
+# === 🔄 Версии ===
+def read_dataset(name: str) -> tuple[str, str, tuple]:
+    """
+    Раздел для первой загрузки в services.reference: из активного бандла или из JSON.
+    :return: (версия, контрольная сумма, данные)
+    """
+    version = active_version()
+    if version:
+        try:
+            bundle = read_bundle(version, only=(name,))
+            if name in bundle.datasets:
+                return version, bundle.checksums[name], bundle.datasets[name]
+            logger.error(f"❌ В бандле {version} нет раздела {name}, читаю {SOURCES[name]}")
+        except BundleError as e:
+            logger.error(f"❌ Активный бандл не загружен: {e}. Читаю {SOURCES[name]}")
+
+    compiled = compile_source(name)
+    return JSON_VERSION, checksum(_dump(compiled)), compiled
+
+
+def build(version: str = None) -> tuple[str, dict]:
+    """
+    Собирает и проверяет бандл из data/*.json, активным его не делает.
+    :return: (версия, контрольные суммы разделов)
+    """
+    datasets = {name: compile_source(name) for name in COMPILERS}
+    validate(datasets)
+    checksums = {name: checksum(_dump(compiled)) for name, compiled in datasets.items()}
+    if version is None:
+        # Одинаковые данные — одинаковый хвост версии: так видно, что бандл ничего не меняет
+        digest = checksum("".join(checksums[name] for name in sorted(checksums)).encode())[:8]
+        version = f"{datetime.now():%Y%m%d-%H%M%S}-{digest}"
+    write_bundle(version, datasets)
+    logger.info(f"📦 Собран бандл {version}")
+    return version, checksums
+
+
+def install(version: str) -> list[str]:
+    """
+    Проверяет бандл, делает его активным и подменяет данные в этом процессе.
+    Остальные воркеры подхватят его через sync().
+    :return: изменившиеся разделы
+    :raises BundleError: если бандл повреждён или не прошёл проверку — активная версия не меняется
+    """
+    from services import reference
+
+    bundle = read_bundle(version)
+    validate(bundle.datasets, current=reference.loaded_sizes())
+    _set_active(version)
+    return reference.apply_bundle(bundle)
+
+
+def sync() -> list[str]:
+    """Подхватывает активную версию, если её сменил другой процесс. :return: изменившиеся разделы"""
+    from services import reference
+
+    version = active_version()
+    if not version or version == reference.loaded_version:
+        return []
+    try:
+        return reference.apply_bundle(read_bundle(version))
+    except BundleError as e:
+        logger.error(f"❌ Активный бандл не подхвачен: {e}")
+        return []
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+    command, *args = sys.argv[1:] or ["list"]
+    try:
+        if command == "build":
+            built, sums = build(*args[:1])
+            print(built)
+            for section, digest in sums.items():
+                print(f"  {section:<16}{digest[:16]}")
+        elif command == "load" and args:
+            validate(read_bundle(args[0]).datasets)  # целостность и проверка — до записи ACTIVE
+            _set_active(args[0])
+            print(f"✅ Активная версия: {args[0]}")
+        else:
+            active = active_version()
+            for name in list_bundles():
+                print(f"{'*' if name == active else ' '} {name}")
+    except BundleError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -1,29 +1,104 @@
 import sqlite3
 import os
+import re
+
+from services.tarot import encode_cards, decode_cards, render_spread
+from services.delivery import DEFAULT_TIMEZONE, DEFAULT_HOUR
+from services.digest import DEFAULT_PRODUCTS
 
 DB = "bot.db"
 
+# Сколько дней хранить историю предсказаний
+PREDICTIONS_RETENTION_DAYS = 90
+
 def init_db():
     os.makedirs("data", exist_ok=True)
     full_path = os.path.join("data", DB)
     with sqlite3.connect(full_path) as conn:
         c = conn.cursor()
         c.execute("CREATE TABLE IF NOT EXISTS subscriptions (chat_id INTEGER PRIMARY KEY, sign TEXT)")
+
+        # Миграция: часовой пояс, час доставки, корзина (минута суток UTC) и дата последней отправки (UTC)
+        columns = {row[1] for row in c.execute("PRAGMA table_info(subscriptions)")}
+        if "tz" not in columns:
+            c.execute(f"ALTER TABLE subscriptions ADD COLUMN tz TEXT NOT NULL DEFAULT '{DEFAULT_TIMEZONE}'")
+            c.execute(f"ALTER TABLE subscriptions ADD COLUMN hour INTEGER NOT NULL DEFAULT {DEFAULT_HOUR}")
+            c.execute("ALTER TABLE subscriptions ADD COLUMN bucket INTEGER")
+            c.execute("ALTER TABLE subscriptions ADD COLUMN sent_on TEXT")
+        if "products" not in columns:
+            # Битовая маска продуктов дайджеста (services.digest.PRODUCTS)
+            c.execute(f"ALTER TABLE subscriptions ADD COLUMN products INTEGER NOT NULL DEFAULT {DEFAULT_PRODUCTS}")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_subscriptions_bucket ON subscriptions (bucket)")
         c.execute("""
             CREATE TABLE IF NOT EXISTS predictions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 chat_id INTEGER,
                 type TEXT,
                 text TEXT,
-                date TEXT DEFAULT CURRENT_DATE
+                date TEXT DEFAULT CURRENT_DATE,
+                cards BLOB
+            )
+        """)
+
+        # Миграция: старые базы без колонки cards
+        columns = {row[1] for row in c.execute("PRAGMA table_info(predictions)")}
+        if "cards" not in columns:
+            c.execute("ALTER TABLE predictions ADD COLUMN cards BLOB")
+
+        c.execute("CREATE INDEX IF NOT EXISTS idx_predictions_chat_id ON predictions (chat_id, id)")
+        c.execute("CREATE TABLE IF NOT EXISTS card_file_ids (card_id INTEGER PRIMARY KEY, file_id TEXT)")
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS horoscope_variants (
+                sign TEXT,
+                period TEXT,
+                detailed INTEGER,
+                variant INTEGER,
+                text TEXT,
+                PRIMARY KEY (sign, period, detailed, variant)
+            )
+        """)
+        # Натальная карта: долготы планет (services.natal.pack_degrees); birth_time NULL — время неизвестно
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS natal_charts (
+                chat_id INTEGER PRIMARY KEY,
+                birth_date TEXT,
+                birth_time TEXT,
+                tz TEXT,
+                place TEXT,
+                chart BLOB
+            )
+        """)
+        # Личные транзиты: сигнатура подписчика на день и один текст на сигнатуру
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS natal_transits (
+                day TEXT,
+                chat_id INTEGER,
+                signature TEXT,
+                PRIMARY KEY (day, chat_id)
+            )
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS natal_texts (
+                day TEXT,
+                signature TEXT,
+                text TEXT,
+                PRIMARY KEY (day, signature)
             )
         """)
         conn.commit()
 
-# ➕ подписка
-def add_subscription(chat_id, sign):
+# ➕ подписка (смена знака сохраняет время доставки)
+def add_subscription(chat_id, sign, bucket: int = None, sent_on: str = None):
+    """
+    :param bucket: корзина доставки для новой подписки (services.delivery.schedule)
+    :param sent_on: дата UTC, за которую рассылка считается отправленной
+    """
     with sqlite3.connect(os.path.join("data", DB)) as conn:
-        conn.execute("REPLACE INTO subscriptions (chat_id, sign) VALUES (?, ?)", (chat_id, sign))
+        conn.execute(
+            "INSERT INTO subscriptions (chat_id, sign, bucket, sent_on) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (chat_id) DO UPDATE SET sign = excluded.sign",
+            (chat_id, sign, bucket, sent_on)
+        )
         conn.commit()
 
 # ➖ отписка
@@ -44,19 +119,258 @@ def get_all_subscriptions():
     with sqlite3.connect(os.path.join("data", DB)) as conn:
         return conn.execute("SELECT chat_id, sign FROM subscriptions").fetchall()
 
-# 📝 сохранить предсказание
-def save_prediction(chat_id: int, text: str, prediction_type: str = "tarot"):
+# 🔎 подписка чата: (sign, tz, hour) или None
+def get_subscription(chat_id: int):
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        return conn.execute("SELECT sign, tz, hour FROM subscriptions WHERE chat_id = ?", (chat_id,)).fetchone()
+
+# 🕘 время доставки
+def set_delivery_time(chat_id: int, tz: str, hour: int, bucket: int, sent_on: str = None) -> bool:
+    """
+    Меняет пояс, час и корзину. sent_on задаётся, только если сегодняшняя доставка пропускается:
+    уже отправленная сегодня рассылка не повторяется.
+    :return: False, если подписки нет
+    """
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        cursor = conn.execute(
+            "UPDATE subscriptions SET tz = ?, hour = ?, bucket = ?, sent_on = COALESCE(?, sent_on) WHERE chat_id = ?",
+            (tz, hour, bucket, sent_on, chat_id)
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+
+# ⏰ подписчики, чья корзина наступила и кому сегодня ещё не отправляли
+def get_due_subscriptions(minute: int, today: str, limit: int = 1000):
+    """
+    Наступившие корзины (bucket <= minute) без отправки за today — так пропущенные минуты
+    (перезапуск, долгая предыдущая корзина) догоняются при следующем запуске.
+    :return: [(chat_id, sign, tz, products), ...]
+    """
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        return conn.execute(
+            "SELECT chat_id, sign, tz, products FROM subscriptions "
+            "WHERE bucket <= ? AND (sent_on IS NULL OR sent_on < ?) ORDER BY bucket LIMIT ?",
+            (minute, today, limit)
+        ).fetchall()
+
+# 📰 продукты дайджеста (битовая маска) или None, если подписки нет
+def get_products(chat_id: int):
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        row = conn.execute("SELECT products FROM subscriptions WHERE chat_id = ?", (chat_id,)).fetchone()
+    return row[0] if row else None
+
+def set_products(chat_id: int, products: int) -> bool:
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        cursor = conn.execute("UPDATE subscriptions SET products = ? WHERE chat_id = ?", (products, chat_id))
+        conn.commit()
+        return cursor.rowcount > 0
+
+def mark_sent(chat_ids: list[int], today: str):
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        conn.executemany("UPDATE subscriptions SET sent_on = ? WHERE chat_id = ?", [(today, c) for c in chat_ids])
+        conn.commit()
+
+# 🗂 пересчёт корзин (переход на летнее время, подписки без корзины после миграции)
+def get_delivery_settings():
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        return conn.execute("SELECT chat_id, tz, hour, bucket FROM subscriptions").fetchall()
+
+def save_buckets(buckets: list[tuple]):
+    """:param buckets: [(chat_id, bucket, sent_on или None), ...]; None не меняет sent_on"""
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        conn.executemany(
+            "UPDATE subscriptions SET bucket = ?, sent_on = COALESCE(?, sent_on) WHERE chat_id = ?",
+            [(bucket, sent_on, chat_id) for chat_id, bucket, sent_on in buckets]
+        )
+        conn.commit()
+
+# 📝 сохранить предсказание (только ID карт и их положение, текст собирается при чтении)
+def save_prediction(chat_id: int, cards: list[tuple[int, bool]], prediction_type: str = "tarot"):
     with sqlite3.connect(os.path.join("data", DB)) as conn:
         conn.execute(
-            "INSERT INTO predictions (chat_id, type, text) VALUES (?, ?, ?)",
-            (chat_id, prediction_type, text)
+            "INSERT INTO predictions (chat_id, type, cards) VALUES (?, ?, ?)",
+            (chat_id, prediction_type, encode_cards(cards))
         )
         conn.commit()
 
+# 📚 страница истории предсказаний (keyset-пагинация по id)
+def get_predictions_page(chat_id: int, before_id: int = None, limit: int = 5):
+    """
+    Возвращает [(id, type, cards, text, date), ...] от новых к старым.
+    :param before_id: id последней записи предыдущей страницы
+    :return: cards — список (card_id, is_reversed) или None для старых текстовых записей
+    """
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        if before_id is None:
+            rows = conn.execute(
+                "SELECT id, type, cards, text, date FROM predictions "
+                "WHERE chat_id = ? ORDER BY id DESC LIMIT ?",
+                (chat_id, limit)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT id, type, cards, text, date FROM predictions "
+                "WHERE chat_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (chat_id, before_id, limit)
+            ).fetchall()
+
+    return [
+        (row_id, prediction_type, decode_cards(cards) if cards is not None else None, text, date)
+        for row_id, prediction_type, cards, text, date in rows
+    ]
+
 # 📖 получить последние n предсказаний
 def get_latest_predictions(chat_id: int, limit: int = 5):
+    return [
+        (prediction_type, render_spread(prediction_type, cards) if cards is not None else text, date)
+        for _, prediction_type, cards, text, date in get_predictions_page(chat_id, limit=limit)
+    ]
+
+# 🧹 удалить старые предсказания и сжать базу
+def purge_old_predictions(days: int = PREDICTIONS_RETENTION_DAYS) -> int:
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        cursor = conn.execute(
+            "DELETE FROM predictions WHERE date < date('now', ?)",
+            (f"-{days} days",)
+        )
+        conn.commit()
+        deleted = cursor.rowcount
+        # VACUUM нельзя выполнять внутри транзакции — только после commit
+        conn.execute("VACUUM")
+        return deleted
+
+# 🖼 Telegram file_id загруженных изображений карт
+def get_card_file_ids() -> dict:
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        return dict(conn.execute("SELECT card_id, file_id FROM card_file_ids").fetchall())
+
+def save_card_file_ids(file_ids: dict):
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        conn.executemany(
+            "REPLACE INTO card_file_ids (card_id, file_id) VALUES (?, ?)",
+            file_ids.items()
+        )
+        conn.commit()
+
+def delete_card_file_ids(card_ids):
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        conn.executemany("DELETE FROM card_file_ids WHERE card_id = ?", [(card_id,) for card_id in card_ids])
+        conn.commit()
+
+# 🔮 заранее сгенерированные варианты гороскопа: (знак, период, подробный) → тексты
+def get_horoscope_variants(sign: str, period: str, detailed: bool) -> list[str]:
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        rows = conn.execute(
+            "SELECT text FROM horoscope_variants WHERE sign = ? AND period = ? AND detailed = ? ORDER BY variant",
+            (sign, period, int(detailed))
+        ).fetchall()
+    return [text for (text,) in rows]
+
+def save_horoscope_variants(sign: str, period: str, detailed: bool, texts: list[str]):
+    """Заменяет весь набор вариантов для ключа"""
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        conn.execute(
+            "DELETE FROM horoscope_variants WHERE sign = ? AND period = ? AND detailed = ?",
+            (sign, period, int(detailed))
+        )
+        conn.executemany(
+            "INSERT INTO horoscope_variants (sign, period, detailed, variant, text) VALUES (?, ?, ?, ?, ?)",
+            [(sign, period, int(detailed), i, text) for i, text in enumerate(texts)]
+        )
+        conn.commit()
+
+def _period_pattern(period: str) -> str:
+    """Шаблон LIKE для периодов того же вида: 2025-06-01 → ____-__-__, 2025-W23 → ____-W__, 2025-M06 → ____-M__"""
+    return re.sub(r"\d", "_", period)
+
+def get_latest_horoscope_variant(sign: str, detailed: bool, period: str):
+    """
+    Первый вариант за последний период того же вида, что period, и раньше него — или None.
+    Пулы на будущее (завтрашний готовится заранее) не подходят: это был бы чужой день
+    """
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        row = conn.execute(
+            "SELECT text FROM horoscope_variants "
+            "WHERE sign = ? AND detailed = ? AND period LIKE ? AND period < ? "
+            "ORDER BY period DESC, variant LIMIT 1",
+            (sign, int(detailed), _period_pattern(period), period)
+        ).fetchone()
+    return row[0] if row else None
+
+def purge_old_horoscope_variants(before_period: str) -> int:
+    """Удаляет варианты за периоды того же вида раньше before_period (дата, ISO-неделя или месяц)"""
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        cursor = conn.execute(
+            "DELETE FROM horoscope_variants WHERE period < ? AND period LIKE ?",
+            (before_period, _period_pattern(before_period))
+        )
+        conn.commit()
+        return cursor.rowcount
+
+# 🪐 натальные карты и личные транзиты
+def save_natal_chart(chat_id: int, birth_date: str, birth_time: str, tz: str, place: str, chart: bytes):
+    """Сохраняет карту; посчитанные по старой карте транзиты удаляются"""
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO natal_charts (chat_id, birth_date, birth_time, tz, place, chart) VALUES (?, ?, ?, ?, ?, ?)",
+            (chat_id, birth_date, birth_time, tz, place, chart)
+        )
+        conn.execute("DELETE FROM natal_transits WHERE chat_id = ?", (chat_id,))
+        conn.commit()
+
+def get_natal_chart(chat_id: int):
+    """:return: (birth_date, birth_time, tz, place, chart) или None"""
     with sqlite3.connect(os.path.join("data", DB)) as conn:
         return conn.execute(
-            "SELECT type, text, date FROM predictions WHERE chat_id = ? ORDER BY id DESC LIMIT ?",
-            (chat_id, limit)
-        ).fetchall()
\ No newline at end of file
+            "SELECT birth_date, birth_time, tz, place, chart FROM natal_charts WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+
+def delete_natal_chart(chat_id: int) -> bool:
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        cursor = conn.execute("DELETE FROM natal_charts WHERE chat_id = ?", (chat_id,))
+        conn.execute("DELETE FROM natal_transits WHERE chat_id = ?", (chat_id,))
+        conn.commit()
+        return cursor.rowcount > 0
+
+def get_natal_charts():
+    """:return: [(chat_id, chart, известно ли время рождения), ...] — для пакетного расчёта"""
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        return conn.execute("SELECT chat_id, chart, birth_time IS NOT NULL FROM natal_charts").fetchall()
+
+def save_natal_transits(day: str, rows: list[tuple]):
+    """:param rows: [(chat_id, сигнатура), ...]"""
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO natal_transits (day, chat_id, signature) VALUES (?, ?, ?)",
+            [(day, chat_id, signature) for chat_id, signature in rows]
+        )
+        conn.commit()
+
+def get_natal_transits(day: str) -> dict:
+    """:return: chat_id → сигнатура за день"""
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        return dict(conn.execute("SELECT chat_id, signature FROM natal_transits WHERE day = ?", (day,)))
+
+def get_natal_text(day: str, signature: str):
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        row = conn.execute(
+            "SELECT text FROM natal_texts WHERE day = ? AND signature = ?", (day, signature)
+        ).fetchone()
+    return row[0] if row else None
+
+def save_natal_texts(day: str, texts: dict):
+    """:param texts: сигнатура → текст группы"""
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO natal_texts (day, signature, text) VALUES (?, ?, ?)",
+            [(day, signature, text) for signature, text in texts.items()]
+        )
+        conn.commit()
+
+def purge_old_natal_transits(before_day: str) -> int:
+    """Удаляет транзиты и тексты групп за дни раньше before_day"""
+    with sqlite3.connect(os.path.join("data", DB)) as conn:
+        deleted = conn.execute("DELETE FROM natal_transits WHERE day < ?", (before_day,)).rowcount
+        deleted += conn.execute("DELETE FROM natal_texts WHERE day < ?", (before_day,)).rowcount
+        conn.commit()
+        return deleted
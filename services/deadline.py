@@ -0,0 +1,33 @@
+import time
+
+# Этап, которому осталось меньше, пропускается: запрос всё равно не успеет
+MIN_STAGE_BUDGET = 0.5
+
+
+class Deadline:
+    """
+    Общий бюджет времени на запрос пользователя. Каждый этап берёт таймаут
+    не больше остатка, поэтому суммарное ожидание не превышает бюджет.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+def stage_timeout(deadline, cap: float, reserve: float = 0.0) -> float:
+    """
+    Таймаут этапа: его обычный предел cap, урезанный до остатка бюджета
+    за вычетом reserve — времени, оставленного следующим этапам.
+    Без дедлайна (фоновые задачи) — просто cap. 0 — этап нужно пропустить.
+    """
+    if deadline is None:
+        return cap
+    timeout = min(cap, deadline.remaining() - reserve)
+    return timeout if timeout >= MIN_STAGE_BUDGET else 0.0
@@ -0,0 +1,96 @@
+"""
+Расписание ежедневной рассылки: у каждой подписки свой часовой пояс и час доставки.
+
+Подписчики раскладываются по корзинам — минутам суток UTC (0…1439). Внутри выбранного часа
+минута определяется chat_id, так что подписчики одного часа равномерно делятся на 60 корзин.
+Планировщик каждую минуту забирает из базы корзины, чьё время наступило, и отмечает отправку.
+"""
+
+import re
+from datetime import datetime, date, time
+
+import pytz
+
+DEFAULT_TIMEZONE = "Europe/Moscow"
+DEFAULT_HOUR = 10
+SPREAD_MINUTES = 60  # на сколько минут от начала часа растягивается доставка
+
+# Короткие названия, которые пишут пользователи
+TIMEZONE_ALIASES = {
+    "мск": "Europe/Moscow",
+    "msk": "Europe/Moscow",
+    "utc": "UTC",
+    "gmt": "UTC",
+}
+_OFFSET_RE = re.compile(r"^(?:utc|gmt)?\s*([+-])\s*(\d{1,2})$")
+
+
+def parse_timezone(value: str):
+    """
+    Часовой пояс из ввода пользователя: IANA-имя (Europe/Berlin), алиас (мск) или смещение от UTC (+3, UTC-5).
+    :return: имя пояса для pytz или None
+    """
+    text = value.strip()
+    lowered = text.lower()
+    if lowered in TIMEZONE_ALIASES:
+        return TIMEZONE_ALIASES[lowered]
+
+    match = _OFFSET_RE.match(lowered)
+    if match:
+        sign, hours = match.groups()
+        if int(hours) == 0:
+            return "UTC"
+        # В базе tz знак смещения обратный: Etc/GMT-3 — это UTC+3
+        text = f"Etc/GMT{'-' if sign == '+' else '+'}{int(hours)}"
+
+    try:
+        return pytz.timezone(text).zone
+    except pytz.UnknownTimeZoneError:
+        return None
+
+
+def timezone_label(tz_name: str) -> str:
+    """Etc/GMT-3 → UTC+3, остальные имена без изменений"""
+    if tz_name.startswith("Etc/GMT"):
+        offset = tz_name.removeprefix("Etc/GMT")
+        return f"UTC{'+' if offset.startswith('-') else '-'}{offset[1:]}"
+    return tz_name
+
+
+def utc_now() -> datetime:
+    return datetime.now(pytz.utc)
+
+
+def current_bucket(now: datetime = None) -> tuple[str, int]:
+    """:return: (дата UTC в ISO, минута суток UTC)"""
+    now = now or utc_now()
+    return now.date().isoformat(), now.hour * 60 + now.minute
+
+
+def bucket_for(chat_id: int, tz_name: str, hour: int, day: date = None) -> int:
+    """
+    Корзина подписки на день day (по умолчанию — сегодня по UTC).
+    День нужен из-за перехода на летнее время: корзины пересчитываются ежедневно.
+    """
+    day = day or utc_now().date()
+    tz = pytz.timezone(tz_name)
+    local = tz.localize(datetime.combine(day, time(hour, chat_id % SPREAD_MINUTES)))
+    delivery = local.astimezone(pytz.utc)
+    return delivery.hour * 60 + delivery.minute
+
+
+def schedule(chat_id: int, tz_name: str, hour: int) -> tuple[int, str]:
+    """
+    Корзина и отметка отправки для новой или изменённой подписки.
+    Если время доставки сегодня уже прошло, сегодняшняя доставка пропускается:
+    иначе подписчик получил бы рассылку сразу после подписки.
+    :return: (bucket, sent_on или None)
+    """
+    today, minute = current_bucket()
+    bucket = bucket_for(chat_id, tz_name, hour)
+    return bucket, today if bucket <= minute else None
+
+
+def local_day(tz_name: str, now: datetime = None) -> date:
+    """Текущая дата в часовом поясе подписчика"""
+    return (now or utc_now()).astimezone(pytz.timezone(tz_name)).date()
@@ -0,0 +1,173 @@
+"""
+Ежедневный дайджест подписчика: одно сообщение из нескольких продуктов.
+
+Набор продуктов хранится в subscriptions.products битовой маской (PRODUCTS[i] — бит i).
+Каждая секция рендерится по ключу (шаблон, вариант, дата): для гороскопов вариант — знак
+и номер варианта из пула, для карты дня — карта и её положение, для Луны — только дата,
+для личных транзитов — сигнатура группы (services.natal).
+Поэтому рассылка на тысячи подписчиков стоит по одному рендеру на различную комбинацию,
+а сообщение пользователя лишь склеивается из готовых секций.
+"""
+
+import logging
+from datetime import date
+
+from cachetools import TTLCache
+
+from services.delivery import local_day
+from services.reference import on_change, changed_indexes, find_sign
+from services.text_split import split_message
+
+logger = logging.getLogger(__name__)
+
+# Порядок задаёт бит в маске и порядок секций в сообщении — новые продукты только в конец.
+# weekly и monthly берут пулы периодов "week" и "month": страницы сайта для них — в SITE_PAGES
+# (services/generate_horoscope.py), без этого секции не собираются
+PRODUCTS = ("horoscope", "tarot", "moon", "weekly", "monthly", "natal")
+PRODUCT_TITLES = {
+    "horoscope": "🌟 Гороскоп на день",
+    "tarot": "🃏 Карта дня",
+    "moon": "🌙 Луна",
+    "weekly": "📅 Гороскоп на неделю (по понедельникам)",
+    "monthly": "🗓 Гороскоп на месяц (1-го числа)",
+    "natal": "🪐 Личные транзиты (по натальной карте)",
+}
+DEFAULT_PRODUCTS = 1  # только гороскоп на день
+SECTION_SEPARATOR = f"\n\n{'─' * 20}\n\n"
+
+# (шаблон, вариант, дата) → готовая секция
+render_cache = TTLCache(maxsize=5000, ttl=86400)
+# Пулы, которые не удалось собрать: не повторяем генерацию для каждого подписчика корзины
+unavailable_pools = TTLCache(maxsize=100, ttl=300)
+
+
+def _forget_tarot_sections(old, new):
+    """Новая версия колоды: убираем готовые секции только изменившихся карт"""
+    changed = set(changed_indexes(old, new))
+    for key in [key for key in list(render_cache) if key[0] == "tarot" and key[1][0] in changed]:
+        render_cache.pop(key, None)
+
+
+on_change("tarot", _forget_tarot_sections)
+
+
+def products_from_mask(mask: int) -> list[str]:
+    return [product for i, product in enumerate(PRODUCTS) if mask >> i & 1]
+
+
+def toggle_product(mask: int, index: int) -> int:
+    return mask ^ (1 << index)
+
+
+def _cached(template: str, variant, day: date, render) -> str:
+    key = (template, variant, day.isoformat())
+    text = render_cache.get(key)
+    if text is None:
+        text = render()
+        render_cache[key] = text
+    return text
+
+
+def _horoscope_section(template: str, chat_id: int, sign: str, day: str, user_date: date, title: str) -> str:
+    """
+    :param day: today, week или month — период считается от местной даты подписчика,
+        а не от даты сервера: западнее сервера это может быть наше «вчера», восточнее — «завтра»
+    """
+    from services.generate_horoscope import get_variants, generate_horoscope, server_day
+
+    # Подписка хранит знак по-русски, пулы — по английскому имени: ключ берём из справочника
+    zodiac_sign = find_sign(sign)
+    sign, sign_title = (zodiac_sign.en, zodiac_sign.title) if zodiac_sign else (sign, sign.capitalize())
+    variants = get_variants(sign, day, on=user_date)
+    pool_key = (sign, day, user_date)
+    if not variants and pool_key not in unavailable_pools:
+        # Пула нет: generate_horoscope соберёт его под тем же ключом периода, следующие подписчики
+        # возьмут уже из пула. Период, которого у сервера нет (неделя подписчика ещё не началась), не собирается
+        generate_day = server_day(day, user_date)
+        if generate_day:
+            generate_horoscope(sign, generate_day, user_id=chat_id)
+            variants = get_variants(sign, day, on=user_date)
+    if not variants:
+        unavailable_pools[pool_key] = True
+        return f"<b>{title}</b>\n\n⚠️ Гороскоп пока не готов."
+
+    index = chat_id % len(variants)  # тот же выбор, что pick_variant
+    # Размер пула в ключе: достроенный пул даёт новые секции, а не старый текст под тем же номером
+    return _cached(
+        template, (sign, len(variants), index), user_date,
+        lambda: f"<b>{title}</b>\nЗнак: {sign_title}\n\n{variants[index].strip()}"
+    )
+
+
+def _tarot_section(chat_id: int, user_date: date) -> str:
+    from services.tarot import card_of_the_day, get_deck
+
+    card_id, is_reversed = card_of_the_day(chat_id, user_date)
+    return _cached(
+        "tarot", (card_id, is_reversed), user_date,
+        lambda: f"<b>🃏 Карта дня</b>\n\n{get_deck()[card_id].texts[is_reversed]}"
+    )
+
+
+def _moon_section(user_date: date) -> str:
+    from services.astro_data import get_lunar_info
+
+    def render():
+        info = get_lunar_info(user_date)
+        return (
+            f"<b>🌙 Луна</b>\n\n"
+            f"{info['phase_text']}, освещённость {info['moon_phase']}%\n"
+            f"Луна в знаке: {info['moon_sign']}"
+        )
+    return _cached("moon", None, user_date, render)
+
+
+def _natal_section(chat_id: int, user_date: date) -> str:
+    from services.natal import day_signature, group_text
+
+    signature = day_signature(chat_id, user_date)
+    if signature is None:
+        return "<b>🪐 Личные транзиты</b>\n\nДобавьте дату рождения командой /natal — и здесь появится прогноз по вашей карте."
+    # Текст один на группу подписчиков с одинаковыми транзитами
+    return _cached(
+        "natal", signature, user_date,
+        lambda: f"<b>🪐 Личные транзиты</b>\n\n{group_text(signature, user_date)}"
+    )
+
+
+def render_digest(chat_id: int, sign: str, tz: str, mask: int) -> list[str]:
+    """
+    Собирает дайджест подписчика.
+    :param tz: часовой пояс подписчика — от него зависит дата
+    :param mask: битовая маска продуктов
+    :return: части сообщения (HTML) в пределах лимита Telegram; пустой список, если сегодня нечего слать
+    """
+    user_date = local_day(tz)
+    sections = []
+    for product in products_from_mask(mask):
+        try:
+            if product == "horoscope":
+                sections.append(_horoscope_section(
+                    "horoscope", chat_id, sign, "today", user_date, "🌟 Гороскоп на сегодня"
+                ))
+            elif product == "tarot":
+                sections.append(_tarot_section(chat_id, user_date))
+            elif product == "moon":
+                sections.append(_moon_section(user_date))
+            elif product == "weekly" and user_date.weekday() == 0:
+                sections.append(_horoscope_section(
+                    "weekly", chat_id, sign, "week", user_date, "📅 Гороскоп на неделю"
+                ))
+            elif product == "monthly" and user_date.day == 1:
+                sections.append(_horoscope_section(
+                    "monthly", chat_id, sign, "month", user_date, "🗓 Гороскоп на месяц"
+                ))
+            elif product == "natal":
+                sections.append(_natal_section(chat_id, user_date))
+        except Exception:
+            logger.exception(f"Ошибка при сборке секции {product} для chat_id={chat_id}")
+
+    if not sections:
+        return []
+    header = f"🌟 <b>Ваш дайджест на {user_date.strftime('%d.%m.%Y')}</b>"
+    return split_message(SECTION_SEPARATOR.join([header, *sections]), html=True)
@@ -1,3 +1,4 @@
+import os
 import random
 from datetime import date, timedelta
 import logging
@@ -6,22 +7,52 @@ from bs4 import BeautifulSoup
 from cachetools import TTLCache  # Для кэширования с TTL
 
 from services.yandex_translate import translate_text
-from services.yandex_gpt import generate_text_with_system
+from services.yandex_gpt import generate_text_with_system, stream_text_with_system, IncompleteStream
 from services.astro_data import get_lunar_info
 from services.astroseek_scraper import get_day_energy_description
+from services.database import get_horoscope_variants, save_horoscope_variants, get_latest_horoscope_variant
+from services.circuit_breaker import get_breaker
+from services.deadline import Deadline, stage_timeout
+from services.shared_state import SharedCache, local_ttl
+from services.reference import ZODIAC, find_sign
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Кэши для гороскопов с разными TTL (max 1000 записей каждый)
-daily_cache = TTLCache(maxsize=1000, ttl=86400)  # 24 часа для today/tomorrow
-weekly_cache = TTLCache(maxsize=1000, ttl=604800)  # 7 дней для week
+# Кэши пулов вариантов с разными TTL (max 1000 записей каждый), источник — таблица horoscope_variants.
+# Воркеры перечитывают пул из базы не реже раза в минуту: его достраивает лидер
+daily_cache = TTLCache(maxsize=1000, ttl=local_ttl(86400))  # 24 часа для today/tomorrow
+weekly_cache = TTLCache(maxsize=1000, ttl=local_ttl(604800))  # 7 дней для week
+monthly_cache = TTLCache(maxsize=1000, ttl=local_ttl(31 * 86400))  # месяц для month
 
-# Соответствие имени знака и id на сайте
-SIGN_MAP = {
-    'aries': 1, 'taurus': 2, 'gemini': 3, 'cancer': 4,
-    'leo': 5, 'virgo': 6, 'libra': 7, 'scorpio': 8,
-    'sagittarius': 9, 'capricorn': 10, 'aquarius': 11, 'pisces': 12
+# Последний удачный текст с сайта по (знак, день): запасной ответ, пока breaker открыт
+site_cache = SharedCache("site", maxsize=100, ttl=86400)
+site_breaker = get_breaker("horoscope_com")
+
+# Сколько перефразировок в разных тонах готовится заранее на знак/день
+VARIANT_COUNT = 3
+
+# Недельный и месячный гороскопы — один текст на знак за период, без деления на краткий и подробный:
+# один вызов GPT на знак в неделю и в месяц
+LONG_PERIODS = ("week", "month")
+PERIOD_HINTS = {
+    "week": "Это гороскоп на неделю: пиши о тенденциях всей недели, а не одного дня.",
+    "month": "Это гороскоп на месяц: пиши о главных темах месяца, а не о событиях одного дня.",
+}
+
+# Бюджет запроса пользователя, сек. Этапы деградируют по мере его расхода:
+# сначала пропускается энергия дня, затем GPT, затем отдаётся последний готовый текст
+BRIEF_DEADLINE = 8.0
+DETAILED_DEADLINE = 15.0
+GPT_MIN_BUDGET = 3.0  # меньше — GPT не успеет, отдаём перевод
+
+HOROSCOPE_SITE_URL = os.getenv("HOROSCOPE_SITE_URL", "https://www.horoscope.com")
+# Страница horoscope.com для каждого периода
+SITE_PAGES = {
+    "yesterday": "horoscope-general-daily-yesterday.aspx",
+    "today": "horoscope-general-daily-today.aspx",
+    "tomorrow": "horoscope-general-daily-tomorrow.aspx",
+    "week": "horoscope-general-weekly.aspx",
+    "month": "horoscope-general-monthly.aspx",
 }
 
 # Стилевые варианты перефразировки
@@ -43,114 +74,352 @@ START_INTROS = [
 ]
 
 
-def fetch_horoscope_from_site(sign: str, day: str = "today") -> str:
-    """Парсинг текста гороскопа с сайта horoscope.com"""
-    sign_id = SIGN_MAP.get(sign.lower())
-    if not sign_id:
+def fetch_horoscope_from_site(sign: str, day: str = "today", timeout: float = 10) -> str:
+    """Парсинг текста гороскопа с сайта horoscope.com: день, неделя или месяц (SITE_PAGES)"""
+    zodiac_sign = find_sign(sign)
+    if zodiac_sign is None:
         return "🚫 Неверный знак зодиака"
+    if day not in SITE_PAGES:
+        return "🚫 Неверный период гороскопа"
+    sign_id = zodiac_sign.site_id
+
+    url = f"{HOROSCOPE_SITE_URL}/us/horoscopes/general/{SITE_PAGES[day]}?sign={sign_id}"
+    cache_key = (sign_id, _period(day))
+
+    if not site_breaker.allow():
+        logger.warning("horoscope.com недоступен (breaker открыт).")
+        return site_cache.get(cache_key, "⚠️ Сайт гороскопов временно недоступен")
 
-    url = f"https://www.horoscope.com/us/horoscopes/general/horoscope-general-daily-{day}.aspx?sign={sign_id}"
-    
     try:
-        response = requests.get(url, timeout=10)
+        response = requests.get(url, timeout=timeout)
         response.raise_for_status()
+        site_breaker.record_success()
+    except Exception as e:
+        logger.error(f"Ошибка загрузки гороскопа: {e}")
+        site_breaker.record_failure()
+        return site_cache.get(cache_key, f"⚠️ Не удалось получить гороскоп: {e}")
+
+    try:
         soup = BeautifulSoup(response.text, "html.parser")
         box = soup.find("div", class_="main-horoscope")
         p = box.find("p")
         text = p.get_text(strip=True)
+        site_cache[cache_key] = text
         return text
     except Exception as e:
         logger.error(f"Ошибка парсинга гороскопа: {e}")
         return f"⚠️ Не удалось получить гороскоп: {e}"
 
 
-def generate_horoscope(sign: str, day: str = "today", detailed: bool = False) -> str:
+SYSTEM_PROMPT = (
+    "Ты создаешь персональные гороскопы на русском языке. "
+    "Пиши по-настоящему: искренне, без клише, без эзотерики. "
+    "Текст должен быть интересным, человечным и легко воспринимаемым."
+)
+
+
+def _cache_for(day: str) -> TTLCache:
+    if day == "week":
+        return weekly_cache
+    if day == "month":
+        return monthly_cache
+    return daily_cache
+
+
+def target_date(day: str, today: date = None) -> date:
     """
-    Финальная генерация гороскопа с кэшированием:
-    - парсим гороскоп
-    - переводим
-    - перефразируем через GPT
-    - добавляем лунный и энергетический контекст
+    Дата, к которой относится гороскоп; для недели и месяца — их первый день.
+    :param today: от какой даты считать (по умолчанию — сегодня на сервере)
     """
-    # Выбор кэша в зависимости от day
+    today = today or date.today()
+    if day == "tomorrow":
+        return today + timedelta(days=1)
+    if day == "yesterday":
+        return today - timedelta(days=1)
     if day == "week":
-        cache = weekly_cache
-    else:
-        cache = daily_cache
+        return today - timedelta(days=today.weekday())
+    if day == "month":
+        return today.replace(day=1)
+    return today
 
-    # Ключ для кэша
-    cache_key = f"{sign.lower()}_{day}_{detailed}"
 
-    # Проверка кэша
-    if cache_key in cache:
-        logger.info(f"Гороскоп для {sign} ({day}, detailed={detailed}) взят из кэша.")
-        return cache[cache_key]
+def _period(day: str, today: date = None) -> str:
+    """
+    Ключ периода: дата для yesterday/today/tomorrow, ISO-неделя для week (2025-W23), месяц для month (2025-M06).
+    :param today: от какой даты считать — например, от местной даты подписчика
+    """
+    today = today or date.today()
+    if day == "week":
+        year, week, _ = today.isocalendar()
+        return f"{year}-W{week:02d}"
+    if day == "month":
+        return f"{today.year}-M{today.month:02d}"
+    return target_date(day, today).isoformat()
 
-    try:
-        # 1. Парсинг оригинала
-        original_text_en = fetch_horoscope_from_site(sign, day)
-        if original_text_en.startswith("⚠️") or original_text_en.startswith("🚫"):
-            return original_text_en
 
-        # 2. Перевод
-        translated_text = translate_text(original_text_en, target_lang="ru")
+def period_keys(today: date = None) -> tuple[str, ...]:
+    """Ключи дня, недели и месяца на дату today — всё, что раньше них, устарело"""
+    return _period("today", today), _period("week", today), _period("month", today)
 
-        # 3. Дополнительный контекст — Луна и энергия дня
-        target_date = date.today() if day == "today" else date.today() + timedelta(days=1)
-        lunar_info = get_lunar_info(target_date)
-        energy = get_day_energy_description()
 
-        moon_context = f"Луна в {lunar_info['moon_sign']}, фаза: {lunar_info['phase_text']}, {lunar_info['moon_phase']}%"
-        energy_context = f"Энергия дня: {energy or 'не определена'}"
+def server_day(day: str, user_date: date):
+    """
+    Период сервера, в который попадает period подписчика с местной датой user_date:
+    для today — yesterday, today или tomorrow, для week и month — они же, если неделя
+    или месяц у подписчика и сервера совпадают. :return: имя периода или None
+    """
+    if day in LONG_PERIODS:
+        return day if _period(day, user_date) == _period(day) else None
+    return {-1: "yesterday", 0: "today", 1: "tomorrow"}.get((user_date - date.today()).days)
 
-        # 4. Генерация стиля и интро
-        tone = random.choice(REPHRASE_TONES)
-        intro = random.choice(START_INTROS)
 
-        # 5. Формируем promt
-        system_prompt = (
-            "Ты создаешь персональные гороскопы на русском языке. "
-            "Пиши по-настоящему: искренне, без клише, без эзотерики. "
-            "Текст должен быть интересным, человечным и легко воспринимаемым."
-        )
+def variant_count(day: str) -> int:
+    return 1 if day in LONG_PERIODS else VARIANT_COUNT
+
+
+def _prepare_context(sign: str, day: str, deadline: Deadline = None):
+    """
+    Парсинг, перевод и сбор контекста дня — общие для всех вариантов.
+    :param deadline: бюджет запроса; None — обычные таймауты (фоновая подготовка)
+    :return: (translated_text, moon_context, energy_context) или строка с ошибкой
+    """
+    # 1. Парсинг оригинала
+    timeout = stage_timeout(deadline, 10)
+    if not timeout:
+        return "⚠️ Не хватило времени на загрузку гороскопа"
+    original_text_en = fetch_horoscope_from_site(sign, day, timeout=timeout)
+    if original_text_en.startswith("⚠️") or original_text_en.startswith("🚫"):
+        return original_text_en
+
+    # 2. Перевод
+    timeout = stage_timeout(deadline, 10)
+    if not timeout:
+        return "⚠️ Не хватило времени на перевод гороскопа"
+    translated_text = translate_text(original_text_en, target_lang="ru", timeout=timeout)
+
+    # 3. Дополнительный контекст — Луна и энергия дня.
+    # Энергия дня необязательна: оставляем время на GPT
+    lunar_info = get_lunar_info(target_date(day))
+    moon_context = f"Луна в {lunar_info['moon_sign']}, фаза: {lunar_info['phase_text']}, {lunar_info['moon_phase']}%"
+
+    if day in LONG_PERIODS:
+        # Энергия одного дня для недели и месяца не показательна
+        return translated_text, f"В начале периода: {moon_context}", PERIOD_HINTS[day]
+
+    timeout = stage_timeout(deadline, 10, reserve=GPT_MIN_BUDGET)
+    energy = get_day_energy_description(timeout=timeout) if timeout else ""
+    energy_context = f"Энергия дня: {energy or 'не определена'}"
 
-        user_prompt = f"""
+    return translated_text, moon_context, energy_context
+
+
+def _build_prompt(translated_text: str, moon_context: str, energy_context: str, tone: str) -> str:
+    return f"""
 Вот перевод гороскопа:
 
 \"\"\"{translated_text}\"\"\"
 
 Перепиши его в стиле — {tone}.
 Избегай штампов и банальностей. Пиши по-человечески, как будто обращаешься к одному человеку.
-Учитывай этот контекст дня:
+Учитывай этот контекст:
 
 - {moon_context}
 - {energy_context}
-"""
-
-        # 6. Генерация финального текста с ограничением temperature [0.9, 1.0]
-        temperature = random.uniform(0.9, 1.0)  # Ограничено до 1.0, чтобы избежать ошибки 400 в Yandex GPT
-        logger.info(f"Генерация GPT с temperature={temperature:.2f}")
-
-        try:
-            gpt_response = generate_text_with_system(
-                system_prompt=system_prompt,
-                user_prompt=user_prompt.strip(),
-                temperature=temperature,  # Уже ограничено
-                max_tokens=1000 if detailed else 500  # Контроль длины в зависимости от detailed
-            )
-            if not gpt_response:  # Если GPT вернул пустую строку (fallback)
-                raise ValueError("GPT вернул пустой ответ")
-            final_text = f"{intro}\n\n{gpt_response.strip()}"
-        except Exception as e:
-            logger.warning(f"GPT недоступен. Используем перевод. {e}")
-            final_text = f"{intro}\n\n{translated_text.strip()}"
+""".strip()
+
+
+def _temperature() -> float:
+    # Ограничено [0.9, 1.0], чтобы избежать ошибки 400 в Yandex GPT
+    temperature = random.uniform(0.9, 1.0)
+    logger.info(f"Генерация GPT с temperature={temperature:.2f}")
+    return temperature
+
+
+def request_deadline(detailed: bool) -> Deadline:
+    return Deadline(DETAILED_DEADLINE if detailed else BRIEF_DEADLINE)
+
+
+def _last_good_text(sign: str, day: str, detailed: bool, error: str) -> str:
+    """Последний готовый гороскоп знака из пула за прошлые периоды того же вида — если бюджет кончился до GPT"""
+    text = get_latest_horoscope_variant(_sign_key(sign), detailed, _period(day))
+    if text:
+        logger.warning(f"Гороскоп для {sign}: {error}. Отдаём последний готовый текст.")
+        return text
+    return error
 
-        # Кэшируем результат
-        cache[cache_key] = final_text
-        logger.info(f"Гороскоп для {sign} ({day}, detailed={detailed}) сгенерирован и закеширован.")
 
-        return final_text
+def _sign_key(sign: str) -> str:
+    """Ключ пула — английское имя знака: один пул на "овен", "Aries" и "aries" """
+    zodiac_sign = find_sign(sign)
+    return zodiac_sign.en if zodiac_sign else sign.lower()
+
+
+def get_variants(sign: str, day: str = "today", detailed: bool = False, on: date = None) -> tuple:
+    """
+    Пул готовых вариантов из памяти или БД; пустой кортеж, если пул не собран.
+    :param on: дата, от которой считается период (местная дата подписчика), по умолчанию — дата сервера
+    """
+    cache = _cache_for(day)
+    key = (_sign_key(sign), _period(day, on), detailed)
+    variants = cache.get(key)
+    if variants is None:
+        variants = tuple(get_horoscope_variants(*key))
+        if not variants:
+            return ()
+        cache[key] = variants
+    return variants
+
+
+def _store_variants(sign: str, day: str, detailed: bool, variants: list[str]):
+    key = (_sign_key(sign), _period(day), detailed)
+    save_horoscope_variants(*key, variants)
+    _cache_for(day)[key] = tuple(variants)
+
+
+def pick_variant(variants: tuple, user_id: int = None) -> str:
+    """Один и тот же вариант для пользователя в течение периода, без user_id — случайный"""
+    if user_id is None:
+        return random.choice(variants)
+    return variants[user_id % len(variants)]
+
+
+def generate_variants(sign: str, day: str = "today", detailed: bool = False, count: int = VARIANT_COUNT,
+                      deadline: Deadline = None) -> list[str]:
+    """
+    Собирает пул: один парсинг и перевод, затем count перефразировок GPT в разных тонах.
+    Если GPT не ответил ни разу или на него не осталось бюджета, в пул попадает перевод.
+    """
+    context = _prepare_context(sign, day, deadline)
+    if isinstance(context, str):
+        logger.warning(f"Пул для {sign} ({day}) не собран: {context}")
+        return []
+    translated_text, moon_context, energy_context = context
+
+    variants = []
+    tones = random.sample(REPHRASE_TONES, min(count, len(REPHRASE_TONES)))
+    intros = random.sample(START_INTROS, len(tones))
+    for tone, intro in zip(tones, intros):
+        timeout = stage_timeout(deadline, 30)
+        if timeout < GPT_MIN_BUDGET:
+            logger.warning(f"Бюджет запроса исчерпан, GPT для {sign} пропущен.")
+            break
+        gpt_response = generate_text_with_system(
+            system_prompt=SYSTEM_PROMPT,
+            user_prompt=_build_prompt(translated_text, moon_context, energy_context, tone),
+            temperature=_temperature(),
+            max_tokens=_max_tokens(day, detailed),
+            timeout=timeout
+        )
+        if gpt_response:
+            variants.append(f"{intro}\n\n{gpt_response.strip()}")
+
+    if not variants:
+        logger.warning(f"GPT недоступен. В пул {sign} ({day}) идёт перевод.")
+        variants.append(f"{intros[0]}\n\n{translated_text.strip()}")
+
+    _store_variants(sign, day, detailed, variants)
+    logger.info(f"Пул гороскопов {sign} ({day}, detailed={detailed}): {len(variants)} вариантов.")
+    return variants
+
+
+def _max_tokens(day: str, detailed: bool) -> int:
+    # Контроль длины в зависимости от detailed; неделя и месяц — как подробный
+    return 1000 if detailed or day in LONG_PERIODS else 500
+
+
+def pregenerate_variants(days=("today", "tomorrow")) -> int:
+    """
+    Заранее наполняет пулы для всех знаков — вызывается планировщиком.
+    Уже полные пулы пропускаются, поэтому для week и month GPT вызывается раз за период.
+    :return: число собранных пулов
+    """
+    built = 0
+    for day in days:
+        for sign in (zodiac_sign.en for zodiac_sign in ZODIAC):
+            for detailed in ((False,) if day in LONG_PERIODS else (False, True)):
+                if len(get_variants(sign, day, detailed)) >= variant_count(day):
+                    continue
+                try:
+                    if generate_variants(sign, day, detailed, count=variant_count(day)):
+                        built += 1
+                except Exception:
+                    logger.exception(f"Ошибка при подготовке пула {sign} ({day}, detailed={detailed})")
+    return built
+
+
+def generate_horoscope(sign: str, day: str = "today", detailed: bool = False, user_id: int = None) -> str:
+    """
+    Гороскоп из пула вариантов, без обращения к GPT.
+    Если пул ещё не собран, генерируется один вариант — он же становится пулом до плановой подготовки.
+    """
+    detailed = detailed and day not in LONG_PERIODS
+    variants = get_variants(sign, day, detailed)
+    if variants:
+        logger.info("Гороскоп для %s (%s, detailed=%s) взят из пула.", sign, day, detailed, extra={"sample": "pool_hit"})
+        return pick_variant(variants, user_id)
+
+    try:
+        variants = generate_variants(sign, day, detailed, count=1, deadline=request_deadline(detailed))
+        if not variants:
+            return _last_good_text(sign, day, detailed, "⚠️ Не удалось получить гороскоп. Попробуйте позже.")
+        return variants[0]
 
     except Exception as e:
         logger.exception("Ошибка при генерации гороскопа")
         return "⚠️ Не удалось сгенерировать гороскоп. Попробуйте позже."
+
+
+def stream_horoscope(sign: str, day: str = "today", detailed: bool = False, user_id: int = None):
+    """
+    Потоковый вариант generate_horoscope: из пула отдаёт готовый текст сразу,
+    иначе — нарастающий текст по мере ответа GPT.
+    Последнее отданное значение — финальный текст, он же становится пулом.
+    Ошибки отдаются текстом, как в generate_horoscope.
+    """
+    detailed = detailed and day not in LONG_PERIODS
+    variants = get_variants(sign, day, detailed)
+    if variants:
+        logger.info("Гороскоп для %s (%s, detailed=%s) взят из пула.", sign, day, detailed, extra={"sample": "pool_hit"})
+        yield pick_variant(variants, user_id)
+        return
+
+    try:
+        deadline = request_deadline(detailed)
+        context = _prepare_context(sign, day, deadline)
+        if isinstance(context, str):
+            yield _last_good_text(sign, day, detailed, context)
+            return
+        translated_text, moon_context, energy_context = context
+        intro = random.choice(START_INTROS)
+
+        # Бюджет ограничивает ожидание первого фрагмента; дальше текст уже виден пользователю
+        gpt_text = ""
+        timeout = stage_timeout(deadline, 30)
+        if timeout >= GPT_MIN_BUDGET:
+            try:
+                for gpt_text in stream_text_with_system(
+                    system_prompt=SYSTEM_PROMPT,
+                    user_prompt=_build_prompt(translated_text, moon_context, energy_context, random.choice(REPHRASE_TONES)),
+                    temperature=_temperature(),
+                    max_tokens=_max_tokens(day, detailed),
+                    timeout=timeout
+                ):
+                    yield f"{intro}\n\n{gpt_text.strip()}"
+            except IncompleteStream as e:
+                # Оборванный текст не показываем как готовый и не кладём в пул
+                logger.warning(f"Поток GPT для {sign} оборвался ({e}). Используем перевод.")
+                gpt_text = ""
+
+        if gpt_text.strip():
+            final_text = f"{intro}\n\n{gpt_text.strip()}"
+        else:
+            logger.warning("GPT недоступен. Используем перевод.")
+            final_text = f"{intro}\n\n{translated_text.strip()}"
+
+        _store_variants(sign, day, detailed, [final_text])
+        logger.info(f"Гороскоп для {sign} ({day}, detailed={detailed}) сгенерирован потоково и сохранён в пул.")
+        yield final_text
+
+    except Exception:
+        logger.exception("Ошибка при потоковой генерации гороскопа")
+        yield "⚠️ Не удалось сгенерировать гороскоп. Попробуйте позже."
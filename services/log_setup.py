@@ -0,0 +1,137 @@
+"""
+Логирование без ввода-вывода в обработчиках: записи кладутся в очередь,
+в поток вывода их пишет фоновый QueueListener.
+
+    LOG_LEVEL=INFO             # уровень корневого логгера
+    LOG_FORMAT=text|json       # json — одна запись на строку, для сборщиков логов
+    LOG_SAMPLE_INTERVAL=10     # сек: частые записи с extra={"sample": ключ} — не чаще раза в интервал
+
+Форматирование откладывается до фонового потока: в вызывающем коде записи передаются
+%-стилем — logger.info("Отправлен chat_id=%s", chat_id) — и строка собирается уже в писателе.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+import threading
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+SAMPLE_INTERVAL = float(os.getenv("LOG_SAMPLE_INTERVAL", "10"))
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+_listener = None
+
+
+class SampleFilter(logging.Filter):
+    """
+    Пропускает записи с атрибутом sample (extra={"sample": ключ}) не чаще раза в interval секунд на ключ.
+    К пропущенной записи дописывается, сколько таких же записей было отброшено с прошлой.
+    Записи без ключа и уровня WARNING и выше проходят всегда.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self._windows = {}  # ключ → (время последней пропущенной, отброшено с тех пор)
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "sample", None)
+        if key is None or record.levelno >= logging.WARNING or self.interval <= 0:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            last, dropped = self._windows.get(key, (0.0, 0))
+            if now - last < self.interval:
+                self._windows[key] = (last, dropped + 1)
+                return False
+            self._windows[key] = (now, 0)
+
+        if dropped and not isinstance(record.args, dict):
+            record.msg = f"{record.msg} (+%d похожих за {self.interval:g} с)"
+            record.args = (*(record.args or ()), dropped)
+        record.sampled = dropped
+        return True
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler без форматирования в вызывающем потоке: очередь живёт в этом же процессе,
+    поэтому запись можно передать как есть, а строку соберёт писатель
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись одной JSON-строкой: время, уровень, логгер, сообщение и поля из extra"""
+
+    _STANDARD = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def __init__(self, static: dict = None):
+        super().__init__()
+        self.static = static or {}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **self.static,
+        }
+        for name, value in vars(record).items():
+            if name not in self._STANDARD and not name.startswith("_"):
+                entry[name] = value if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, stream=None):
+    """
+    Настраивает корневой логгер: очередь → фоновый писатель в stream (по умолчанию stderr).
+    Повторный вызов ничего не делает. Очередь дописывается при выходе из процесса.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if fmt == "json":
+        worker = os.getenv("WORKER_ID")
+        output.setFormatter(JsonFormatter({"worker": worker} if worker is not None else None))
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    records = queue.SimpleQueue()
+    handler = _DeferredQueueHandler(records)
+    handler.addFilter(SampleFilter())
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Дописывает очередь и останавливает писателя"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -3,6 +3,8 @@ import logging
 from datetime import datetime
 import pytz
 
+from services.reference import sign_by_constellation
+
 logger = logging.getLogger(__name__)
 
 def get_lunar_text() -> str:
@@ -51,21 +53,7 @@ def get_lunar_text() -> str:
         
         # Вычисляем знак зодиака
         moon_sign = ephem.constellation(moon)[1]
-        zodiac_map = {
-            'Aries': '♈️ Овен',
-            'Taurus': '♉️ Телец',
-            'Gemini': '♊️ Близнецы',
-            'Cancer': '♋️ Рак',
-            'Leo': '♌️ Лев',
-            'Virgo': '♍️ Дева',
-            'Libra': '♎️ Весы',
-            'Scorpius': '♏️ Скорпион',
-            'Sagittarius': '♐️ Стрелец',
-            'Capricornus': '♑️ Козерог',
-            'Aquarius': '♒️ Водолей',
-            'Pisces': '♓️ Рыбы'
-        }
-        moon_zodiac = zodiac_map.get(moon_sign, moon_sign)
+        moon_zodiac = sign_by_constellation(moon_sign)
         
         # Текущее время МСК
         moscow_time = datetime.now(pytz.timezone('Europe/Moscow')).strftime("%d.%m.%Y %H:%M")
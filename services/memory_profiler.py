@@ -0,0 +1,200 @@
+"""
+Профилирование памяти процесса бота: tracemalloc со снимками и их сравнением,
+размеры известных кэшей и периодический сэмплер роста.
+
+Включается командой /memory start (handlers/admin.py) или переменной MEMORY_PROFILE_INTERVAL:
+тогда tracemalloc стартует при запуске, а планировщик раз в интервал логирует модули,
+прибавившие больше всего памяти с прошлого замера.
+Пока tracemalloc включён, выделения памяти заметно дороже — на проде включать на время разбора.
+"""
+
+import os
+import sys
+import logging
+import tracemalloc
+from collections import Counter
+from collections.abc import Mapping
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = int(os.getenv("MEMORY_PROFILE_INTERVAL", "0"))  # сек, 0 — сэмплер выключен
+TRACE_FRAMES = 1   # глубина стека: для группировки по модулям достаточно места выделения
+TOP_LIMIT = 10
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_STDLIB = os.path.dirname(os.__file__)
+
+# Известные структуры: (название, модуль, атрибут). Модули не импортируются ради отчёта —
+# если модуль ещё не загружен, его кэш и не занимает память
+KNOWN_STRUCTURES = [
+    ("пулы гороскопов (день)", "services.generate_horoscope", "daily_cache"),
+    ("пулы гороскопов (неделя)", "services.generate_horoscope", "weekly_cache"),
+    ("тексты horoscope.com", "services.generate_horoscope", "site_cache"),
+    ("переводы", "services.yandex_translate", "translation_cache"),
+    ("карта дня", "services.tarot", "card_of_the_day_cache"),
+    ("справочники (Таро, совместимость)", "services.reference", "_datasets"),
+    ("file_id карт", "services.card_media", "_file_ids"),
+    ("таблица совместимости", "handlers.compatibility", "COMPATIBILITY_TABLE"),
+    ("секции дайджеста", "services.digest", "render_cache"),
+    ("сигнатуры транзитов", "services.natal", "day_signatures"),
+    ("update_id (дедупликация)", "services.shared_state", "_seen_updates"),
+    ("circuit breakers", "services.circuit_breaker", "BREAKERS"),
+]
+
+_baseline = None  # снимок /memory snapshot
+_previous = None  # прошлый снимок сэмплера
+
+
+# === 🔬 tracemalloc ===
+def start(frames: int = TRACE_FRAMES) -> bool:
+    """:return: False, если трассировка уже шла"""
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start(frames)
+    logger.info("🔬 tracemalloc включён")
+    return True
+
+
+def stop():
+    global _baseline, _previous
+    tracemalloc.stop()
+    _baseline = _previous = None
+    logger.info("🔬 tracemalloc выключен")
+
+
+def is_tracing() -> bool:
+    return tracemalloc.is_tracing()
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ))
+
+
+def module_of(filename: str) -> str:
+    """Имя модуля для группировки: модули бота целиком, сторонние пакеты и stdlib — по верхнему уровню"""
+    path = os.path.abspath(filename)
+    if "site-packages" in path:
+        return path.split("site-packages" + os.sep, 1)[1].split(os.sep, 1)[0].removesuffix(".py")
+    if path.startswith(ROOT + os.sep):
+        return os.path.relpath(path, ROOT).removesuffix(".py").replace(os.sep, ".")
+    if path.startswith(_STDLIB + os.sep):
+        return "stdlib:" + os.path.relpath(path, _STDLIB).split(os.sep, 1)[0].removesuffix(".py")
+    return filename
+
+
+def _by_module(stats) -> Counter:
+    sizes = Counter()
+    for stat in stats:
+        sizes[module_of(stat.traceback[0].filename)] += getattr(stat, "size_diff", stat.size)
+    return sizes
+
+
+def take_snapshot() -> dict:
+    """
+    Запоминает базовый снимок для diff(). :return: текущие выделения по модулям, байты
+    """
+    global _baseline
+    _baseline = _snapshot()
+    return dict(_by_module(_baseline.statistics("filename")).most_common(TOP_LIMIT))
+
+
+def diff(limit: int = TOP_LIMIT) -> list[tuple[str, int]]:
+    """
+    Рост памяти по модулям с момента take_snapshot(). Базовый снимок не сдвигается,
+    так что повторные вызовы показывают накопленный рост.
+    :return: [(модуль, прирост в байтах), ...] по убыванию роста
+    """
+    if _baseline is None:
+        raise RuntimeError("нет базового снимка")
+    current = _snapshot()
+    growth = _by_module(current.compare_to(_baseline, "filename"))
+    return [(module, size) for module, size in growth.most_common(limit) if size]
+
+
+def traced_memory() -> tuple[int, int]:
+    """:return: (текущий, пиковый) объём отслеживаемой памяти, байты"""
+    return tracemalloc.get_traced_memory()
+
+
+# === 📦 Кэши и структуры ===
+def deep_size(obj, depth: int = 4, seen: set = None) -> int:
+    """Приблизительный размер объекта с содержимым контейнеров до глубины depth"""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if depth <= 0:
+        return size
+
+    try:
+        if isinstance(obj, Mapping):
+            items = list(obj.items())
+            children = [part for item in items for part in item]
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            children = list(obj)
+        elif hasattr(obj, "__slots__"):
+            children = [getattr(obj, name) for name in obj.__slots__ if hasattr(obj, name)]
+        elif hasattr(obj, "__dict__"):
+            children = [obj.__dict__]
+        else:
+            return size
+    except RuntimeError:
+        return size  # контейнер меняется в другом потоке — берём только оболочку
+    return size + sum(deep_size(child, depth - 1, seen) for child in children)
+
+
+def _entries(obj):
+    return len(obj) if hasattr(obj, "__len__") else None
+
+
+def structure_sizes(application=None) -> list[tuple[str, int, int]]:
+    """
+    :param application: Telegram Application — для user_data/chat_data/bot_data PTB
+    :return: [(название, число записей, приблизительный размер в байтах), ...] по убыванию размера
+    """
+    structures = []
+    for label, module_name, attr in KNOWN_STRUCTURES:
+        module = sys.modules.get(module_name)
+        obj = getattr(module, attr, None) if module else None
+        if obj is None:
+            continue
+        obj = getattr(obj, "local", obj)  # SharedCache — локальная копия в этом процессе
+        structures.append((label, _entries(obj), deep_size(obj)))
+
+    if application is not None:
+        for attr in ("user_data", "chat_data", "bot_data"):
+            obj = getattr(application, attr, None)
+            if obj is not None:
+                structures.append((f"PTB {attr}", _entries(obj), deep_size(obj)))
+
+    return sorted(structures, key=lambda item: item[2], reverse=True)
+
+
+# === ⏱ Сэмплер ===
+def sample_growth(limit: int = 5) -> list[tuple[str, int]]:
+    """
+    Снимок и сравнение с прошлым снимком сэмплера; топ источников роста пишется в лог.
+    Вызывается планировщиком раз в SAMPLE_INTERVAL.
+    """
+    global _previous
+    if not tracemalloc.is_tracing():
+        return []
+    current = _snapshot()
+    previous, _previous = _previous, current
+    if previous is None:
+        return []
+
+    growth = [
+        (module, size)
+        for module, size in _by_module(current.compare_to(previous, "filename")).most_common(limit)
+        if size > 0
+    ]
+    traced, peak = traced_memory()
+    summary = ", ".join(f"{module} +{size / 1024:.0f} KB" for module, size in growth) or "роста нет"
+    logger.info(f"🔬 Память: {traced / 2 ** 20:.1f} MB (пик {peak / 2 ** 20:.1f} MB); рост: {summary}")
+    return growth
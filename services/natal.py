@@ -0,0 +1,382 @@
+"""
+Натальная карта подписчика и его личные транзиты на день.
+
+Карта считается один раз, когда пользователь вводит дату рождения (/natal, handlers/natal.py):
+эклиптические долготы семи планет через ephem, округлённые до градуса, хранятся в natal_charts.
+
+Транзиты на день считает одна пакетная задача (scheduler.natal_transits_job). Положения планет
+на дату вычисляются один раз, из них строится таблица аспектов на каждый градус круга — и проверка
+карты сводится к выборке по индексам, без тригонометрии на пользователя. Совпадающие карты
+проверяются один раз, а подписчики с одинаковой сигнатурой (самые точные аспекты дня к Солнцу
+и Луне карты) образуют группу с одним общим текстом: шаблон или GPT вызываются раз на группу,
+а не на человека.
+
+    NATAL_GPT_GROUPS=0   # сколько крупнейших групп дня переписывать через GPT; 0 — только шаблон
+"""
+
+import os
+import re
+import html
+import math
+import logging
+from array import array
+from collections import defaultdict
+from datetime import date, datetime, time
+from functools import lru_cache
+from typing import NamedTuple
+
+import ephem
+import pytz
+from cachetools import TTLCache
+
+from services.database import (
+    get_natal_chart, get_natal_charts,
+    get_natal_transits, save_natal_transits, get_natal_text, save_natal_texts
+)
+from services.delivery import DEFAULT_TIMEZONE, parse_timezone
+from services.reference import ZODIAC
+
+logger = logging.getLogger(__name__)
+
+NATAL_GPT_GROUPS = int(os.getenv("NATAL_GPT_GROUPS", "0"))
+MAX_ASPECTS = 2       # аспектов в сигнатуре: больше — мельче группы и больше текстов
+KEEP_DAYS = 2         # за сколько дней хранить транзиты и тексты групп
+NOON = time(12, 0)    # время рождения, если оно не указано
+
+SYSTEM_PROMPT = (
+    "Ты — астролог. Тебе дают список транзитов к натальной карте на день с короткими толкованиями. "
+    "Перепиши их в связный личный прогноз на 4–6 предложений, на «вы», без списков и без упоминания "
+    "градусов. Не добавляй транзитов, которых нет в списке."
+)
+
+
+# === 🪐 Планеты и аспекты ===
+class Planet(NamedTuple):
+    key: str
+    body: type
+    symbol: str
+    title: str
+    theme: str  # сфера жизни в толковании транзита
+
+
+PLANETS = (
+    Planet("sun", ephem.Sun, "☉", "Солнце", "самовыражение"),
+    Planet("moon", ephem.Moon, "☽", "Луна", "эмоции"),
+    Planet("mercury", ephem.Mercury, "☿", "Меркурий", "общение"),
+    Planet("venus", ephem.Venus, "♀", "Венера", "отношения"),
+    Planet("mars", ephem.Mars, "♂", "Марс", "действия"),
+    Planet("jupiter", ephem.Jupiter, "♃", "Юпитер", "рост"),
+    Planet("saturn", ephem.Saturn, "♄", "Сатурн", "ответственность"),
+)
+MOON = 1  # индекс Луны: без времени рождения её натальное положение неточно на ±6°
+# Транзиты проверяются к Солнцу и Луне карты: так сигнатур не больше 1 + 70 + C(70, 2) = 2486,
+# сколько бы ни было подписчиков, а у групп — общий текст
+NATAL_POINTS = (0, MOON)
+
+
+class Aspect(NamedTuple):
+    angle: int
+    name: str
+    symbol: str
+    orb: float  # допустимое отклонение от точного угла, градусы
+    advice: str
+
+
+# Орбы не перекрываются: градус круга попадает не больше чем в один аспект
+ASPECTS = (
+    Aspect(0, "соединение", "☌", 3, "Сфера «{t}» сливается со сферой «{n}» вашей карты: хороший момент действовать здесь осознанно."),
+    Aspect(60, "секстиль", "⚹", 2, "Сфера «{t}» открывает окно возможностей в сфере «{n}» вашей карты — проявите инициативу."),
+    Aspect(90, "квадрат", "□", 3, "Сферы «{t}» и «{n}» вашей карты в напряжении: не торопитесь с решениями, ищите компромисс."),
+    Aspect(120, "трин", "△", 3, "Сфера «{t}» гармонично поддерживает сферу «{n}» вашей карты — используйте этот фон."),
+    Aspect(180, "оппозиция", "☍", 3, "Сферы «{t}» и «{n}» вашей карты тянут в разные стороны — важно сохранить баланс."),
+)
+
+QUIET_TEXT = "Точных транзитов к вашей карте сегодня нет — спокойный день, чтобы заняться текущими делами."
+
+# Город рождения → часовой пояс. Геокодера нет: других мест — IANA-имя или смещение, как в /timezone
+CITIES = {
+    "москва": "Europe/Moscow",
+    "санкт-петербург": "Europe/Moscow",
+    "петербург": "Europe/Moscow",
+    "спб": "Europe/Moscow",
+    "нижний новгород": "Europe/Moscow",
+    "казань": "Europe/Moscow",
+    "ростов-на-дону": "Europe/Moscow",
+    "краснодар": "Europe/Moscow",
+    "воронеж": "Europe/Moscow",
+    "калининград": "Europe/Kaliningrad",
+    "самара": "Europe/Samara",
+    "волгоград": "Europe/Volgograd",
+    "екатеринбург": "Asia/Yekaterinburg",
+    "челябинск": "Asia/Yekaterinburg",
+    "уфа": "Asia/Yekaterinburg",
+    "пермь": "Asia/Yekaterinburg",
+    "омск": "Asia/Omsk",
+    "новосибирск": "Asia/Novosibirsk",
+    "красноярск": "Asia/Krasnoyarsk",
+    "иркутск": "Asia/Irkutsk",
+    "хабаровск": "Asia/Vladivostok",
+    "владивосток": "Asia/Vladivostok",
+    "минск": "Europe/Minsk",
+    "киев": "Europe/Kiev",
+    "алматы": "Asia/Almaty",
+    "ташкент": "Asia/Tashkent",
+    "тбилиси": "Asia/Tbilisi",
+    "ереван": "Asia/Yerevan",
+    "баку": "Asia/Baku",
+    "берлин": "Europe/Berlin",
+    "лондон": "Europe/London",
+    "нью-йорк": "America/New_York",
+}
+
+_DATE_RE = re.compile(r"^(\d{1,2})[./-](\d{1,2})[./-](\d{4})$")
+_TIME_RE = re.compile(r"^(\d{1,2})[:.](\d{2})$")
+
+# Сигнатуры подписчиков за день, прочитанные одним запросом: день → {chat_id: сигнатура}
+day_signatures = TTLCache(maxsize=4, ttl=3600)
+
+
+class NatalChart(NamedTuple):
+    birth_date: date
+    birth_time: time  # None — время рождения неизвестно
+    tz: str
+    place: str        # как ввёл пользователь, None — не указано
+    degrees: tuple    # долгота каждой планеты PLANETS, целые градусы 0–359
+
+    @property
+    def time_known(self) -> bool:
+        return self.birth_time is not None
+
+
+def pack_degrees(degrees) -> bytes:
+    return array("H", degrees).tobytes()
+
+
+def unpack_degrees(blob: bytes) -> tuple:
+    return tuple(array("H", blob))
+
+
+# === 🧮 Карта ===
+def parse_birth(text: str, default_tz: str = DEFAULT_TIMEZONE) -> tuple:
+    """
+    Разбирает «ДД.ММ.ГГГГ [ЧЧ:ММ] [место]». Место — город из CITIES, IANA-имя или смещение (+3).
+    :return: (дата, время или None, часовой пояс, место или None)
+    :raises ValueError: с текстом для пользователя
+    """
+    parts = text.split()
+    match = _DATE_RE.match(parts[0]) if parts else None
+    if not match:
+        raise ValueError("Дата рождения — в формате ДД.ММ.ГГГГ, например 15.04.1990")
+    day, month, year = map(int, match.groups())
+    try:
+        birth_date = date(year, month, day)
+    except ValueError:
+        raise ValueError("Такой даты нет в календаре") from None
+    if birth_date.year < 1900 or birth_date > date.today():
+        raise ValueError("Дата рождения должна быть между 1900 годом и сегодняшним днём")
+
+    rest = parts[1:]
+    birth_time = None
+    if rest and (match := _TIME_RE.match(rest[0])):
+        try:
+            birth_time = time(*map(int, match.groups()))
+        except ValueError:
+            raise ValueError("Время рождения — в формате ЧЧ:ММ, например 14:30") from None
+        rest = rest[1:]
+
+    place = " ".join(rest) or None
+    tz = default_tz
+    if place:
+        tz = CITIES.get(place.lower().replace("ё", "е")) or parse_timezone(place)
+        if tz is None:
+            raise ValueError(
+                f"Не знаю место «{place}». Укажите крупный город или часовой пояс: Europe/Berlin, +5"
+            )
+    return birth_date, birth_time, tz, place
+
+
+def _longitudes(when: ephem.Date) -> tuple[float, ...]:
+    """Геоцентрические эклиптические долготы PLANETS на момент when (равноденствие даты), градусы"""
+    longitudes = []
+    for planet in PLANETS:
+        body = planet.body()
+        body.compute(when)
+        longitudes.append(math.degrees(ephem.Ecliptic(body, epoch=when).lon) % 360)
+    return tuple(longitudes)
+
+
+def compute_chart(birth_date: date, birth_time: time, tz: str) -> tuple[int, ...]:
+    """:return: натальные долготы планет, целые градусы — в таком виде карта хранится и проверяется"""
+    local = pytz.timezone(tz).localize(datetime.combine(birth_date, birth_time or NOON))
+    when = ephem.Date(local.astimezone(pytz.utc).replace(tzinfo=None))
+    return tuple(int(longitude) % 360 for longitude in _longitudes(when))
+
+
+def load_chart(chat_id: int):
+    """:return: NatalChart или None"""
+    row = get_natal_chart(chat_id)
+    if row is None:
+        return None
+    birth_date, birth_time, tz, place, chart = row
+    return NatalChart(
+        date.fromisoformat(birth_date),
+        time.fromisoformat(birth_time) if birth_time else None,
+        tz, place, unpack_degrees(chart)
+    )
+
+
+def position_label(degree: int) -> str:
+    """28 → "♈️ Овен 28°" """
+    return f"{ZODIAC[degree // 30].label} {degree % 30}°"
+
+
+# === 🔭 Транзиты ===
+@lru_cache(maxsize=4)
+def transit_positions(day: date) -> tuple[float, ...]:
+    """Долготы планет на полдень UTC дня — считаются один раз на дату"""
+    return _longitudes(ephem.Date(datetime.combine(day, NOON)))
+
+
+@lru_cache(maxsize=4)
+def aspect_tables(day: date) -> tuple:
+    """
+    Для каждой транзитной планеты — 360 ячеек: что она образует с натальной точкой в этом градусе.
+    Ячейка — (отклонение от точного аспекта, индекс в ASPECTS) или None
+    """
+    tables = []
+    for longitude in transit_positions(day):
+        table = []
+        for degree in range(360):
+            distance = abs(longitude - (degree + 0.5)) % 360  # натальный градус — середина ячейки
+            distance = min(distance, 360 - distance)
+            cell = None
+            for index, aspect in enumerate(ASPECTS):
+                deviation = abs(distance - aspect.angle)
+                if deviation <= aspect.orb:
+                    cell = (round(deviation, 1), index)
+                    break
+            table.append(cell)
+        tables.append(tuple(table))
+    return tuple(tables)
+
+
+def transit_signature(degrees, time_known: bool, tables: tuple) -> str:
+    """
+    Самые точные аспекты транзитов к NATAL_POINTS карты: "230,410" — по цифре на транзитную планету,
+    аспект и натальную планету. Пустая строка — точных аспектов нет.
+    """
+    hits = []
+    for natal in NATAL_POINTS:
+        if natal == MOON and not time_known:
+            continue
+        for transit, table in enumerate(tables):
+            cell = table[degrees[natal]]
+            if cell is not None:
+                hits.append((cell[0], transit, cell[1], natal))
+    hits.sort()
+    # Порядок внутри сигнатуры не зависит от точности: одинаковые наборы аспектов — одна группа
+    return ",".join(f"{transit}{aspect}{natal}" for _, transit, aspect, natal in sorted(
+        hits[:MAX_ASPECTS], key=lambda hit: hit[1:]
+    ))
+
+
+def _decode(signature: str) -> list[tuple[Planet, Aspect, Planet]]:
+    return [(PLANETS[int(code[0])], ASPECTS[int(code[1])], PLANETS[int(code[2])]) for code in signature.split(",")]
+
+
+def render_transits(signature: str, use_gpt: bool = False) -> str:
+    """Текст группы (HTML): заголовки аспектов и толкования по шаблону или пересказ GPT"""
+    if not signature:
+        return QUIET_TEXT
+
+    transits = _decode(signature)
+    headers = [
+        f"<b>{transit.symbol} {transit.title} {aspect.symbol} {natal.symbol} {natal.title}</b> — {aspect.name}"
+        for transit, aspect, natal in transits
+    ]
+    advices = [aspect.advice.format(t=transit.theme, n=natal.theme) for transit, aspect, natal in transits]
+
+    if use_gpt:
+        from services.yandex_gpt import generate_text_with_system
+
+        prompt = "\n".join(
+            f"Транзитная планета {transit.title}, {aspect.name} с натальной планетой {natal.title}: {advice}"
+            for (transit, aspect, natal), advice in zip(transits, advices)
+        )
+        response = generate_text_with_system(SYSTEM_PROMPT, prompt, max_tokens=500)
+        if response:
+            return "\n".join(headers) + "\n\n" + html.escape(response.strip())
+        logger.warning(f"GPT недоступен, транзиты {signature} — по шаблону")
+
+    return "\n\n".join(f"{header}\n{advice}" for header, advice in zip(headers, advices))
+
+
+def compute_day(day: date) -> int:
+    """
+    Пакетный расчёт транзитов всех сохранённых карт на день: сигнатуры подписчиков и тексты групп,
+    которых ещё нет. Повторный запуск за тот же день обновляет сигнатуры и не трогает готовые тексты.
+    :return: число групп
+    """
+    tables = aspect_tables(day)
+    charts = defaultdict(list)  # (карта, известно ли время) → chat_id: одинаковые карты считаются раз
+    for chat_id, chart, time_known in get_natal_charts():
+        charts[(chart, bool(time_known))].append(chat_id)
+
+    groups = defaultdict(list)  # сигнатура → chat_id
+    for (chart, time_known), chat_ids in charts.items():
+        groups[transit_signature(unpack_degrees(chart), time_known, tables)].extend(chat_ids)
+
+    day_key = day.isoformat()
+    save_natal_transits(day_key, [(chat_id, signature) for signature, chat_ids in groups.items() for chat_id in chat_ids])
+    day_signatures.pop(day_key, None)
+
+    # Крупные группы первыми: GPT (если включён) достаётся тем, где текст прочитает больше людей
+    texts = {}
+    for rank, signature in enumerate(sorted(groups, key=lambda s: len(groups[s]), reverse=True)):
+        if get_natal_text(day_key, signature) is None:
+            texts[signature] = render_transits(signature, use_gpt=rank < NATAL_GPT_GROUPS)
+    save_natal_texts(day_key, texts)
+
+    users = sum(len(chat_ids) for chat_ids in groups.values())
+    logger.info(
+        f"🪐 Транзиты на {day_key}: {users} подписчиков, {len(charts)} различных карт, "
+        f"{len(groups)} групп, новых текстов {len(texts)}"
+    )
+    return len(groups)
+
+
+def day_signature(chat_id: int, day: date):
+    """
+    Сигнатура подписчика на день: из пакетного расчёта, а для карт, добавленных после него, —
+    расчётом на месте. :return: сигнатура или None, если карты нет
+    """
+    day_key = day.isoformat()
+    signatures = day_signatures.get(day_key)
+    if signatures is None:
+        signatures = day_signatures[day_key] = get_natal_transits(day_key)
+
+    signature = signatures.get(chat_id)
+    if signature is None:
+        chart = load_chart(chat_id)
+        if chart is None:
+            return None
+        signature = transit_signature(chart.degrees, chart.time_known, aspect_tables(day))
+        save_natal_transits(day_key, [(chat_id, signature)])
+        signatures[chat_id] = signature
+    return signature
+
+
+def group_text(signature: str, day: date) -> str:
+    """Текст группы за день; если пакетный расчёт его не подготовил — собирается по шаблону"""
+    day_key = day.isoformat()
+    text = get_natal_text(day_key, signature)
+    if text is None:
+        text = render_transits(signature)
+        save_natal_texts(day_key, {signature: text})
+    return text
+
+
+def forget_chat(chat_id: int):
+    """Карта изменена или удалена: сигнатуры этого процесса по ней больше не годятся"""
+    for signatures in list(day_signatures.values()):
+        signatures.pop(chat_id, None)
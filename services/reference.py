@@ -0,0 +1,231 @@
+"""
+Справочные данные бота: знаки зодиака, колода Таро, таблица совместимости.
+
+Каждый набор загружается один раз на процесс: знаки — константы модуля, колода и совместимость
+читаются при первом обращении из активного бандла (services.data_bundle) или из data/*.json.
+Записи — кортежи (NamedTuple), повторяющиеся строки интернированы, так что все модули делят
+одни и те же объекты.
+
+Новая версия бандла подменяет набор целиком одним присваиванием: кто уже взял колоду
+через get_deck(), дорабатывает со старой. Модули с производными кэшами подписываются
+через on_change() и получают старые и новые записи изменившегося набора.
+"""
+
+import sys
+import logging
+import threading
+from collections import defaultdict
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+# === ♈️ Знаки зодиака ===
+class Sign(NamedTuple):
+    index: int          # порядок знака; он же индекс в callback_data
+    ru: str             # "овен" — ключ в базе, подписках и compatibility.json
+    en: str             # "aries" — ключ пулов гороскопов
+    title: str          # "Овен" — для кнопок и заголовков
+    emoji: str
+    element: str
+    planet: str
+    constellation: str  # имя созвездия в ephem.constellation()
+
+    @property
+    def site_id(self) -> int:
+        """id знака на horoscope.com"""
+        return self.index + 1
+
+    @property
+    def label(self) -> str:
+        """"♈️ Овен" — как в лунном календаре"""
+        return f"{self.emoji} {self.title}"
+
+
+_SIGN_ROWS = (
+    ("овен",     "aries",       "♈️", "🔥 Огонь",  "♂️ Марс",     "Aries"),
+    ("телец",    "taurus",      "♉️", "🌍 Земля",  "♀️ Венера",   "Taurus"),
+    ("близнецы", "gemini",      "♊️", "💨 Воздух", "☿ Меркурий",  "Gemini"),
+    ("рак",      "cancer",      "♋️", "💧 Вода",   "🌙 Луна",     "Cancer"),
+    ("лев",      "leo",         "♌️", "🔥 Огонь",  "☀️ Солнце",   "Leo"),
+    ("дева",     "virgo",       "♍️", "🌍 Земля",  "☿ Меркурий",  "Virgo"),
+    ("весы",     "libra",       "♎️", "💨 Воздух", "♀️ Венера",   "Libra"),
+    ("скорпион", "scorpio",     "♏️", "💧 Вода",   "♇ Плутон",    "Scorpius"),
+    ("стрелец",  "sagittarius", "♐️", "🔥 Огонь",  "♃ Юпитер",    "Sagittarius"),
+    ("козерог",  "capricorn",   "♑️", "🌍 Земля",  "♄ Сатурн",    "Capricornus"),
+    ("водолей",  "aquarius",    "♒️", "💨 Воздух", "⛢ Уран",      "Aquarius"),
+    ("рыбы",     "pisces",      "♓️", "💧 Вода",   "♆ Нептун",    "Pisces"),
+)
+
+ZODIAC = tuple(
+    Sign(i, *(sys.intern(value) for value in (ru, en, ru.capitalize(), emoji, element, planet, constellation)))
+    for i, (ru, en, emoji, element, planet, constellation) in enumerate(_SIGN_ROWS)
+)
+# Раскладка клавиатур выбора знака: 4 ряда по 3
+ZODIAC_ROWS = tuple(ZODIAC[i:i + 3] for i in range(0, len(ZODIAC), 3))
+
+# Все способы назвать знак → запись. Эмодзи принимаются и без селектора варианта (U+FE0F)
+_SIGN_LOOKUP = {}
+for _sign in ZODIAC:
+    for _key in (_sign.index, _sign.ru, _sign.en, _sign.emoji, _sign.emoji.rstrip("️"), _sign.constellation.lower()):
+        _SIGN_LOOKUP[_key] = _sign
+del _sign, _key
+
+
+def find_sign(key) -> Sign:
+    """
+    Знак по индексу, русскому или английскому имени (без учёта регистра), эмодзи или созвездию ephem.
+    :return: Sign или None
+    """
+    sign = _SIGN_LOOKUP.get(key)
+    if sign is None and isinstance(key, str):
+        sign = _SIGN_LOOKUP.get(key.strip().lower())
+    return sign
+
+
+def sign_by_constellation(name: str, default: str = None) -> str:
+    """Подпись знака для ответа ephem.constellation(): "Scorpius" → "♏️ Скорпион" """
+    sign = _SIGN_LOOKUP.get(name.lower())
+    return sign.label if sign else (default if default is not None else name)
+
+
+# === 🃏 Колода Таро ===
+class Card(NamedTuple):
+    """
+    Карта колоды. Пары индексируются битом положения:
+    0 — прямая, 1 — перевёрнутая.
+    """
+    id: int
+    name: str
+    image: str
+    titles: tuple[str, str]
+    meanings: tuple[str, str]
+    texts: tuple[str, str]  # готовый блок "название\nзначение"
+
+
+def _build_deck(compiled: tuple) -> tuple[Card, ...]:
+    """Индекс карты — её ID, поэтому новые карты добавляются только в конец"""
+    deck = []
+    for card_id, (name, image, meaning, reversed_meaning) in enumerate(compiled):
+        name = sys.intern(name)
+        titles = (name, name + " (перевёрнутая)")
+        meanings = (meaning, reversed_meaning)
+        texts = (f"{titles[0]}\n{meanings[0]}", f"{titles[1]}\n{meanings[1]}")
+        deck.append(Card(card_id, name, sys.intern(image), titles, meanings, texts))
+    return tuple(deck)
+
+
+# === ❤️ Совместимость ===
+class Compatibility(NamedTuple):
+    general: str
+    love: str
+    friendship: str
+    work: str
+    description: str
+
+
+def _build_compatibility(compiled: tuple) -> tuple:
+    """
+    Совместимость всех 144 пар, индекс пары: i * 12 + j; пары без данных — None.
+    Обе стороны пары получают один объект
+    """
+    records = {}
+    table = []
+    for pair in compiled:
+        if pair is not None and pair not in records:
+            # Проценты вида "75%" повторяются в сотнях пар
+            records[pair] = Compatibility(*map(sys.intern, pair))
+        table.append(records.get(pair))
+    return tuple(table)
+
+
+# === 🔄 Загрузка и подмена версий ===
+_BUILDERS = {"tarot": _build_deck, "compatibility": _build_compatibility}
+
+_datasets = dict.fromkeys(_BUILDERS)  # набор → записи; None — ещё не загружен
+_checksums = {}                       # набор → контрольная сумма загруженных данных
+_listeners = defaultdict(list)
+_lock = threading.Lock()
+loaded_version = None                 # версия бандла последней загрузки или подмены
+
+
+def _get(name: str) -> tuple:
+    records = _datasets[name]
+    if records is None:
+        records = _load(name)
+    return records
+
+
+def _load(name: str) -> tuple:
+    global loaded_version
+    from services.data_bundle import read_dataset
+
+    with _lock:
+        if _datasets[name] is None:
+            version, checksum, compiled = read_dataset(name)
+            _datasets[name] = _BUILDERS[name](compiled)
+            _checksums[name] = checksum
+            loaded_version = version
+        return _datasets[name]
+
+
+def get_deck() -> tuple[Card, ...]:
+    return _get("tarot")
+
+
+def get_compatibility(first: Sign, second: Sign) -> Compatibility:
+    """:return: Compatibility пары или None, если данных нет"""
+    return _get("compatibility")[first.index * len(ZODIAC) + second.index]
+
+
+def on_change(name: str, callback):
+    """
+    Подписка на подмену набора: callback(старые записи, новые записи).
+    Вызывается только если контрольная сумма набора изменилась.
+    """
+    _listeners[name].append(callback)
+
+
+def changed_indexes(old: tuple, new: tuple) -> list[int]:
+    """Индексы записей, которые появились или изменились в новой версии набора"""
+    return [i for i, record in enumerate(new) if i >= len(old) or old[i] != record]
+
+
+def loaded_sizes() -> dict:
+    """Набор → число записей для уже загруженных наборов"""
+    return {name: len(records) for name, records in _datasets.items() if records is not None}
+
+
+def loaded_checksums() -> dict:
+    return dict(_checksums)
+
+
+def apply_bundle(bundle) -> list[str]:
+    """
+    Подменяет наборы, чья контрольная сумма отличается от загруженной.
+    Ещё не загруженные наборы не трогаются: при первом обращении они прочитаются из активного бандла.
+    :param bundle: services.data_bundle.Bundle
+    :return: изменившиеся наборы
+    """
+    global loaded_version
+    changed = []
+    with _lock:
+        for name, compiled in bundle.datasets.items():
+            old = _datasets.get(name)
+            if name not in _BUILDERS or old is None or _checksums.get(name) == bundle.checksums[name]:
+                continue
+            new = _BUILDERS[name](compiled)
+            _datasets[name] = new  # одно присваивание: читатели видят либо старую, либо новую версию
+            _checksums[name] = bundle.checksums[name]
+            changed.append((name, old, new))
+        loaded_version = bundle.version
+
+    for name, old, new in changed:
+        for callback in _listeners[name]:
+            try:
+                callback(old, new)
+            except Exception:
+                logger.exception(f"Ошибка при сбросе кэшей набора {name}")
+    if changed:
+        logger.info(f"📦 Версия {bundle.version}: обновлены {', '.join(name for name, _, _ in changed)}")
+    return [name for name, _, _ in changed]
@@ -0,0 +1,224 @@
+"""
+Общее состояние воркеров при запуске в несколько процессов (WEB_CONCURRENCY > 1).
+
+Воркеры слушают один порт (SO_REUSEPORT) и делят между собой:
+- кэш ответов внешних сервисов (SharedCache: локальный TTLCache перед SQLite);
+- отметки обработанных update_id, чтобы повтор от Telegram не обработался дважды;
+- аренду лидера: плановые рассылки и очистки выполняет только один воркер.
+
+В обычном режиме (один процесс) всё это работает в памяти, без SQLite.
+"""
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+MULTI_WORKER = WORKERS > 1
+WORKER_ID = os.getenv("WORKER_ID", "0")
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+DB = "shared_state.db"
+LOCAL_TTL = 60        # сколько воркер доверяет своей копии общего значения, сек
+UPDATE_TTL = 3600     # сколько помнить update_id: Telegram повторяет доставку не дольше
+LEASE_TTL = 30        # аренда лидера без продления истекает через столько секунд
+PURGE_INTERVAL = 300  # как часто чистить просроченные записи
+
+_seen_updates = TTLCache(maxsize=10000, ttl=UPDATE_TTL)  # замена SQLite в режиме одного процесса
+_is_leader = not MULTI_WORKER
+_last_purge = 0.0
+
+
+def _connect():
+    conn = sqlite3.connect(os.path.join("data", DB), timeout=5, isolation_level=None)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def init():
+    """Создаёт таблицы общего состояния; вызывается один раз супервизором до запуска воркеров"""
+    os.makedirs("data", exist_ok=True)
+    with _connect() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")  # читатели не ждут писателя
+        conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS seen_updates (update_id INTEGER PRIMARY KEY, expires REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT, expires REAL)")
+
+
+def local_ttl(ttl: float) -> float:
+    """TTL локального кэша: в режиме воркеров копия живёт не дольше LOCAL_TTL"""
+    return min(ttl, LOCAL_TTL) if MULTI_WORKER else ttl
+
+
+def _purge(conn, now: float):
+    global _last_purge
+    if now - _last_purge < PURGE_INTERVAL:
+        return
+    _last_purge = now
+    conn.execute("DELETE FROM kv WHERE expires < ?", (now,))
+    conn.execute("DELETE FROM seen_updates WHERE expires < ?", (now,))
+
+
+# === 🗄 Общий кэш ===
+_MISSING = object()
+
+
+class SharedCache:
+    """
+    Замена TTLCache с тем же интерфейсом (get, [], in).
+    Один процесс — обычный TTLCache. Несколько воркеров — ещё и общая таблица kv:
+    промах в локальном кэше читается из SQLite, запись идёт в оба места.
+    Ключи и значения должны сериализоваться в JSON (кортежи возвращаются списками).
+    """
+
+    def __init__(self, namespace: str, maxsize: int, ttl: float):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=local_ttl(ttl))
+
+    def _key(self, key) -> str:
+        return f"{self.namespace}:{json.dumps(key, ensure_ascii=False)}"
+
+    def get(self, key, default=None):
+        try:
+            return self.local[key]
+        except KeyError:
+            pass
+        if not MULTI_WORKER:
+            return default
+        try:
+            with _connect() as conn:
+                row = conn.execute(
+                    "SELECT value FROM kv WHERE key = ? AND expires > ?", (self._key(key), time.time())
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Общий кэш недоступен: {e}")
+            return default
+        if row is None:
+            return default
+        value = json.loads(row[0])
+        self.local[key] = value
+        return value
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __setitem__(self, key, value):
+        self.local[key] = value
+        if not MULTI_WORKER:
+            return
+        now = time.time()
+        try:
+            with _connect() as conn:
+                conn.execute(
+                    "REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                    (self._key(key), json.dumps(value, ensure_ascii=False), now + self.ttl)
+                )
+                _purge(conn, now)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Запись в общий кэш не удалась: {e}")
+
+    def clear(self):
+        """Очищает только локальную копию"""
+        self.local.clear()
+
+
+# === 🔁 Дедупликация обновлений ===
+def claim_update(update_id: int) -> bool:
+    """
+    Отмечает update_id как взятый в работу.
+    :return: False, если это обновление уже обрабатывается или обработано (этим или другим воркером)
+    """
+    if update_id is None:
+        return True
+    if not MULTI_WORKER:
+        if update_id in _seen_updates:
+            return False
+        _seen_updates[update_id] = True
+        return True
+
+    now = time.time()
+    try:
+        with _connect() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO seen_updates (update_id, expires) VALUES (?, ?)",
+                (update_id, now + UPDATE_TTL)
+            )
+            _purge(conn, now)
+            return cursor.rowcount > 0
+    except sqlite3.Error as e:
+        # Лучше обработать дубль, чем потерять обновление
+        logger.warning(f"⚠️ Дедупликация недоступна: {e}")
+        return True
+
+
+def release_update(update_id: int):
+    """Снимает отметку, если обработка упала: повтор от Telegram должен пройти"""
+    if not MULTI_WORKER:
+        _seen_updates.pop(update_id, None)
+        return
+    try:
+        with _connect() as conn:
+            conn.execute("DELETE FROM seen_updates WHERE update_id = ?", (update_id,))
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ Не удалось снять отметку update_id={update_id}: {e}")
+
+
+# === 👑 Аренда лидера ===
+def acquire_lease(name: str = "scheduler", ttl: float = LEASE_TTL) -> bool:
+    """
+    Берёт или продлевает аренду: удаётся, если она свободна, просрочена или уже наша.
+    В режиме одного процесса воркер всегда лидер.
+    """
+    global _is_leader
+    if not MULTI_WORKER:
+        return True
+
+    now = time.time()
+    try:
+        with _connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT owner, expires FROM leases WHERE name = ?", (name,)).fetchone()
+            leader = row is None or row[0] == OWNER or row[1] < now
+            if leader:
+                conn.execute("REPLACE INTO leases (name, owner, expires) VALUES (?, ?, ?)", (name, OWNER, now + ttl))
+            conn.execute("COMMIT")
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ Аренда {name} не проверена: {e}")
+        leader = False
+
+    if leader != _is_leader:
+        logger.info(f"👑 Воркер {WORKER_ID} {'стал лидером' if leader else 'больше не лидер'}")
+    _is_leader = leader
+    return leader
+
+
+def is_leader() -> bool:
+    """Результат последней попытки взять аренду, без обращения к базе"""
+    return _is_leader
+
+
+def release_lease(name: str = "scheduler"):
+    """Отдаёт аренду при остановке, чтобы другой воркер не ждал её истечения"""
+    global _is_leader
+    if not MULTI_WORKER or not _is_leader:
+        return
+    try:
+        with _connect() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, OWNER))
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ Аренда {name} не отпущена: {e}")
+    _is_leader = False
@@ -0,0 +1,100 @@
+import random
+from datetime import date
+
+from cachetools import TTLCache
+
+# Колода загружается один раз на процесс в services.reference
+from services.reference import Card, get_deck  # noqa: F401
+
+
+def __getattr__(name):
+    # services.tarot.DECK — ленивая загрузка колоды
+    if name == "DECK":
+        return get_deck()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Карта дня: (user_id, день) → (card_id, is_reversed)
+card_of_the_day_cache = TTLCache(maxsize=10000, ttl=86400)
+
+# Позиции раскладов
+POSITIONS_3 = ["Прошлое", "Настоящее", "Будущее"]
+
+POSITIONS_5 = [
+    "1. Суть ситуации",
+    "2. Что помогает / мешает",
+    "3. Глубинная мотивация",
+    "4. Опыт прошлого",
+    "5. Возможный исход"
+]
+
+# Тип расклада → (заголовок, позиции, финальная строка)
+SPREADS = {
+    "tarot": ("🃏 Карта дня", None, ""),
+    "tarot3": ("🃏 Расклад из трёх карт", POSITIONS_3, ""),
+    "tarot5": (
+        "🃏 Пятикарточный расклад Таро",
+        POSITIONS_5,
+        "💬 Подумайте, как каждая карта отражает вашу ситуацию. Ответ может быть внутри вас."
+    ),
+}
+
+
+def draw(count: int, rng=random) -> list[tuple[int, bool]]:
+    """
+    Вытягивает count разных карт одним random.sample.
+    :param rng: модуль random или random.Random для детерминированного выбора
+    :return: список пар (card_id, is_reversed)
+    """
+    ids = rng.sample(range(len(get_deck())), count)
+    bits = rng.getrandbits(count)
+    return [(card_id, bool(bits >> i & 1)) for i, card_id in enumerate(ids)]
+
+
+def card_of_the_day(user_id: int, day: date = None) -> tuple[int, bool]:
+    """Одна и та же карта для пользователя в течение дня"""
+    day = day or date.today()
+    key = (user_id, day.toordinal())
+    card = card_of_the_day_cache.get(key)
+    if card is None:
+        card = draw(1, random.Random(f"{user_id}:{day.isoformat()}"))[0]
+        card_of_the_day_cache[key] = card
+    return card
+
+
+def card_title(card_id: int, is_reversed: bool) -> str:
+    """Название карты с пометкой о перевёрнутом положении"""
+    return get_deck()[card_id].titles[is_reversed]
+
+
+def card_meaning(card_id: int, is_reversed: bool) -> str:
+    return get_deck()[card_id].meanings[is_reversed]
+
+
+def render_spread(spread_type: str, cards: list[tuple[int, bool]]) -> str:
+    """
+    Собирает текст расклада по ID карт и их положению.
+    :param spread_type: "tarot", "tarot3" или "tarot5"
+    :param cards: список пар (card_id, is_reversed)
+    """
+    title, positions, outro = SPREADS[spread_type]
+    deck = get_deck()
+
+    if positions is None:
+        card_id, is_reversed = cards[0]
+        return f"{title}\n\n{deck[card_id].texts[is_reversed]}"
+
+    body = "".join(
+        f"{position}\n→ {deck[card_id].texts[is_reversed]}\n\n"
+        for position, (card_id, is_reversed) in zip(positions, cards)
+    )
+    return f"{title}\n\n{body}{outro}"
+
+
+def encode_cards(cards: list[tuple[int, bool]]) -> bytes:
+    """Компактная запись расклада: один байт на карту, (ID << 1) | перевёрнута"""
+    return bytes((card_id << 1) | int(is_reversed) for card_id, is_reversed in cards)
+
+
+def decode_cards(blob: bytes) -> list[tuple[int, bool]]:
+    return [(b >> 1, bool(b & 1)) for b in blob]
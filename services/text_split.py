@@ -0,0 +1,138 @@
+"""
+Разбиение текста на сообщения Telegram до отправки.
+
+Лимиты Telegram считаются в UTF-16 code units видимого текста:
+HTML-теги не учитываются, сущность (&amp;) — как один символ.
+Разрез не попадает внутрь тега или сущности, открытые теги
+закрываются в конце куска и открываются заново в следующем.
+"""
+
+import re
+from html import unescape
+
+TEXT_LIMIT = 4096       # sendMessage / editMessageText
+CAPTION_LIMIT = 1024    # подпись к фото и медиагруппе
+
+_TOKEN_RE = re.compile(r"<[^<>]*>|&#?\w+;")
+_TAG_NAME_RE = re.compile(r"</?\s*([\w-]+)")
+
+# Приоритет мест разреза: абзац > строка > пробел
+_BREAKS = {"\n\n": 3, "\n": 2, " ": 1}
+
+
+def utf16_len(text: str) -> int:
+    """Длина в UTF-16 code units: эмодзи вне BMP занимают две"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _atoms(text: str, html: bool) -> list[str]:
+    """Неделимые части: символы, а в HTML-режиме ещё теги и сущности"""
+    if not html:
+        return list(text)
+    atoms = []
+    pos = 0
+    for match in _TOKEN_RE.finditer(text):
+        atoms.extend(text[pos:match.start()])
+        atoms.append(match.group())
+        pos = match.end()
+    atoms.extend(text[pos:])
+    return atoms
+
+
+def _is_tag(atom: str) -> bool:
+    return len(atom) > 1 and atom[0] == "<"
+
+
+def _weight(atom: str) -> int:
+    if len(atom) == 1:
+        return utf16_len(atom)
+    if atom[0] == "<":
+        return 0
+    return utf16_len(unescape(atom))
+
+
+def text_length(text: str, html: bool = False) -> int:
+    """Длина текста так, как её считает Telegram"""
+    if not html:
+        return utf16_len(text)
+    return sum(_weight(atom) for atom in _atoms(text, html))
+
+
+def _apply_tag(stack: list, tag: str):
+    match = _TAG_NAME_RE.match(tag)
+    if not match:
+        return
+    name = match.group(1).lower()
+    if tag.startswith("</"):
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i][0] == name:
+                del stack[i]
+                break
+    elif not tag.endswith("/>"):
+        stack.append((name, tag))
+
+
+def split_message(text: str, limit: int = TEXT_LIMIT, first_limit: int = None, html: bool = False) -> list[str]:
+    """
+    Делит текст на части, каждая из которых укладывается в лимит Telegram.
+    Режет по абзацам, затем по строкам, затем по пробелам; слово режется, только если не помещается целиком.
+    :param limit: лимит для каждой части, по умолчанию TEXT_LIMIT
+    :param first_limit: отдельный лимит первой части, например CAPTION_LIMIT для подписи к фото
+    :param html: текст с parse_mode="HTML"
+    :return: список частей (хотя бы одна)
+    """
+    # Быстрый путь: длина с тегами и сущностями не меньше видимой, так что текст точно помещается
+    if utf16_len(text) <= (first_limit or limit):
+        return [text]
+
+    atoms = _atoms(text, html)
+    parts = []
+    reopen = []  # [(имя, открывающий тег)] из предыдущей части
+    budget = first_limit or limit
+    start = 0
+
+    while start < len(atoms):
+        stack = list(reopen)
+        size = 0
+        best = {}  # приоритет → (конец, стек, размер)
+        end = start
+
+        while end < len(atoms):
+            atom = atoms[end]
+            weight = _weight(atom)
+            if size + weight > budget:
+                break
+            size += weight
+            if html and _is_tag(atom):
+                _apply_tag(stack, atom)
+            end += 1
+
+            if atom in (" ", "\n"):
+                priority = _BREAKS["\n\n"] if atom == "\n" and end - start > 1 and atoms[end - 2] == "\n" else _BREAKS[atom]
+                best[priority] = (end, list(stack), size)
+
+        if end < len(atoms):
+            # Лучшее место разреза из второй половины части, иначе любое найденное
+            candidates = sorted(best.items(), reverse=True)
+            cut = next((c for _, c in candidates if c[2] >= budget // 2), None)
+            if cut is None and candidates:
+                cut = candidates[0][1]
+            if cut is not None:
+                end, stack = cut[0], cut[1]
+            elif end == start:
+                end += 1  # Один атом больше лимита — отправляем как есть
+                if html and _is_tag(atoms[start]):
+                    _apply_tag(stack, atoms[start])
+
+        body = "".join(atoms[start:end]).strip()
+        # Часть из одних тегов и пробелов не отправляем: её открытые теги уходят в следующую через stack
+        if any(not _is_tag(atom) and not atom.isspace() for atom in atoms[start:end]):
+            opening = "".join(tag for _, tag in reopen)
+            closing = "".join(f"</{name}>" for name, _ in reversed(stack))
+            parts.append(opening + body + closing)
+            budget = limit
+
+        reopen = stack
+        start = end
+
+    return parts or [text]
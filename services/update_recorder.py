@@ -0,0 +1,135 @@
+"""
+Запись входящих обновлений для последующего воспроизведения (benchmarks/replay.py).
+
+Включается переменной WEBHOOK_RECORD_DIR (например, recordings). Каждый запуск пишет свой файл
+updates-<время>[-w<воркер>].jsonl.gz: строка — {"ts": unix-время, "update": {...}}.
+Обновления обезличиваются: ID пользователей и чатов заменяются псевдонимами
+(HMAC с солью, живущей только в памяти процесса), имена заменяются,
+произвольный текст заменяется заглушкой той же длины. Команды, тексты кнопок меню
+и callback_data сохраняются.
+"""
+
+import os
+import hmac
+import gzip
+import json
+import time
+import queue
+import random
+import hashlib
+import logging
+import secrets
+import threading
+from datetime import datetime
+
+from keyboards import REPLY_BUTTON_TEXTS
+
+logger = logging.getLogger(__name__)
+
+RECORD_DIR = os.getenv("WEBHOOK_RECORD_DIR")
+RECORD_SAMPLE = float(os.getenv("WEBHOOK_RECORD_SAMPLE", "1"))  # доля записываемых обновлений
+
+# Поля с персональными данными, которые не нужны для воспроизведения
+_DROP_KEYS = {
+    "last_name", "username", "title", "phone_number", "contact",
+    "location", "venue", "bio", "photo", "sticker",
+    "forward_sender_name", "forward_signature", "author_signature", "sender_user_name",
+}
+# Обязательные для Telegram-объектов поля заменяются нейтральным значением
+_REPLACE_KEYS = {"first_name": "User", "chat_instance": "0"}
+# Пользователь (is_bot) или чат (type) — где бы ни лежал: from, forward_from, via_bot,
+# new_chat_members, forward_origin.sender_user и т. д.
+_ID_MARKERS = ("is_bot", "type")
+_TEXT_KEYS = {"text", "caption", "query"}
+
+_salt = secrets.token_bytes(16)
+_queue = None
+_writer = None
+
+
+def _pseudonym(value: int) -> int:
+    digest = hmac.new(_salt, str(value).encode(), hashlib.sha256).digest()
+    return int.from_bytes(digest[:5], "big") + 1
+
+
+def _mask_text(text: str) -> str:
+    # Команды нужны для маршрутизации, аргументы команд — нет
+    if text.startswith("/"):
+        return text.split()[0]
+    # Кнопки меню — не личные данные, а без них запись не воспроизводит нагрузку на меню
+    if text.strip().lower() in REPLY_BUTTON_TEXTS:
+        return text
+    return "x" * len(text)
+
+
+def anonymize(data):
+    if isinstance(data, list):
+        return [anonymize(item) for item in data]
+    if not isinstance(data, dict):
+        return data
+
+    is_peer = any(marker in data for marker in _ID_MARKERS)
+    result = {}
+    for key, value in data.items():
+        if key in _DROP_KEYS:
+            continue
+        if key in _REPLACE_KEYS:
+            result[key] = _REPLACE_KEYS[key]
+            continue
+        if key == "id" and is_peer and isinstance(value, int):
+            result[key] = _pseudonym(value)
+        elif key in ("chat_id", "user_id") and isinstance(value, int):
+            result[key] = _pseudonym(value)
+        elif key in _TEXT_KEYS and isinstance(value, str):
+            result[key] = _mask_text(value)
+        elif key == "entities":
+            result[key] = [e for e in value if e.get("type") == "bot_command"]
+        else:
+            result[key] = anonymize(value)
+    return result
+
+
+def _write_loop(path: str, items: queue.SimpleQueue):
+    """Отдельный поток: сжатие и запись на диск не задерживают webhook"""
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        while True:
+            item = items.get()
+            if item is None:
+                break
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            if items.empty():
+                f.flush()
+
+
+def start():
+    global _queue, _writer
+    if not RECORD_DIR or _writer is not None:
+        return
+    os.makedirs(RECORD_DIR, exist_ok=True)
+    # Воркеры (WEB_CONCURRENCY > 1) пишут каждый в свой файл
+    worker = os.getenv("WORKER_ID")
+    suffix = f"-w{worker}" if worker else ""
+    path = os.path.join(RECORD_DIR, f"updates-{datetime.now():%Y%m%d-%H%M%S}{suffix}.jsonl.gz")
+    _queue = queue.SimpleQueue()
+    _writer = threading.Thread(target=_write_loop, args=(path, _queue), name="update-recorder", daemon=True)
+    _writer.start()
+    logger.info(f"📼 Запись обновлений: {path} (доля {RECORD_SAMPLE})")
+
+
+def record(data: dict):
+    """Ставит обновление в очередь записи; вызывается из webhook_handler"""
+    if _queue is None or (RECORD_SAMPLE < 1 and random.random() >= RECORD_SAMPLE):
+        return
+    try:
+        _queue.put({"ts": round(time.time(), 3), "update": anonymize(data)})
+    except Exception as e:
+        logger.warning(f"⚠️ Обновление не записано: {e}")
+
+
+def stop():
+    global _queue, _writer
+    if _writer is None:
+        return
+    _queue.put(None)
+    _writer.join(timeout=5)
+    _queue = _writer = None
@@ -2,9 +2,12 @@
 
 import csv
 import os
+import logging
 from datetime import datetime
 from collections import defaultdict
 
+logger = logging.getLogger(__name__)
+
 USER_FILE = "data/user_activity.csv"
 os.makedirs(os.path.dirname(USER_FILE), exist_ok=True)
 
@@ -31,7 +34,7 @@ def track_user(user_id: int, username: str = ""):
                 writer.writerow(["user_id", "username", "first_seen"])
             writer.writerow([user_id, username or "", today])
     except Exception as e:
-        print(f"❌ Ошибка записи пользователя: {e}")
+        logger.error(f"❌ Ошибка записи пользователя: {e}")
 
 def get_user_count() -> int:
     """Всего уникальных пользователей"""
@@ -57,5 +60,5 @@ def get_user_stats_by_day() -> dict:
                 stats[row["first_seen"]] += 1
         return dict(sorted(stats.items()))
     except Exception as e:
-        print(f"❌ Ошибка чтения статистики: {e}")
+        logger.error(f"❌ Ошибка чтения статистики: {e}")
         return {}
@@ -1,8 +1,11 @@
 import os
+import json
 import requests
 import logging
 from dotenv import load_dotenv
 
+from services.circuit_breaker import get_breaker
+
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
@@ -14,11 +17,38 @@ YANDEX_GPT_API_KEY = os.getenv("YANDEX_GPT_API_KEY")
 YANDEX_FOLDER_ID = os.getenv("YANDEX_FOLDER_ID")
 YANDEX_OAUTH_TOKEN = os.getenv("YANDEX_OAUTH_TOKEN")  # Для fallback на IAM-токен
 
+# Адреса API; переопределяются для локальных заглушек в бенчмарках
+YANDEX_GPT_URL = os.getenv("YANDEX_GPT_URL", "https://llm.api.cloud.yandex.net/foundationModels/v1/completion")
+YANDEX_IAM_URL = os.getenv("YANDEX_IAM_URL", "https://iam.api.cloud.yandex.net/iam/v1/tokens")
+
+# Перегрузка (429), биллинг (402), ошибки сервера и таймауты открывают breaker
+gpt_breaker = get_breaker("yandex_gpt")
+
+def _is_outage(status_code: int) -> bool:
+    return status_code in (402, 429) or status_code >= 500
+
+def _record_status(status_code: int):
+    """
+    Исход запроса с ошибочным статусом для breaker: сбой сервиса — отказ, остальное (400/401/403) —
+    сервис отвечает. Без отчёта пробный запрос half_open держал бы breaker закрытым для всех
+    """
+    if _is_outage(status_code):
+        gpt_breaker.record_failure()
+    else:
+        gpt_breaker.record_success()
+
+# Статусы последней строки потока, после которых ответ полон (TRUNCATED — упёрся в maxTokens)
+FINAL_STATUSES = ("ALTERNATIVE_STATUS_FINAL", "ALTERNATIVE_STATUS_TRUNCATED_FINAL")
+
+
+class IncompleteStream(Exception):
+    """Поток оборвался после начала ответа: отданный текст неполный"""
+
 def get_iam_token() -> str:
     """Получаем IAM-токен по OAuth-токену (действует ~1 час)"""
     if not YANDEX_OAUTH_TOKEN:
         raise ValueError("Отсутствует YANDEX_OAUTH_TOKEN в .env для IAM fallback.")
-    url = "https://iam.api.cloud.yandex.net/iam/v1/tokens"
+    url = YANDEX_IAM_URL
     payload = {"yandexPassportOauthToken": YANDEX_OAUTH_TOKEN}
     try:
         response = requests.post(url, json=payload, timeout=10)
@@ -65,9 +95,13 @@ def generate_text_yandex(prompt: str, temperature: float = 0.6, max_tokens: int
             "x-folder-id": YANDEX_FOLDER_ID
         }
 
+    if not gpt_breaker.allow():
+        logger.warning("YandexGPT недоступен (breaker открыт). Используем запасной ответ.")
+        return ""
+
     try:
         response = requests.post(
-            "https://llm.api.cloud.yandex.net/foundationModels/v1/completion",
+            YANDEX_GPT_URL,
             headers=headers,
             json={
                 "modelUri": f"gpt://{YANDEX_FOLDER_ID}/yandexgpt-lite",
@@ -85,9 +119,11 @@ def generate_text_yandex(prompt: str, temperature: float = 0.6, max_tokens: int
         
         if response.status_code == 200:
             result = response.json()
+            gpt_breaker.record_success()
             return result["result"]["alternatives"][0]["message"]["text"]
         else:
             logger.warning(f"Ошибка API: {response.status_code}. Ответ: {response.text}")
+            _record_status(response.status_code)
             if response.status_code == 401 and not use_iam and YANDEX_OAUTH_TOKEN:
                 logger.info("Пробуем IAM fallback для 401.")
                 return generate_text_yandex(prompt, temperature, max_tokens, use_iam=True)
@@ -98,12 +134,12 @@ def generate_text_yandex(prompt: str, temperature: float = 0.6, max_tokens: int
             return ""  # Пустая строка для fallback
             
     except Exception as e:
+        # Повтор через IAM не поможет при таймауте или обрыве сети — только удвоит ожидание
         logger.error(f"Ошибка при запросе к YandexGPT: {e}")
-        if not use_iam and YANDEX_OAUTH_TOKEN:
-            return generate_text_yandex(prompt, temperature, max_tokens, use_iam=True)
+        gpt_breaker.record_failure()
         return ""  # Пустая строка для fallback
 
-def generate_text_with_system(system_prompt: str, user_prompt: str, temperature: float = 0.6, max_tokens: int = 2000, use_iam: bool = False) -> str:
+def generate_text_with_system(system_prompt: str, user_prompt: str, temperature: float = 0.6, max_tokens: int = 2000, use_iam: bool = False, timeout: float = 30) -> str:
     """
     Генерирует текст с учетом системного промпта
     :param system_prompt: Системный промпт для установки роли
@@ -111,6 +147,7 @@ def generate_text_with_system(system_prompt: str, user_prompt: str, temperature:
     :param temperature: Температура генерации
     :param max_tokens: Максимальное количество токенов
     :param use_iam: Если True, используем IAM-токен вместо Api-Key
+    :param timeout: Таймаут запроса, сек
     :return: Сгенерированный текст или пустая строка при ошибке
     """
     if not YANDEX_FOLDER_ID:
@@ -131,7 +168,7 @@ def generate_text_with_system(system_prompt: str, user_prompt: str, temperature:
         if not YANDEX_GPT_API_KEY:
             if YANDEX_OAUTH_TOKEN:
                 logger.warning("Отсутствует YANDEX_GPT_API_KEY. Пробуем IAM fallback.")
-                return generate_text_with_system(system_prompt, user_prompt, temperature, max_tokens, use_iam=True)
+                return generate_text_with_system(system_prompt, user_prompt, temperature, max_tokens, use_iam=True, timeout=timeout)
             else:
                 logger.error("Отсутствует YANDEX_GPT_API_KEY и YANDEX_OAUTH_TOKEN.")
                 return ""
@@ -140,9 +177,13 @@ def generate_text_with_system(system_prompt: str, user_prompt: str, temperature:
             "x-folder-id": YANDEX_FOLDER_ID
         }
 
+    if not gpt_breaker.allow():
+        logger.warning("YandexGPT недоступен (breaker открыт). Используем запасной ответ.")
+        return ""
+
     try:
         response = requests.post(
-            "https://llm.api.cloud.yandex.net/foundationModels/v1/completion",
+            YANDEX_GPT_URL,
             headers=headers,
             json={
                 "modelUri": f"gpt://{YANDEX_FOLDER_ID}/yandexgpt-lite",
@@ -156,17 +197,19 @@ def generate_text_with_system(system_prompt: str, user_prompt: str, temperature:
                     {"role": "user", "text": user_prompt}
                 ]
             },
-            timeout=30
+            timeout=timeout
         )
         
         if response.status_code == 200:
             result = response.json()
+            gpt_breaker.record_success()
             return result["result"]["alternatives"][0]["message"]["text"]
         else:
             logger.warning(f"Ошибка API: {response.status_code}. Ответ: {response.text}")
+            _record_status(response.status_code)
             if response.status_code == 401 and not use_iam and YANDEX_OAUTH_TOKEN:
                 logger.info("Пробуем IAM fallback для 401.")
-                return generate_text_with_system(system_prompt, user_prompt, temperature, max_tokens, use_iam=True)
+                return generate_text_with_system(system_prompt, user_prompt, temperature, max_tokens, use_iam=True, timeout=timeout)
             elif response.status_code == 402:
                 logger.error("Ошибка 402: Payment Required. Активируйте биллинг.")
             elif response.status_code == 429:
@@ -174,7 +217,100 @@ def generate_text_with_system(system_prompt: str, user_prompt: str, temperature:
             return ""  # Пустая строка для fallback
             
     except Exception as e:
+        # Повтор через IAM не поможет при таймауте или обрыве сети — только удвоит ожидание
         logger.error(f"Ошибка при запросе к YandexGPT: {e}")
-        if not use_iam and YANDEX_OAUTH_TOKEN:
-            return generate_text_with_system(system_prompt, user_prompt, temperature, max_tokens, use_iam=True)
+        gpt_breaker.record_failure()
         return ""  # Пустая строка для fallback
+
+def stream_text_with_system(system_prompt: str, user_prompt: str, temperature: float = 0.6, max_tokens: int = 2000, use_iam: bool = False, timeout: float = 30):
+    """
+    Потоковая генерация с системным промптом ("stream": True).
+    YandexGPT присылает JSON-строки с накопленным текстом, генератор отдаёт их по мере получения.
+    :param system_prompt: Системный промпт для установки роли
+    :param user_prompt: Пользовательский запрос
+    :param temperature: Температура генерации
+    :param max_tokens: Максимальное количество токенов
+    :param use_iam: Если True, используем IAM-токен вместо Api-Key
+    :param timeout: Таймаут запроса, сек
+    :return: Генератор нарастающего текста; при ошибке до первого фрагмента ничего не отдаёт
+    :raises IncompleteStream: если поток оборвался или закончился без финального статуса
+        после того, как часть текста уже отдана
+    """
+    if not YANDEX_FOLDER_ID:
+        logger.error("Отсутствует YANDEX_FOLDER_ID в .env.")
+        return
+
+    if use_iam:
+        try:
+            iam_token = get_iam_token()
+            headers = {
+                "Authorization": f"Bearer {iam_token}",
+                "x-folder-id": YANDEX_FOLDER_ID
+            }
+        except Exception as e:
+            logger.error(f"IAM fallback провалился: {e}")
+            return
+    else:
+        if not YANDEX_GPT_API_KEY:
+            if YANDEX_OAUTH_TOKEN:
+                logger.warning("Отсутствует YANDEX_GPT_API_KEY. Пробуем IAM fallback.")
+                yield from stream_text_with_system(system_prompt, user_prompt, temperature, max_tokens, use_iam=True, timeout=timeout)
+            else:
+                logger.error("Отсутствует YANDEX_GPT_API_KEY и YANDEX_OAUTH_TOKEN.")
+            return
+        headers = {
+            "Authorization": f"Api-Key {YANDEX_GPT_API_KEY}",
+            "x-folder-id": YANDEX_FOLDER_ID
+        }
+
+    if not gpt_breaker.allow():
+        logger.warning("YandexGPT недоступен (breaker открыт). Используем запасной ответ.")
+        return
+
+    started = False
+    try:
+        with requests.post(
+            YANDEX_GPT_URL,
+            headers=headers,
+            json={
+                "modelUri": f"gpt://{YANDEX_FOLDER_ID}/yandexgpt-lite",
+                "completionOptions": {
+                    "stream": True,
+                    "temperature": temperature,
+                    "maxTokens": str(max_tokens)
+                },
+                "messages": [
+                    {"role": "system", "text": system_prompt},
+                    {"role": "user", "text": user_prompt}
+                ]
+            },
+            timeout=timeout,
+            stream=True
+        ) as response:
+            if response.status_code != 200:
+                logger.warning(f"Ошибка API: {response.status_code}. Ответ: {response.text}")
+                _record_status(response.status_code)
+                if response.status_code == 401 and not use_iam and YANDEX_OAUTH_TOKEN:
+                    logger.info("Пробуем IAM fallback для 401.")
+                    yield from stream_text_with_system(system_prompt, user_prompt, temperature, max_tokens, use_iam=True, timeout=timeout)
+                return
+
+            status = None
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                alternative = json.loads(line)["result"]["alternatives"][0]
+                status = alternative.get("status")
+                started = True
+                yield alternative["message"]["text"]
+            gpt_breaker.record_success()
+            if started and status not in FINAL_STATUSES:
+                raise IncompleteStream(f"поток закончился со статусом {status}")
+
+    except IncompleteStream:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка потоковой генерации YandexGPT: {e}")
+        gpt_breaker.record_failure()
+        if started:
+            raise IncompleteStream(str(e)) from e
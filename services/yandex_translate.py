@@ -2,12 +2,23 @@ import requests
 import os
 import logging
 import json
+from services.circuit_breaker import get_breaker
+from services.shared_state import SharedCache
 
 logger = logging.getLogger(__name__)
 
+# Адреса API; переопределяются для локальных заглушек в бенчмарках
+YANDEX_TRANSLATE_URL = os.getenv("YANDEX_TRANSLATE_URL", "https://translate.api.cloud.yandex.net/translate/v2/translate")
+YANDEX_IAM_URL = os.getenv("YANDEX_IAM_URL", "https://iam.api.cloud.yandex.net/iam/v1/tokens")
+
+translate_breaker = get_breaker("yandex_translate")
+
+# Последние удачные переводы: запасной ответ, пока breaker открыт
+translation_cache = SharedCache("translate", maxsize=500, ttl=86400)
+
 def get_iam_token(oauth_token: str) -> str:
     """Получаем IAM-токен по OAuth-токену (для альтернативы Api-Key)"""
-    url = "https://iam.api.cloud.yandex.net/iam/v1/tokens"
+    url = YANDEX_IAM_URL
     payload = {"yandexPassportOauthToken": oauth_token}
     try:
         response = requests.post(url, json=payload)
@@ -18,17 +29,18 @@ def get_iam_token(oauth_token: str) -> str:
         logger.error(f"Ошибка получения IAM-токена: {e}")
         raise
 
-def translate_text(text: str, target_lang="ru", source_lang="en", use_iam=False):
+def translate_text(text: str, target_lang="ru", source_lang="en", use_iam=False, timeout: float = 10):
     """
     Перевод текста с использованием Yandex Translate API.
     :param use_iam: Если True, используем IAM-токен вместо Api-Key (для fallback).
+    :param timeout: Таймаут запроса, сек
     """
     folder_id = os.getenv("YANDEX_FOLDER_ID")
     if not folder_id:
         logger.error("Отсутствует YANDEX_FOLDER_ID в .env.")
         return text  # Fallback: оригинальный текст
 
-    url = "https://translate.api.cloud.yandex.net/translate/v2/translate"
+    url = YANDEX_TRANSLATE_URL
     body = {
         "folderId": folder_id,
         "texts": [text],
@@ -55,25 +67,36 @@ def translate_text(text: str, target_lang="ru", source_lang="en", use_iam=False)
         api_key = os.getenv("YANDEX_API_KEY")
         if not api_key:
             logger.error("Отсутствует YANDEX_API_KEY в .env. Пробуем IAM как fallback.")
-            return translate_text(text, target_lang, source_lang, use_iam=True)  # Рекурсивно пробуем IAM
+            return translate_text(text, target_lang, source_lang, use_iam=True, timeout=timeout)  # Рекурсивно пробуем IAM
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Api-Key {api_key}"
         }
 
+    cache_key = (text, source_lang, target_lang)
+    if not translate_breaker.allow():
+        logger.warning("Yandex Translate недоступен (breaker открыт). Используем кэш или оригинал.")
+        return translation_cache.get(cache_key, text)
+
     try:
-        response = requests.post(url, headers=headers, json=body, timeout=10)
+        response = requests.post(url, headers=headers, json=body, timeout=timeout)
         response.raise_for_status()
         translated = response.json()["translations"][0]["text"]
+        translate_breaker.record_success()
+        translation_cache[cache_key] = translated
         logger.info("Перевод успешен.")
         return translated
     except requests.exceptions.HTTPError as e:
         status = response.status_code
+        if status in (402, 429) or status >= 500:
+            translate_breaker.record_failure()
+        else:
+            translate_breaker.record_success()  # сервис отвечает: пробный запрос half_open завершён
         if status == 401:
             logger.error("Ошибка 401: Unauthorized. Проверьте YANDEX_API_KEY/OAUTH_TOKEN, права доступа и биллинг в Yandex Cloud.")
             if not use_iam:
                 logger.info("Пробуем fallback на IAM-токен.")
-                return translate_text(text, target_lang, source_lang, use_iam=True)
+                return translate_text(text, target_lang, source_lang, use_iam=True, timeout=timeout)
         elif status == 402:
             logger.error("Ошибка 402: Payment Required. Активируйте биллинг в Yandex Cloud.")
         elif status == 429:
@@ -83,4 +106,5 @@ def translate_text(text: str, target_lang="ru", source_lang="en", use_iam=False)
         return text  # Fallback: оригинальный текст
     except Exception as e:
         logger.error(f"Ошибка перевода: {e}")
-        return text  # Fallback
+        translate_breaker.record_failure()
+        return translation_cache.get(cache_key, text)  # Fallback
@@ -0,0 +1,97 @@
+import asyncio
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import Forbidden, NetworkError
+
+import scheduler
+from services import database, digest
+from services import generate_horoscope as horoscope
+
+
+class FakeBot:
+    def __init__(self, error: Exception = None):
+        self.sent = []
+        self.error = error
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if self.error is not None:
+            raise self.error
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Пустая база в data/ временного каталога и чистые кэши пулов и секций"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(scheduler, "SEND_INTERVAL", 0)
+    database.init_db()
+    for cache in (horoscope.daily_cache, digest.render_cache, digest.unavailable_pools):
+        cache.clear()
+    yield
+    for cache in (horoscope.daily_cache, digest.render_cache, digest.unavailable_pools):
+        cache.clear()
+
+
+def test_delivery_for_subscription_with_russian_sign(db):
+    # Пул лежит под английским именем знака; день подписчика может отличаться от дня сервера
+    for offset in (-1, 0, 1):
+        period = (date.today() + timedelta(days=offset)).isoformat()
+        database.save_horoscope_variants("aries", period, False, ["Гороскоп овна"])
+    database.add_subscription(1001, "овен")
+    users = [(1001, "овен", "Europe/Moscow", digest.DEFAULT_PRODUCTS)]
+
+    bot = FakeBot()
+    done = asyncio.run(scheduler.send_messages(SimpleNamespace(bot=bot), users))
+
+    assert done == [1001]
+    assert len(bot.sent) == 1
+    chat_id, text = bot.sent[0]
+    assert chat_id == 1001
+    assert "Гороскоп овна" in text
+    assert "Знак: Овен" in text
+    assert "⚠️" not in text
+
+
+@pytest.mark.parametrize("error, delivered", [(NetworkError("timeout"), False), (Forbidden("blocked"), True)])
+def test_transport_errors_keep_subscriber_due(db, error, delivered):
+    # Сетевой сбой — повтор в следующую минуту; заблокированный бот — повторять незачем
+    database.save_horoscope_variants("aries", date.today().isoformat(), False, ["Гороскоп овна"])
+    users = [(1001, "овен", "Europe/Moscow", digest.DEFAULT_PRODUCTS)]
+
+    done = asyncio.run(scheduler.send_messages(SimpleNamespace(bot=FakeBot(error)), users))
+
+    assert done == ([1001] if delivered else [])
+
+
+def test_server_day_follows_subscriber_date():
+    today = date.today()
+    assert horoscope.server_day("today", today - timedelta(days=1)) == "yesterday"
+    assert horoscope.server_day("today", today) == "today"
+    assert horoscope.server_day("today", today + timedelta(days=1)) == "tomorrow"
+    assert horoscope.server_day("week", today) == "week"
+    assert horoscope.server_day("week", today + timedelta(days=7)) is None
+
+
+def test_section_uses_pool_of_subscriber_date(db):
+    # Западнее сервера местная дата отстаёт: секция берёт вчерашний пул, а не сегодняшний
+    yesterday = date.today() - timedelta(days=1)
+    database.save_horoscope_variants("aries", yesterday.isoformat(), False, ["Вчерашний"])
+    database.save_horoscope_variants("aries", date.today().isoformat(), False, ["Сегодняшний"])
+
+    text = digest._horoscope_section("horoscope", 1001, "овен", "today", yesterday, "Гороскоп")
+
+    assert "Вчерашний" in text
+    assert "Сегодняшний" not in text
+
+
+def test_unknown_sign_keeps_other_sections(db):
+    # Знак не из справочника ломает только секцию гороскопа, лунный календарь всё равно уходит
+    users = [(1001, "змееносец", "Europe/Moscow", 1 << digest.PRODUCTS.index("moon"))]
+    bot = FakeBot()
+
+    done = asyncio.run(scheduler.send_messages(SimpleNamespace(bot=bot), users))
+
+    assert done == [1001]
+    assert len(bot.sent) == 1